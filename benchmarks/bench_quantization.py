@@ -0,0 +1,68 @@
+"""
+Memory, latency and recall of quantized candidate scoring
+
+Compares CollaborativeFiltering.predict over a synthetic catalog with
+float64 / float32 exact scoring and float16 / int8 candidate scoring
+followed by exact re-ranking. Recall@n is measured against the float64
+ranking.
+
+    python -m benchmarks.bench_quantization --items 200000 --factors 100
+"""
+import argparse
+import time
+import numpy as np
+
+from src.models.collaborative_filtering import CollaborativeFiltering
+from src.utils.artifacts import IdIndex
+
+def build_model(user_factors: np.ndarray, item_factors: np.ndarray, dtype: str,
+                candidate_dtype, rerank: int) -> CollaborativeFiltering:
+    cf = CollaborativeFiltering(n_factors=item_factors.shape[1], dtype=dtype,
+                                candidate_dtype=candidate_dtype, rerank=rerank)
+    cf.user_factors = user_factors.astype(dtype)
+    cf.item_factors = item_factors.astype(dtype)
+    cf.item_ids = np.arange(len(item_factors), dtype=np.int64)
+    cf.user_index = IdIndex.from_ids(np.arange(len(user_factors)))
+    cf.item_index = IdIndex.from_ids(cf.item_ids)
+    cf._build_candidates()
+    return cf
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--factors", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Item norms vary like popularity does in trained factors
+    item_factors = rng.normal(0, 0.1, (args.items, args.factors))
+    item_factors *= rng.lognormal(0, 0.5, (args.items, 1))
+    user_factors = rng.normal(0, 0.1, (args.queries, args.factors))
+
+    reference = build_model(user_factors, item_factors, "float64", None, args.rerank)
+    expected = [{iid for iid, _ in reference.predict(u, n=args.n)} for u in range(args.queries)]
+
+    print(f"{args.items} items x {args.factors} factors, {args.queries} queries, "
+          f"top-{args.n}, rerank {args.rerank}")
+    print(f"{'scoring':<18}{'scan MB':>10}{'ms/query':>10}{'recall':>10}")
+
+    for dtype, candidate_dtype in [("float64", None), ("float32", None),
+                                   ("float32", "float16"), ("float32", "int8")]:
+        cf = build_model(user_factors, item_factors, dtype, candidate_dtype, args.rerank)
+        scanned = cf.item_candidates.nbytes if cf.item_candidates is not None else cf.item_factors.nbytes
+
+        start = time.perf_counter()
+        results = [cf.predict(u, n=args.n) for u in range(args.queries)]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+        hits = sum(len(expected[u] & {iid for iid, _ in recs}) for u, recs in enumerate(results))
+        recall = hits / (args.queries * args.n)
+
+        label = dtype if candidate_dtype is None else f"{candidate_dtype}+rerank"
+        print(f"{label:<18}{scanned / 2**20:>10.1f}{elapsed_ms:>10.2f}{recall:>10.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Accuracy, memory and speed of sketch-mode trending against exact counters
+
+Feeds the same Zipf-distributed event stream (spread over two days) to
+TrendingEngine and SketchTrendingEngine and reports per window the
+memory of each, the recall of the sketch top-n against the exact top-n,
+the mean relative score error and the reported error bound. Sketch
+parameters default to the trending.sketch section of config.yaml.
+
+    python -m benchmarks.bench_trending --items 1000000 --events 500000
+"""
+import argparse
+import time
+import numpy as np
+
+from src.models.trending import WINDOWS, SketchTrendingEngine, TrendingEngine
+from src.utils.config import get_section
+
+HOUR_MS = 3_600_000
+
+def feed(engine, items: np.ndarray, times: np.ndarray) -> float:
+    """Record every event, returns microseconds per event"""
+    start = time.perf_counter()
+    for item_id, timestamp in zip(items.tolist(), times.tolist()):
+        engine.record(item_id, timestamp)
+    return (time.perf_counter() - start) * 1e6 / len(items)
+
+def main():
+    sketch_config = get_section('trending').get('sketch', {})
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--zipf", type=float, default=1.2)
+    parser.add_argument("--n", type=int, default=20)
+    parser.add_argument("--epsilon", type=float, default=sketch_config.get('epsilon', 5e-4))
+    parser.add_argument("--delta", type=float, default=sketch_config.get('delta', 0.01))
+    parser.add_argument("--heavy-hitters", type=int,
+                        default=sketch_config.get('heavy_hitters', 1000))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Random ids so popular items are spread over the id space
+    catalog = rng.permutation(args.items)
+    items = catalog[(rng.zipf(args.zipf, args.events) - 1) % args.items]
+    now = 1000 * 24 * HOUR_MS
+    times = np.sort(now - rng.integers(0, 48 * HOUR_MS, args.events))
+
+    exact = TrendingEngine(capacity=args.items, top_k=args.n)
+    sketch = SketchTrendingEngine(args.epsilon, args.delta, args.heavy_hitters)
+    exact_us = feed(exact, items, times)
+    sketch_us = feed(sketch, items, times)
+
+    print(f"{args.events} events over {args.items} items (zipf {args.zipf}), top-{args.n}")
+    print(f"{'engine':<10}{'MB':>10}{'us/event':>10}")
+    print(f"{'exact':<10}{exact.nbytes / 2**20:>10.1f}{exact_us:>10.1f}")
+    print(f"{'sketch':<10}{sketch.nbytes / 2**20:>10.1f}{sketch_us:>10.1f}")
+    print(f"sketch: width {sketch.sketch.width}, depth {sketch.sketch.depth}, "
+          f"{args.heavy_hitters} candidates per window")
+
+    print(f"{'window':<8}{'recall':>10}{'rel err':>10}{'bound':>10}{'ms/query':>10}")
+    for window in WINDOWS:
+        expected = {item_id: score for item_id, score, _ in exact.top(window, args.n, now_ms=now)}
+        start = time.perf_counter()
+        approx = sketch.top(window, args.n, now_ms=now)
+        query_ms = (time.perf_counter() - start) * 1000
+
+        recall = len(expected.keys() & {item_id for item_id, _, _ in approx}) / max(len(expected), 1)
+        errors = [(score - expected[item_id]) / expected[item_id]
+                  for item_id, score, _ in approx if item_id in expected]
+        bound = sketch.error_bound(window)['score']
+        print(f"{window:<8}{recall:>10.3f}{np.mean(errors) if errors else 0.0:>10.4f}"
+              f"{bound:>10.2f}{query_ms:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches for one scoring call
+
+    submit() queues an item and awaits its result. A batch is flushed
+    once batch_limit items are pending or max_wait_ms after its first
+    item arrived, whichever comes first; handler receives the list of
+    items and must return results in the same order. An exception from
+    handler is raised in every request of that batch.
+
+    batch_limit is max_batch_size, lowered when max_batch_latency_ms is
+    set to the number of items expected to score within it (from a
+    moving average of the measured time per item). Each submit() can
+    carry its own deadline; items that time out before their batch is
+    scored are dropped from it.
+    
+    State is tied to the running event loop and is reset if submit() is
+    called from a different one.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int = 256, max_wait_ms: float = 2.0,
+                 max_batch_latency_ms: Optional[float] = None):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_latency_ms = max_batch_latency_ms
+        self._item_ms: Optional[float] = None  # moving average of scoring time per item
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight = 0
+
+        # Tuning metrics
+        self.batches = 0
+        self.items = 0
+        self.max_observed_batch = 0
+        self.max_queue_depth = 0
+        self.total_wait_ms = 0.0
+        self.timeouts = 0
+        self._first_arrival = 0.0
+
+    @classmethod
+    def from_config(cls, handler: Callable[[List[Any]], Awaitable[List[Any]]],
+                    config: Dict[str, Any]) -> "MicroBatcher":
+        """
+        Build from the performance section of config.yaml
+        """
+        return cls(
+            handler,
+            max_batch_size=config.get('batch_size', 256),
+            max_wait_ms=config.get('batch_max_wait_ms', 2.0),
+            max_batch_latency_ms=config.get('batch_max_latency_ms')
+        )
+
+    @property
+    def batch_limit(self) -> int:
+        """Items per batch expected to score within max_batch_latency_ms"""
+        if not self.max_batch_latency_ms or not self._item_ms:
+            return self.max_batch_size
+        return int(min(self.max_batch_size, max(1, self.max_batch_latency_ms // self._item_ms)))
+    
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting for a batch plus requests in batches being scored"""
+        return len(self._pending) + self._in_flight
+
+    async def submit(self, item: Any, timeout_ms: Optional[float] = None) -> Any:
+        """
+        Queue item for the next batch and wait for its result, raising
+        asyncio.TimeoutError after timeout_ms (None or 0: no deadline)
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._pending, self._timer = loop, [], None
+
+        future = loop.create_future()
+        if not self._pending:
+            self._first_arrival = time.perf_counter()
+        self._pending.append((item, future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        if len(self._pending) >= self.batch_limit:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        if not timeout_ms:
+            return await future
+        try:
+            return await asyncio.wait_for(future, timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        self.batches += 1
+        self.items += len(batch)
+        self.max_observed_batch = max(self.max_observed_batch, len(batch))
+        self.total_wait_ms += (time.perf_counter() - self._first_arrival) * 1000
+
+        self._in_flight += len(batch)
+        self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        size = len(batch)
+        # Requests that timed out while waiting are not scored
+        batch = [(item, future) for item, future in batch if not future.done()]
+        try:
+            if not batch:
+                return
+            start = time.perf_counter()
+            results = await self.handler([item for item, _ in batch])
+            item_ms = (time.perf_counter() - start) * 1000 / len(batch)
+            self._item_ms = item_ms if self._item_ms is None else 0.8 * self._item_ms + 0.2 * item_ms
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._in_flight -= size
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'batches': self.batches,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'max_batch_size': self.max_observed_batch,
+            'avg_batch_wait_ms': round(self.total_wait_ms / self.batches, 3) if self.batches else 0.0,
+            'batch_size_limit': self.max_batch_size,
+            'batch_limit': self.batch_limit,
+            'item_ms': round(self._item_ms, 4) if self._item_ms else None,
+            'timeouts': self.timeouts,
+            'max_wait_ms': self.max_wait_ms
+        }
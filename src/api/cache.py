@@ -0,0 +1,298 @@
+import asyncio
+import fnmatch
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class InMemoryRedis:
+    """
+    In-process stand-in for the redis.asyncio client subset the cache uses
+
+    Supports get/set (ex, px, nx)/delete/incr/ping/close with expiry, with
+    decode_responses=True semantics (values come back as str). Meant for
+    tests and for running without a Redis server.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._live(key)
+
+    async def set(self, key: str, value: Any, ex: Optional[float] = None,
+                  px: Optional[float] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._live(key) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self._data[key] = (str(value), time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key: str) -> int:
+        value = int(self._live(key) or 0) + 1
+        expires_at = self._data[key][1] if key in self._data else None
+        self._data[key] = (str(value), expires_at)
+        return value
+
+    async def keys(self, pattern: str = "*") -> list:
+        return [key for key in list(self._data) if self._live(key) is not None
+                and fnmatch.fnmatchcase(key, pattern)]
+
+    async def close(self):
+        pass
+
+class RecommendationCache:
+    """
+    Two-tier cache for recommendation results
+
+    Entries are keyed by (model generation, user, user version, n,
+    filter flag, context hash). A local LRU sits in front of Redis;
+    without a Redis client only the local tier is used. /feedback calls
+    invalidate(), which bumps the user's version so their old entries are
+    never read again (they expire through the TTL). Other processes pick
+    up a version bump within local_ttl seconds.
+
+    User versions are held in an LRU of local_size users. With Redis an
+    entry is only trusted for local_ttl seconds, so older ones are
+    dropped. Without Redis the LRU is the only record, so a user it
+    forgets restarts from the highest version it ever forgot; that can
+    never match one of the user's invalidated entries.
+    
+    Stampede protection: concurrent misses for one key in this process
+    share a single computation, and across processes a short Redis NX
+    lock lets one process compute while the others poll for its result.
+    Redis errors never fail a request; the value is computed instead.
+    """
+
+    PREFIX = "rec"
+
+    def __init__(self, redis=None, ttl: float = 3600, local_size: int = 10_000,
+                 local_ttl: float = 5.0, lock_ttl_ms: int = 2000, lock_poll_ms: int = 10,
+                 metrics=None):
+        self.redis = redis
+        self.ttl = ttl
+        self.local_size = local_size
+        self.local_ttl = min(local_ttl, ttl)
+        self.lock_ttl_ms = lock_ttl_ms
+        self.lock_poll_ms = lock_poll_ms
+        # MetricsCollector receiving cache hits/misses
+        self.metrics = metrics
+
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._versions: "OrderedDict[int, Tuple[float, int]]" = OrderedDict()
+        self._version_floor = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.computations = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], redis=None, metrics=None) -> "RecommendationCache":
+        """
+        Build from the performance section of config.yaml
+        """
+        return cls(
+            redis=redis,
+            ttl=config.get('cache_ttl', 3600),
+            local_size=config.get('cache_local_size', 10_000),
+            local_ttl=config.get('cache_local_ttl', 5.0),
+            metrics=metrics
+        )
+
+    @staticmethod
+    def context_hash(context: Optional[Dict[str, Any]]) -> str:
+        if not context:
+            return "-"
+        encoded = json.dumps(context, sort_keys=True, default=str).encode()
+        return hashlib.sha1(encoded).hexdigest()[:16]
+
+    def key(self, generation: str, user_id: int, version: int, n: int,
+            filter_watched: bool, context: Optional[Dict[str, Any]] = None) -> str:
+        return (f"{self.PREFIX}:{generation}:{user_id}:v{version}:{n}:"
+                f"{int(filter_watched)}:{self.context_hash(context)}")
+
+    async def get_or_compute(self, generation: str, user_id: int, n: int,
+                             compute: Callable[[], Awaitable[Any]],
+                             context: Optional[Dict[str, Any]] = None,
+                             filter_watched: bool = True) -> Any:
+        """Cached result for the request, computing it at most once per key"""
+        version = await self._user_version(user_id)
+        key = self.key(generation, user_id, version, n, filter_watched, context)
+
+        value = self._local_get(key)
+        if value is not None:
+            await self._record(hit=True)
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            # Another request in this process is already fetching this key
+            await self._record(hit=True)
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._fetch(key, compute)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else waits
+            raise
+        else:
+            future.set_result(value)
+            self._local_put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def invalidate(self, user_id: int):
+        """Make all cached results of a user unreachable"""
+        version = self._versions.get(user_id, (0.0, self._version_floor))[1] + 1
+        if self.redis is not None:
+            try:
+                version = int(await self.redis.incr(self._version_key(user_id)))
+            except Exception as e:
+                logger.warning(f"Cache invalidation in Redis failed for user {user_id}: {e}")
+        self._set_version(user_id, version)
+
+    async def _fetch(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Redis lookup, else compute under the cross-process lock"""
+        if self.redis is None:
+            await self._record(hit=False)
+            return await self._compute(compute)
+
+        try:
+            cached = await self.redis.get(key)
+            if cached is not None:
+                await self._record(hit=True)
+                return json.loads(cached)
+
+            lock_key, token = f"{key}:lock", uuid.uuid4().hex
+            if not await self.redis.set(lock_key, token, px=self.lock_ttl_ms, nx=True):
+                # Another process is computing: wait for its result
+                deadline = time.monotonic() + self.lock_ttl_ms / 1000
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(self.lock_poll_ms / 1000)
+                    cached = await self.redis.get(key)
+                    if cached is not None:
+                        await self._record(hit=True)
+                        return json.loads(cached)
+                lock_key = None
+        except Exception as e:
+            logger.warning(f"Recommendation cache unavailable: {e}")
+            await self._record(hit=False)
+            return await self._compute(compute)
+
+        await self._record(hit=False)
+        try:
+            value = await self._compute(compute)
+            try:
+                await self.redis.set(key, json.dumps(value, default=_json_default), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Could not store recommendations in cache: {e}")
+        finally:
+            if lock_key is not None:
+                try:
+                    if await self.redis.get(lock_key) == token:
+                        await self.redis.delete(lock_key)
+                except Exception:
+                    pass
+        return value
+
+    async def _compute(self, compute: Callable[[], Awaitable[Any]]) -> Any:
+        self.computations += 1
+        return await compute()
+
+    async def _user_version(self, user_id: int) -> int:
+        cached = self._versions.get(user_id)
+        if cached is not None and time.monotonic() - cached[0] < self.local_ttl:
+            return cached[1]
+
+        version = cached[1] if cached is not None else self._version_floor
+        if self.redis is not None:
+            try:
+                version = int(await self.redis.get(self._version_key(user_id)) or 0)
+            except Exception as e:
+                logger.warning(f"Could not read cache version of user {user_id}: {e}")
+        self._set_version(user_id, version)
+        return version
+
+    def _set_version(self, user_id: int, version: int):
+        now = time.monotonic()
+        self._versions[user_id] = (now, version)
+        self._versions.move_to_end(user_id)
+        # Oldest first: evict past the size bound, and (with Redis) stale entries
+        while self._versions:
+            seen_at, oldest = next(iter(self._versions.values()))
+            stale = self.redis is not None and now - seen_at >= self.local_ttl
+            if len(self._versions) <= self.local_size and not stale:
+                break
+            self._versions.popitem(last=False)
+            self._version_floor = max(self._version_floor, oldest)
+    
+    def _version_key(self, user_id: int) -> str:
+        return f"{self.PREFIX}:version:{user_id}"
+
+    def _local_get(self, key: str) -> Any:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _local_put(self, key: str, value: Any):
+        self._local[key] = (time.monotonic() + self.ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def _record(self, hit: bool):
+        if self.metrics is None:
+            return
+        if hit:
+            await self.metrics.record_cache_hit()
+        else:
+            await self.metrics.record_cache_miss()
+
+    def clear(self):
+        """Drop the local tier (Redis entries expire on their own)"""
+        self._local.clear()
+        self._versions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'local_entries': len(self._local),
+            'user_versions': len(self._versions),
+            'inflight': len(self._inflight),
+            'computations': self.computations,
+            'redis': self.redis is not None
+        }
+
+def _json_default(value: Any) -> Any:
+    """Encode NumPy scalars left in recommendation dicts"""
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
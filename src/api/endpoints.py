@@ -1,14 +1,38 @@
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, Header
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 import time
 import asyncio
+import logging
+import os
+import secrets
 from datetime import datetime
 import numpy as np
 from pydantic import ConfigDict
 
+from src.api.batching import MicroBatcher
+from src.api.cache import RecommendationCache
+from src.api.executor import ScoringExecutor, ServerOverloaded
+from src.models.hybrid_model import HybridRecommender
+from src.models.registry import ModelRegistry
+from src.models.trending import WINDOWS, build_trending
+from src.preprocessing.feature_store import IncrementalFeatureStore
+from src.utils.artifacts import is_artifact
+from src.utils.config import get_section
+from src.utils.interaction_store import InteractionStore
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+performance_config = get_section('performance')
+
+# Recommendation results (local LRU in front of Redis, see src/main.py)
+cache = RecommendationCache.from_config(performance_config)
+
+# Bounded pool for CPU-bound scoring, keeps NumPy work off the event loop
+executor = ScoringExecutor.from_config(performance_config)
+
 # Pydantic models for request/response
 class UserPreferences(BaseModel):
     user_id: int = Field(..., description="User ID")
@@ -38,11 +62,107 @@ class FeedbackRequest(BaseModel):
 # In-memory storage (replace with real DB in production)
 users_db = {}
 items_db = {}
-interactions_db = []
 
-# Simulated model predictions
+# Append-only /feedback log; main.py points it at INTERACTIONS_PATH and flushes it
+interactions = InteractionStore.from_config(get_section('storage'))
+
+# Windowed trending counters fed by /feedback; main.py restores and snapshots them
+trending = build_trending(get_section('trending'))
+
+# Running per-user/per-item rating aggregates, updated by /feedback; main.py
+# seeds them from the startup model (codes = model rows) and replays the log
+features = IncrementalFeatureStore()
+
+# Serving model generations, loaded at startup and on /models/reload; users
+# folded in on one generation are folded in again on the next
+registry = ModelRegistry(user_interactions=lambda user_id: get_user_interactions(user_id))
+
+# Fold-ins still running after their /feedback was answered
+fold_in_tasks: Set[asyncio.Task] = set()
+
+def get_recommender() -> Optional[HybridRecommender]:
+    """
+    Current trained model, or None when serving fallbacks
+
+    Call once per request and keep using the returned object, so a
+    concurrent model swap never mixes two generations.
+    """
+    model = registry.model
+    return model if model is not None and model.is_trained else None
+
+def current_generation() -> str:
+    """Version of the serving model generation, part of the cache key"""
+    generation = registry.current
+    return generation.version if generation is not None else "fallback"
+
+def recently_active(user_id: int, since: float) -> bool:
+    """Whether the user sent feedback after the given epoch time"""
+    return interactions.has_activity(user_id, int(since * 1000))
+
+def get_user_interactions(user_id: int) -> List[tuple]:
+    """(item_id, rating) pairs recorded through /feedback for a user"""
+    return interactions.user_interactions(user_id)
+
+async def run_scoring(fn, *args, **kwargs):
+    """
+    Run model work on the scoring executor
+
+    Sheds load with 503 when the queue is full and answers 504 when the
+    call exceeds performance.request_timeout (milliseconds).
+    """
+    try:
+        return await executor.run(fn, *args, **kwargs)
+    except ServerOverloaded:
+        raise HTTPException(status_code=503, detail="Server overloaded, retry later",
+                            headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Recommendation timed out")
+
+async def fold_in_feedback(recommender: HybridRecommender, user_id: int) -> bool:
+    """
+    Fold a user's logged interactions into the CF model, best effort
+    
+    Runs without a deadline (callers bound their own wait) and never
+    raises: the feedback is already logged, so an overloaded pool or a
+    failing model only delays its effect on recommendations. Once the
+    new vector is in place the user's cache is invalidated again, since
+    requests scored while the fold-in ran cached the old vector's
+    results under the post-feedback version.
+    """
+    try:
+        updated = await executor.run(recommender.update_user, user_id,
+                                     get_user_interactions(user_id), timeout_ms=0)
+        await cache.invalidate(user_id)
+        return updated
+    except ServerOverloaded:
+        logger.warning(f"Fold-in for user {user_id} shed, scoring pool is full")
+    except Exception as e:
+        logger.error(f"Fold-in for user {user_id} failed: {e}")
+    return False
+
+async def score_recommendation_batch(requests: List[Dict]) -> List[List[Dict]]:
+    """
+    Score a micro-batch of recommendation requests with one model generation
+    
+    The batch has no deadline of its own: each request waits at most
+    request_timeout in batcher.submit, and the batcher sizes batches to
+    score within performance.batch_max_latency_ms.
+    """
+    recommender = get_recommender()
+    if recommender is None:
+        return [[] for _ in requests]
+    return await run_scoring(recommender.recommend_many, requests, timeout_ms=0)
+
+# Coalesces concurrent /recommend calls into one matrix multiply per model
+batcher = MicroBatcher.from_config(score_recommendation_batch, performance_config)
+
+# Model predictions (simulated when no trained model is loaded)
 async def get_collaborative_recommendations(user_id: int, n: int) -> List[Dict]:
     """Collaborative filtering recommendations"""
+    recommender = get_recommender()
+    if recommender is not None:
+        return await run_scoring(recommender.recommend_collaborative, user_id, n)
+    
     await asyncio.sleep(0.01)  # Simulate model inference
     
     recommendations = []
@@ -61,6 +181,10 @@ async def get_collaborative_recommendations(user_id: int, n: int) -> List[Dict]:
 
 async def get_content_based_recommendations(user_id: int, n: int) -> List[Dict]:
     """Content-based recommendations"""
+    recommender = get_recommender()
+    if recommender is not None:
+        return await run_scoring(recommender.recommend_content, get_user_interactions(user_id), n)
+    
     await asyncio.sleep(0.01)
     
     recommendations = []
@@ -79,6 +203,7 @@ async def get_content_based_recommendations(user_id: int, n: int) -> List[Dict]:
 
 async def get_neural_recommendations(user_id: int, n: int) -> List[Dict]:
     """Neural network recommendations"""
+    # No neural model is trained yet; HybridRecommender serves CF + content
     await asyncio.sleep(0.015)
     
     recommendations = []
@@ -95,10 +220,46 @@ async def get_neural_recommendations(user_id: int, n: int) -> List[Dict]:
     
     return recommendations
 
-async def get_hybrid_recommendations(user_id: int, n: int, context: Optional[Dict] = None) -> List[Dict]:
+async def get_hybrid_recommendations(user_id: int, n: int, context: Optional[Dict] = None,
+                                     filter_watched: bool = True) -> List[Dict]:
+    """Hybrid recommendations, served from the cache when possible"""
+    if get_recommender() is None:
+        # Fallback lists are random; caching one would pin it for cache_ttl
+        return await score_hybrid_recommendations(user_id, n, context, filter_watched)
+    return await cache.get_or_compute(
+        current_generation(), user_id, n,
+        lambda: score_hybrid_recommendations(user_id, n, context, filter_watched),
+        context=context, filter_watched=filter_watched
+    )
+
+async def score_hybrid_recommendations(user_id: int, n: int, context: Optional[Dict] = None,
+                                       filter_watched: bool = True) -> List[Dict]:
     """Hybrid recommendations combining all methods"""
     start_time = time.time()
     
+    recommender = get_recommender()
+    if recommender is not None:
+        # Returning users without recent activity: offline top-N
+        table = recommender.precomputed
+        if (table is not None and not context and filter_watched and
+                not recently_active(user_id, table.generated_at)):
+            precomputed = recommender.precomputed_recommendations(user_id, n)
+            if precomputed is not None:
+                return precomputed
+        
+        request = {
+            'user_id': user_id,
+            'user_interactions': get_user_interactions(user_id),
+            'n': n,
+            'filter_watched': filter_watched
+        }
+        if performance_config.get('micro_batching', True):
+            try:
+                return await batcher.submit(request, timeout_ms=executor.timeout_ms)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail="Recommendation timed out")
+        return await run_scoring(recommender.recommend, **request)
+    
     # Get recommendations from all models in parallel
     cf_recs, cb_recs, nn_recs = await asyncio.gather(
         get_collaborative_recommendations(user_id, n // 3),
@@ -137,7 +298,8 @@ async def get_recommendations(request: RecommendationRequest):
         recommendations = await get_hybrid_recommendations(
             request.user_id,
             request.num_recommendations,
-            request.context
+            request.context,
+            filter_watched=request.filter_watched
         )
         
         latency = round((time.time() - start_time) * 1000, 2)
@@ -150,6 +312,8 @@ async def get_recommendations(request: RecommendationRequest):
             timestamp=datetime.now().isoformat()
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recommendation error: {str(e)}")
 
@@ -180,15 +344,38 @@ async def submit_feedback(feedback: FeedbackRequest):
     """
     📊 Submit user feedback (ratings, clicks, watches)
     """
+    try:
+        timestamp_ms = interactions.append(feedback.user_id, feedback.item_id, feedback.rating,
+                                           feedback.interaction_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    trending.record(feedback.item_id, timestamp_ms)
+    features.update([feedback.user_id], [feedback.item_id], [feedback.rating], [timestamp_ms])
     interaction = {
         "user_id": feedback.user_id,
         "item_id": feedback.item_id,
         "rating": feedback.rating,
-        "interaction_type": feedback.interaction_type,
-        "timestamp": datetime.now().isoformat()
+        "interaction_type": interactions.canonical_type(feedback.interaction_type),
+        "timestamp": datetime.fromtimestamp(timestamp_ms / 1000).isoformat()
     }
     
-    interactions_db.append(interaction)
+    # Drop cached lists now (the new interaction changes filtering);
+    # fold_in_feedback invalidates again once the CF vector is updated
+    await cache.invalidate(feedback.user_id)
+    
+    recommender = get_recommender()
+    if recommender is not None:
+        # Fold the new feedback into the user's CF vector. Wait up to
+        # request_timeout so the next request usually sees it; a slower
+        # fold-in finishes in the background and never fails the request.
+        task = asyncio.ensure_future(fold_in_feedback(recommender, feedback.user_id))
+        fold_in_tasks.add(task)
+        task.add_done_callback(fold_in_tasks.discard)
+        timeout_ms = executor.timeout_ms
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout_ms / 1000 if timeout_ms else None)
+        except asyncio.TimeoutError:
+            logger.info(f"Fold-in for user {feedback.user_id} continues in the background")
     
     return {
         "status": "success",
@@ -205,21 +392,32 @@ async def get_trending_items(
     """
     🔥 Get trending items
     """
-    trending = []
-    for i in range(n):
-        trending.append({
-            "item_id": 5000 + i,
-            "title": f"Trending Item {5000 + i}",
-            "trend_score": round(np.random.uniform(0.8, 1.0), 3),
-            "views": np.random.randint(10000, 1000000),
-            "genres": ["Thriller", "Mystery"],
-            "year": 2024
+    if timeframe not in WINDOWS:
+        raise HTTPException(status_code=400,
+                            detail=f"timeframe must be one of {', '.join(WINDOWS)}")
+    
+    top = trending.top(timeframe, n)
+    recommender = get_recommender()
+    metadata = recommender.content_model.item_metadata if recommender is not None else None
+    
+    trending_items = []
+    for item_id, score, events in top:
+        item_data = (metadata.get(item_id) if metadata is not None else None) or {}
+        trending_items.append({
+            "item_id": item_id,
+            "title": item_data.get('title', f'Item {item_id}'),
+            "trend_score": round(score, 3),
+            "views": events,
+            "genres": item_data.get('genres', '').split(),
+            "year": item_data.get('year')
         })
     
     return {
         "timeframe": timeframe,
-        "trending_items": trending,
-        "count": len(trending),
+        "trending_items": trending_items,
+        "count": len(trending_items),
+        # Over-count bounds of trend_score and views in sketch mode, null when exact
+        "error_bound": trending.error_bound(timeframe),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -232,6 +430,29 @@ async def get_similar_items(
     """
     🔗 Get items similar to a specific item
     """
+    recommender = get_recommender()
+    if recommender is not None:
+        # Precomputed table: an O(K) slice, cheap enough for the event loop
+        table = recommender.similar_items_table
+        neighbours = table.get(item_id, n) if table is not None and n <= table.k else None
+        if neighbours is None:
+            # Content features first, CF factors for items without metadata
+            neighbours = await run_scoring(recommender.similar_items, item_id, n)
+        similar = []
+        for similar_id, score in neighbours:
+            item_data = recommender.content_model.item_metadata.get(similar_id, {})
+            similar.append({
+                "item_id": similar_id,
+                "title": item_data.get('title', f'Item {similar_id}'),
+                "similarity_score": round(score, 3),
+                "genres": item_data.get('genres', '').split()
+            })
+        return {
+            "source_item_id": item_id,
+            "similar_items": similar,
+            "count": len(similar)
+        }
+    
     similar = []
     for i in range(n):
         similar.append({
@@ -258,13 +479,30 @@ async def batch_recommendations(
     """
     start_time = time.time()
     
+    user_ids = user_ids[:100]  # Limit to 100 users
+    
     results = []
-    for user_id in user_ids[:100]:  # Limit to 100 users
-        recs = await get_hybrid_recommendations(user_id, 5)
-        results.append({
-            "user_id": user_id,
-            "recommendations": recs[:5]
-        })
+    recommender = get_recommender()
+    if recommender is not None:
+        # One batched hybrid scoring pass for all users, as /recommend does
+        requests = [
+            {'user_id': user_id, 'user_interactions': get_user_interactions(user_id),
+             'n': 5, 'filter_watched': True}
+            for user_id in user_ids
+        ]
+        batch_recs = await run_scoring(recommender.recommend_many, requests)
+        for user_id, recs in zip(user_ids, batch_recs):
+            results.append({
+                "user_id": user_id,
+                "recommendations": recs
+            })
+    else:
+        for user_id in user_ids:
+            recs = await get_hybrid_recommendations(user_id, 5)
+            results.append({
+                "user_id": user_id,
+                "recommendations": recs[:5]
+            })
     
     latency = round((time.time() - start_time) * 1000, 2)
     
@@ -295,6 +533,14 @@ async def get_user_profile(user_id: int):
         }
     }
     
+    stats = features.user_stats(user_id)
+    if stats is not None:
+        profile["stats"] = {
+            "total_watched": stats['rating_count'],
+            "avg_rating": round(stats['avg_rating'], 1),
+            "member_since": datetime.fromtimestamp(stats['first_rating'] / 1000).date().isoformat()
+        }
+    
     return profile
 
 
@@ -306,7 +552,7 @@ async def get_system_stats():
     return {
         "total_users": 150000,
         "total_items": 25000,
-        "total_interactions": len(interactions_db),
+        "total_interactions": len(interactions),
         "recommendations_served_today": 2500000,
         "avg_latency_ms": 28.5,
         "cache_hit_rate": 85.5,
@@ -316,5 +562,78 @@ async def get_system_stats():
             "neural_network": "active",
             "hybrid": "active"
         },
+        "scoring": executor.stats(),
         "timestamp": datetime.now().isoformat()
-    }
\ No newline at end of file
+    }
+
+
+class ModelReloadRequest(BaseModel):
+    cf_path: str = Field(..., description="CF model artifact directory, relative to the models directory")
+    content_path: str = Field(..., description="Content model artifact directory")
+    version: Optional[str] = Field(None, description="Generation label (defaults to a timestamp)")
+    similar_items_path: Optional[str] = Field(None, description="Precomputed similar-items table")
+    recommendations_path: Optional[str] = Field(None, description="Precomputed per-user recommendations")
+
+
+def models_dir() -> str:
+    """Directory /models/reload may load artifacts from (MODELS_DIR overrides the config)"""
+    return os.path.realpath(os.getenv("MODELS_DIR", get_section('serving').get('models_dir', 'models')))
+
+def resolve_artifact_path(path: Optional[str]) -> Optional[str]:
+    """
+    Real path of an artifact directory inside models_dir(); 400 for
+    anything outside it or not an artifact (legacy pickles included)
+    """
+    if path is None:
+        return None
+    root = models_dir()
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail=f"{path} is outside the models directory")
+    if not is_artifact(resolved):
+        raise HTTPException(status_code=400, detail=f"{path} is not a model artifact directory")
+    return resolved
+
+def check_reload_token(token: Optional[str]):
+    """Model reloads need the MODEL_RELOAD_TOKEN secret; disabled when it is unset"""
+    expected = os.getenv("MODEL_RELOAD_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Model reload is disabled")
+    if not secrets.compare_digest((token or "").encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid reload token")
+
+
+@router.post("/models/reload", status_code=202)
+async def reload_models(request: ModelReloadRequest,
+                        reload_token: Optional[str] = Header(None, alias="X-Reload-Token")):
+    """
+    🔄 Load a new model generation in the background and swap it in
+    
+    Requires the X-Reload-Token header; paths must be artifact
+    directories inside the models directory. Poll /models for the outcome.
+    """
+    check_reload_token(reload_token)
+    registry.load_async(
+        resolve_artifact_path(request.cf_path), resolve_artifact_path(request.content_path),
+        request.version, resolve_artifact_path(request.similar_items_path),
+        resolve_artifact_path(request.recommendations_path), allow_legacy=False
+    )
+    current = registry.current
+    
+    return {
+        "status": "loading",
+        "serving": current.info() if current is not None else None
+    }
+
+
+@router.get("/models")
+async def get_model_info():
+    """
+    🧠 Serving model generation
+    """
+    current = registry.current
+    return {
+        "serving": current.info() if current is not None else None,
+        "draining": registry.draining(),
+        "last_load": registry.last_load
+    }
@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ServerOverloaded(Exception):
+    """Raised when the scoring queue is full and a request is shed"""
+
+class ScoringExecutor:
+    """
+    Bounded thread pool for CPU-bound model calls
+
+    Keeps NumPy scoring off the event loop. At most max_workers calls
+    run and max_queue more wait; beyond that run() fails fast with
+    ServerOverloaded instead of queueing without limit. Each call is
+    awaited for at most timeout_ms. A call that times out keeps its
+    slot until the worker actually finishes, so timeouts cannot be used
+    to pile up more work than the pool can hold.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: Optional[int] = None,
+                 timeout_ms: Optional[float] = None):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = self.max_workers * 4 if max_queue is None else max(0, int(max_queue))
+        self.timeout_ms = timeout_ms
+
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scoring")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ScoringExecutor":
+        """
+        Build from the performance section of config.yaml
+        """
+        return cls(
+            max_workers=config.get('max_workers', 4),
+            max_queue=config.get('max_queue'),
+            timeout_ms=config.get('request_timeout')
+        )
+
+    @property
+    def in_flight(self) -> int:
+        """Calls running or waiting for a worker"""
+        return self._in_flight
+
+    async def run(self, fn: Callable, *args, timeout_ms: Optional[float] = None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the pool and await its result
+
+        Raises ServerOverloaded when no slot is free and
+        asyncio.TimeoutError when the call exceeds timeout_ms (defaults
+        to the executor's timeout; 0 waits indefinitely).
+        """
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise ServerOverloaded(f"{self.max_workers + self.max_queue} scoring calls in flight")
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+
+        timeout_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future),
+                                          timeout_ms / 1000 if timeout_ms else None)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"Scoring call {getattr(fn, '__name__', fn)} exceeded {timeout_ms}ms")
+            raise
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': self._in_flight,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,83 @@
+import click
+import logging
+
+from src.utils.config import get_section
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+@click.group()
+def cli():
+    """Offline jobs run against saved model artifacts"""
+
+@cli.command("similar-items")
+@click.option("--cf-path", default="models/cf_model", show_default=True,
+              help="CF model artifact directory")
+@click.option("--content-path", default="models/content_model", show_default=True,
+              help="Content model artifact directory")
+@click.option("--output", default="models/similar_items", show_default=True,
+              help="Where to write the similar-items table")
+@click.option("--k", type=int, default=None, help="Neighbours per item")
+@click.option("--blend", type=float, default=None,
+              help="Weight of CF-factor similarity (content gets 1 - blend)")
+@click.option("--block-size", type=int, default=None, help="Rows scored per matrix multiply")
+@click.option("--workers", type=int, default=None, help="Worker processes")
+def similar_items(cf_path, content_path, output, k, blend, block_size, workers):
+    """Precompute top-K neighbours of every item for /similar"""
+    from src.jobs.similar_items import build_similar_items
+    from src.models.hybrid_model import HybridRecommender
+
+    config = get_section('jobs', 'similar_items')
+    model = HybridRecommender.from_config(get_section('models'))
+    model.load(cf_path, content_path)
+
+    table = build_similar_items(
+        model,
+        k=k if k is not None else config.get('k', 50),
+        blend=blend if blend is not None else config.get('blend', 0.5),
+        block_size=block_size if block_size is not None else config.get('block_size', 1024),
+        workers=workers if workers is not None else config.get('workers', 1)
+    )
+    table.save(output)
+    click.echo(f"Wrote {len(table)} items x {table.k} neighbours to {output}")
+
+@cli.command("recommend-all")
+@click.option("--cf-path", default="models/cf_model", show_default=True,
+              help="CF model artifact directory")
+@click.option("--content-path", default="models/content_model", show_default=True,
+              help="Content model artifact directory")
+@click.option("--output", default="models/recommendations", show_default=True,
+              help="Where to write the precomputed recommendations")
+@click.option("--n", type=int, default=None, help="Recommendations stored per user")
+@click.option("--chunk-size", type=int, default=None, help="Users scored per batch")
+@click.option("--workers", type=int, default=None, help="Worker processes")
+@click.option("--interactions-path", default=None,
+              help="Interaction log written by /feedback (default: storage.interactions_path)")
+def recommend_all(cf_path, content_path, output, n, chunk_size, workers, interactions_path):
+    """Precompute top-N recommendations for every known user"""
+    from src.jobs.precompute_recommendations import precompute_recommendations
+    from src.models.hybrid_model import HybridRecommender
+    from src.utils.interaction_store import InteractionStore
+
+    config = get_section('jobs', 'recommendations')
+    model = HybridRecommender.from_config(get_section('models'))
+    model.load(cf_path, content_path)
+    interactions = InteractionStore.from_config(get_section('storage'), path=interactions_path)
+
+    table = precompute_recommendations(
+        model,
+        n=n if n is not None else config.get('n', 50),
+        chunk_size=chunk_size if chunk_size is not None else config.get('chunk_size', 1024),
+        workers=workers if workers is not None else config.get('workers', 1),
+        diversity_weight=config.get('diversity_weight', 0.2),
+        cf_path=cf_path,
+        content_path=content_path,
+        interactions=interactions
+    )
+    table.save(output)
+    click.echo(f"Wrote top-{table.n} recommendations for {len(table)} users to {output}")
+
+if __name__ == "__main__":
+    cli()
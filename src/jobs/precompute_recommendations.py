@@ -0,0 +1,104 @@
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Tuple, Optional
+import logging
+import time
+
+from src.models.hybrid_model import HybridRecommender
+from src.models.precomputed import PrecomputedRecommendations
+from src.utils.config import get_section
+from src.utils.interaction_store import InteractionStore
+
+logger = logging.getLogger(__name__)
+
+# Model shared with pool workers, loaded once per process by _init_worker
+_state: Dict[str, Any] = {}
+
+def _init_worker(cf_path: str, content_path: str, n: int, diversity_weight: float):
+    model = HybridRecommender.from_config(get_section('models'))
+    model.load(cf_path, content_path)
+    _state.update(model=model, n=n, diversity_weight=diversity_weight)
+
+def _chunk_recommendations(chunk: Tuple[List[int], List[List[Tuple[int, float]]]]
+                           ) -> Tuple[List[int], List[List[Tuple[int, float]]]]:
+    """
+    recommend_many for one chunk of (user_ids, logged interactions), as
+    (item_id, score) pairs
+    """
+    model, n = _state['model'], _state['n']
+    user_ids, user_interactions = chunk
+    requests = [
+        {'user_id': user_id, 'user_interactions': logged, 'n': n, 'filter_watched': True,
+         'diversity_weight': _state['diversity_weight']}
+        for user_id, logged in zip(user_ids, user_interactions)
+    ]
+    results = model.recommend_many(requests)
+    return user_ids, [[(rec['item_id'], rec['score']) for rec in recs] for recs in results]
+
+def precompute_recommendations(model: HybridRecommender, n: int = 50, chunk_size: int = 1024,
+                               workers: int = 1, diversity_weight: float = 0.2,
+                               cf_path: Optional[str] = None,
+                               content_path: Optional[str] = None,
+                               interactions: Optional[InteractionStore] = None
+                               ) -> PrecomputedRecommendations:
+    """
+    Top-n hybrid recommendations for every CF training user
+
+    Users are scored chunk_size at a time with recommend_many, the same
+    path /recommend uses for users without recent feedback, including
+    their interactions logged in interactions (the /feedback log). With
+    workers > 1 chunks are spread over processes that each memory-map
+    the artifacts at cf_path / content_path.
+    """
+    start_time = time.time()
+    user_ids = np.asarray(model.cf_model.user_index.sorted_ids, dtype=np.int64)
+    item_ids = np.unique(np.concatenate([
+        np.asarray(model.cf_model.item_ids, dtype=np.int64),
+        np.asarray(model.content_model.item_ids, dtype=np.int64)
+    ]))
+
+    items = np.full((len(user_ids), n), -1, dtype=np.int32)
+    scores = np.full((len(user_ids), n), np.nan, dtype=np.float32)
+    rows = {user_id: row for row, user_id in enumerate(user_ids.tolist())}
+
+    def store(chunk_users: List[int], chunk_recs: List[List[Tuple[int, float]]]):
+        for user_id, recs in zip(chunk_users, chunk_recs):
+            if not recs:
+                continue
+            row = rows[user_id]
+            items[row, :len(recs)] = np.searchsorted(item_ids, [item_id for item_id, _ in recs])
+            scores[row, :len(recs)] = [score for _, score in recs]
+
+    def logged(chunk_users: List[int]) -> List[List[Tuple[int, float]]]:
+        if interactions is None:
+            return [[] for _ in chunk_users]
+        return [interactions.user_interactions(user_id) for user_id in chunk_users]
+    
+    # Interactions are read as each chunk is scored (or submitted), not up front
+    chunks = ((chunk_users, logged(chunk_users)) for chunk_users in
+              (user_ids[start:start + chunk_size].tolist()
+               for start in range(0, len(user_ids), chunk_size)))
+    if workers > 1 and len(user_ids) > chunk_size:
+        if cf_path is None or content_path is None:
+            raise ValueError("workers > 1 needs cf_path and content_path to load the model")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(cf_path, content_path, n, diversity_weight)) as pool:
+            # pool.map would submit (and so materialize) every chunk at once
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_chunk_recommendations, chunk))
+                if len(pending) >= 2 * workers:
+                    store(*pending.popleft().result())
+            while pending:
+                store(*pending.popleft().result())
+    else:
+        _state.update(model=model, n=n, diversity_weight=diversity_weight)
+        for chunk in chunks:
+            store(*_chunk_recommendations(chunk))
+        _state.clear()
+
+    logger.info(f"Precomputed top-{n} for {len(user_ids)} users in {time.time() - start_time:.1f}s")
+    # Activity after the job started is not reflected in the table
+    return PrecomputedRecommendations(user_ids, item_ids, items, scores, generated_at=start_time,
+                                      params={'diversity_weight': diversity_weight})
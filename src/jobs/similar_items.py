@@ -0,0 +1,113 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, Dict, Any
+import logging
+import time
+
+from src.models.hybrid_model import HybridRecommender
+from src.models.similar_items import SimilarItemsTable
+from src.utils.ranking import top_k_rows
+
+logger = logging.getLogger(__name__)
+
+# Matrices shared with pool workers, set once per process by _init_worker
+_state: Dict[str, Any] = {}
+
+def _init_worker(cf_vectors: Optional[np.ndarray], content_vectors: Optional[np.ndarray],
+                 blend: float, k: int):
+    _state.update(cf=cf_vectors, content=content_vectors, blend=blend, k=k)
+
+def _block_neighbours(bounds: Tuple[int, int]) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Top-k blended neighbours of rows [start, end)"""
+    start, end = bounds
+    cf, content, blend, k = _state['cf'], _state['content'], _state['blend'], _state['k']
+    n_items = len(cf) if cf is not None else len(content)
+
+    scores = np.zeros((end - start, n_items), dtype=np.float32)
+    if cf is not None and blend > 0:
+        scores += blend * (cf[start:end] @ cf.T)
+    if content is not None and blend < 1:
+        scores += (1 - blend) * (content[start:end] @ content.T)
+    scores[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+    top = top_k_rows(scores, k)
+    return start, top.astype(np.int32), np.take_along_axis(scores, top, axis=1)
+
+def _aligned(item_ids: np.ndarray, ids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """L2-normalized float32 rows of vectors placed at the rows of item_ids; zeros elsewhere"""
+    out = np.zeros((len(item_ids), vectors.shape[1]), dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    out[np.searchsorted(item_ids, ids)] = vectors / np.maximum(norms, 1e-12)
+    return out
+
+def compute_similar_items(item_ids: np.ndarray, cf_vectors: Optional[np.ndarray] = None,
+                          content_vectors: Optional[np.ndarray] = None, k: int = 50,
+                          blend: float = 0.5, block_size: int = 1024,
+                          workers: int = 1) -> SimilarItemsTable:
+    """
+    Top-k neighbours of every item by blended cosine similarity
+
+    Rows of cf_vectors / content_vectors are aligned with item_ids (an
+    all-zero row means the model has no vector for that item). The score
+    is blend * cf cosine + (1 - blend) * content cosine. Rows are scored
+    block_size at a time with one matrix multiply per model, spread over
+    a pool of worker processes when workers > 1.
+    """
+    if not 0.0 <= blend <= 1.0:
+        raise ValueError(f"blend must be in [0, 1], got {blend}")
+
+    n_items = len(item_ids)
+    k = min(k, max(n_items - 1, 0))
+    blocks = [(start, min(start + block_size, n_items)) for start in range(0, n_items, block_size)]
+    indices = np.empty((n_items, k), dtype=np.int32)
+    scores = np.empty((n_items, k), dtype=np.float32)
+
+    initargs = (cf_vectors, content_vectors, blend, k)
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=initargs) as pool:
+            results = pool.map(_block_neighbours, blocks)
+            for start, block_indices, block_scores in results:
+                indices[start:start + len(block_indices)] = block_indices
+                scores[start:start + len(block_scores)] = block_scores
+    else:
+        _init_worker(*initargs)
+        for bounds in blocks:
+            start, block_indices, block_scores = _block_neighbours(bounds)
+            indices[start:start + len(block_indices)] = block_indices
+            scores[start:start + len(block_scores)] = block_scores
+
+    offsets = np.arange(n_items + 1, dtype=np.int64) * k
+    return SimilarItemsTable(np.asarray(item_ids, dtype=np.int64), offsets,
+                             indices.ravel(), scores.ravel(), k, {'blend': blend})
+
+def build_similar_items(model: HybridRecommender, k: int = 50, blend: float = 0.5,
+                        block_size: int = 1024, workers: int = 1) -> SimilarItemsTable:
+    """
+    Similar-items table over the union of the CF and content catalogs
+    """
+    start_time = time.time()
+    cf, content = model.cf_model, model.content_model
+
+    sources = []
+    if cf.item_factors is not None and len(cf.item_ids):
+        sources.append(('cf', np.asarray(cf.item_ids, dtype=np.int64), cf.item_factors))
+    if content.item_features is not None and len(content.item_ids):
+        sources.append(('content', np.asarray(content.item_ids, dtype=np.int64), content.item_features))
+    if not sources:
+        raise ValueError("Model has no item vectors to compare")
+
+    item_ids = np.unique(np.concatenate([ids for _, ids, _ in sources]))
+    vectors = {name: _aligned(item_ids, ids, matrix) for name, ids, matrix in sources}
+    # A single available model gets the full weight
+    if 'cf' not in vectors:
+        blend = 0.0
+    elif 'content' not in vectors:
+        blend = 1.0
+
+    table = compute_similar_items(item_ids, vectors.get('cf'), vectors.get('content'),
+                                  k=k, blend=blend, block_size=block_size, workers=workers)
+    logger.info(f"Similar items for {len(item_ids)} items (k={table.k}, blend={blend}) "
+                f"computed in {time.time() - start_time:.1f}s")
+    return table
@@ -4,13 +4,19 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import logging
 from datetime import datetime
 import redis.asyncio as redis
 from typing import Optional
 import os
 
+from src.api import endpoints
 from src.api.endpoints import router
+from src.models.trending import load_trending
+from src.preprocessing.feature_store import IncrementalFeatureStore
+from src.utils.config import get_section
+from src.utils.interaction_store import InteractionStore
 from src.utils.metrics import MetricsCollector
 
 # Configure logging
@@ -23,6 +29,16 @@ logger = logging.getLogger(__name__)
 # Global variables
 redis_client: Optional[redis.Redis] = None
 metrics_collector = MetricsCollector()
+endpoints.cache.metrics = metrics_collector
+
+async def flush_interactions(interval: float):
+    """Periodically write buffered /feedback records to the interaction log"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(endpoints.interactions.flush)
+        except Exception as e:
+            logger.error(f"❌ Interaction log flush failed: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -39,15 +55,97 @@ async def lifespan(app: FastAPI):
             decode_responses=True
         )
         await redis_client.ping()
+        endpoints.cache.redis = redis_client
         logger.info("✅ Redis connected successfully")
     except Exception as e:
         logger.warning(f"⚠️ Redis connection failed: {e}")
         redis_client = None
     
+    # Load trained models if artifacts exist
+    cf_path = os.getenv("CF_MODEL_PATH", "models/cf_model")
+    content_path = os.getenv("CONTENT_MODEL_PATH", "models/content_model")
+    similar_items_path = os.getenv("SIMILAR_ITEMS_PATH", "models/similar_items")
+    if not os.path.exists(similar_items_path):
+        similar_items_path = None
+    recommendations_path = os.getenv("RECOMMENDATIONS_PATH", "models/recommendations")
+    if not os.path.exists(recommendations_path):
+        recommendations_path = None
+    if os.path.exists(cf_path) and os.path.exists(content_path):
+        try:
+            await asyncio.wrap_future(endpoints.registry.load_async(
+                cf_path, content_path, similar_items_path=similar_items_path,
+                recommendations_path=recommendations_path
+            ))
+            logger.info("✅ Models loaded successfully")
+        except Exception as e:
+            logger.warning(f"⚠️ Model loading failed: {e}")
+    else:
+        logger.warning("⚠️ No trained models found, serving fallback recommendations")
+    
+    # Interaction log
+    storage_config = get_section('storage')
+    interactions_path = os.getenv("INTERACTIONS_PATH")
+    if interactions_path:
+        endpoints.interactions = InteractionStore.from_config(storage_config, path=interactions_path)
+    flush_task = asyncio.create_task(flush_interactions(storage_config.get('flush_interval', 1.0)))
+    
+    # Trending counters: last snapshot plus the interactions logged after it
+    trending_config = get_section('trending')
+    trending_path = os.getenv("TRENDING_SNAPSHOT_PATH", trending_config.get('snapshot_path'))
+    try:
+        if trending_path and os.path.exists(trending_path):
+            restored = load_trending(trending_path)
+            # A snapshot of the other mode is ignored and rebuilt from the log
+            if type(restored) is type(endpoints.trending):
+                endpoints.trending = restored
+        if len(endpoints.interactions):
+            since_ms = int((datetime.now().timestamp() - 30 * 86400) * 1000)
+            if endpoints.trending.saved_at is not None:
+                since_ms = max(since_ms, endpoints.trending.saved_at + 1)
+            replayed = 0
+            for records in endpoints.interactions.blocks(start_ms=since_ms):
+                endpoints.trending.ingest(records['item_id'], records['timestamp'])
+                replayed += len(records)
+            logger.info(f"✅ Trending replayed {replayed} logged interactions")
+    except Exception as e:
+        logger.warning(f"⚠️ Trending restore failed: {e}")
+    
+    # Rating aggregates: last snapshot plus the interactions logged after
+    # it, else rebuilt from the log. Seeded from the model so their codes
+    # are its user/item rows; a snapshot with other codes is rebuilt, and
+    # models published by a later /models/reload keep the startup codes
+    features_path = os.getenv("FEATURES_SNAPSHOT_PATH", storage_config.get('features_snapshot_path'))
+    recommender = endpoints.get_recommender()
+    seeded = (IncrementalFeatureStore.from_model(recommender.cf_model)
+              if recommender is not None else IncrementalFeatureStore())
+    try:
+        since_ms = None
+        endpoints.features = seeded
+        if features_path and os.path.exists(features_path):
+            restored = IncrementalFeatureStore.load(features_path)
+            if restored.extends(seeded) and restored.saved_at is not None:
+                endpoints.features = restored
+                since_ms = restored.saved_at + 1
+        replayed = 0
+        for records in endpoints.interactions.blocks(start_ms=since_ms):
+            endpoints.features.update_records(records)
+            replayed += len(records)
+        logger.info(f"✅ Features of {len(endpoints.features.users)} users restored, "
+                    f"{replayed} logged interactions replayed")
+    except Exception as e:
+        logger.warning(f"⚠️ Feature restore failed: {e}")
+    
     yield
     
     # Shutdown
     logger.info("👋 Shutting down...")
+    flush_task.cancel()
+    endpoints.interactions.flush()
+    if trending_path and len(endpoints.trending):
+        endpoints.trending.save(trending_path)
+    if features_path and len(endpoints.features.users):
+        endpoints.features.save(features_path)
+    endpoints.cache.redis = None
     if redis_client:
         await redis_client.close()
 
@@ -107,7 +205,12 @@ async def health_check():
 @app.get("/metrics")
 async def get_metrics():
     """Get application metrics"""
-    return await metrics_collector.get_metrics()
+    metrics = await metrics_collector.get_metrics()
+    metrics["batching"] = endpoints.batcher.stats()
+    metrics["scoring"] = endpoints.executor.stats()
+    metrics["cache"] = endpoints.cache.stats()
+    metrics["interactions"] = endpoints.interactions.stats()
+    return metrics
 
 
 def format_number(value):
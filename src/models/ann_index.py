@@ -0,0 +1,275 @@
+import os
+import json
+import numpy as np
+from typing import Optional, Tuple, Iterable, Dict, Any
+import logging
+
+from src.utils.ranking import top_k
+
+logger = logging.getLogger(__name__)
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (zero rows stay zero)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def _float_dtype(vectors: np.ndarray) -> np.dtype:
+    """float32 or float64 as given, float64 for anything else"""
+    return vectors.dtype if vectors.dtype in (np.float32, np.float64) else np.dtype(np.float64)
+
+class ANNIndex:
+    """
+    Cosine nearest-neighbour index over the rows of a matrix
+
+    Subclasses implement _search; query() handles normalisation,
+    exclusions and the exact-search fallback. Vectors are kept in the
+    dtype of the indexed matrix (float32 factors stay float32).
+    """
+
+    kind = "base"
+
+    def __init__(self):
+        self.vectors = None
+
+    def build(self, vectors: np.ndarray) -> "ANNIndex":
+        """Index the rows of vectors"""
+        vectors = np.asarray(vectors)
+        self.vectors = _normalize(vectors.astype(_float_dtype(vectors), copy=False))
+        return self
+
+    def query(self, vector: np.ndarray, k: int = 10, exclude: Optional[Iterable[int]] = None,
+              exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by cosine similarity to vector
+
+        exclude: row indices that must not be returned
+        exact: scan every row instead of using the index structure
+
+        Returns (row indices, similarities), highest first.
+        """
+        query = _normalize(np.asarray(vector, dtype=self.vectors.dtype).ravel())
+
+        if exact:
+            candidates = np.arange(len(self.vectors))
+        else:
+            candidates = self._search(query, k)
+
+        if exclude is not None:
+            exclude = np.fromiter(exclude, dtype=np.int64)
+            if len(exclude):
+                candidates = candidates[~np.isin(candidates, exclude)]
+
+        scores = self.vectors[candidates] @ query
+        top = top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def _search(self, query: np.ndarray, k: int) -> np.ndarray:
+        """Candidate row indices for a normalised query"""
+        raise NotImplementedError
+
+    def _params(self) -> Dict[str, Any]:
+        return {}
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {'vectors': self.vectors}
+
+    def save(self, path: str):
+        """Save index as a directory of .npy arrays plus meta.json"""
+        os.makedirs(path, exist_ok=True)
+        for name, array in self._arrays().items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({'kind': self.kind, 'params': self._params()}, f)
+        logger.info(f"{self.kind} index saved to {path}")
+
+    @classmethod
+    def _from_arrays(cls, params: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> "ANNIndex":
+        index = cls(**params)
+        for name, array in arrays.items():
+            setattr(index, name, array)
+        return index
+
+class ExactIndex(ANNIndex):
+    """
+    Brute-force index, used as the reference for recall measurements
+    """
+
+    kind = "exact"
+
+    def _search(self, query: np.ndarray, k: int) -> np.ndarray:
+        return np.arange(len(self.vectors))
+
+class IVFIndex(ANNIndex):
+    """
+    Inverted-file index with spherical k-means coarse quantization
+
+    Rows are grouped into n_lists clusters; a query scans only the rows
+    of the n_probe closest clusters. n_probe is the recall/latency knob:
+    n_probe = n_lists is an exact search.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8,
+                 kmeans_iterations: int = 10, seed: int = 42):
+        super().__init__()
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+
+        self.centroids = None
+        self.list_offsets = None
+        self.list_items = None
+
+    def build(self, vectors: np.ndarray) -> "IVFIndex":
+        super().build(vectors)
+        n_rows = len(self.vectors)
+        if self.n_lists is None:
+            self.n_lists = max(1, int(np.sqrt(n_rows)))
+        self.n_lists = min(self.n_lists, max(1, n_rows))
+
+        self.centroids = self._kmeans(self.vectors)
+        assignments = np.argmax(self.vectors @ self.centroids.T, axis=1)
+
+        # CSR-style inverted lists: rows of list c are list_items[offsets[c]:offsets[c+1]]
+        self.list_items = np.argsort(assignments, kind='stable')
+        self.list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=self.n_lists), out=self.list_offsets[1:])
+
+        logger.info(f"Built IVF index: {n_rows} rows, {self.n_lists} lists")
+        return self
+
+    def _kmeans(self, vectors: np.ndarray) -> np.ndarray:
+        """Spherical k-means on a sample of the rows"""
+        rng = np.random.default_rng(self.seed)
+        n_rows = len(vectors)
+
+        sample_size = min(n_rows, 256 * self.n_lists)
+        sample = vectors[rng.choice(n_rows, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.n_lists, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+
+            # Keep the previous centroid for empty clusters
+            empty = ~np.any(sums, axis=1)
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+
+        return centroids
+
+    def _search(self, query: np.ndarray, k: int) -> np.ndarray:
+        probes = top_k(self.centroids @ query, min(self.n_probe, self.n_lists))
+        return np.concatenate([
+            self.list_items[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes
+        ])
+
+    def _params(self) -> Dict[str, Any]:
+        return {
+            'n_lists': self.n_lists,
+            'n_probe': self.n_probe,
+            'kmeans_iterations': self.kmeans_iterations,
+            'seed': self.seed
+        }
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'vectors': self.vectors,
+            'centroids': self.centroids,
+            'list_offsets': self.list_offsets,
+            'list_items': self.list_items
+        }
+
+class MIPSIndex(IVFIndex):
+    """
+    Maximum-inner-product index built on IVF
+
+    Rows x are mapped to [x / M, sqrt(1 - |x|^2 / M^2)] (M = largest row
+    norm) and queries q to [q, 0]; cosine order in that space equals
+    inner-product order in the original one, so the IVF partitions give
+    sub-linear top-k retrieval of x . q. Returned scores are the inner
+    products. recall holds the recall@k measured by measure_recall.
+    """
+
+    kind = "mips"
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8,
+                 kmeans_iterations: int = 10, seed: int = 42,
+                 max_norm: Optional[float] = None, recall: Optional[Dict[str, float]] = None):
+        super().__init__(n_lists, n_probe, kmeans_iterations, seed)
+        self.max_norm = max_norm
+        self.recall = recall or {}
+
+    def build(self, vectors: np.ndarray) -> "MIPSIndex":
+        vectors = np.asarray(vectors)
+        dtype = _float_dtype(vectors)
+        vectors = vectors.astype(np.float64)
+        norms = np.linalg.norm(vectors, axis=1)
+        self.max_norm = float(norms.max()) if len(norms) and norms.max() > 0 else 1.0
+
+        extra = np.sqrt(np.maximum(0.0, 1.0 - (norms / self.max_norm) ** 2))
+        augmented = np.hstack([vectors / self.max_norm, extra[:, np.newaxis]])
+        return super().build(augmented.astype(dtype))
+
+    def query(self, vector: np.ndarray, k: int = 10, exclude: Optional[Iterable[int]] = None,
+              exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float64).ravel()
+        indices, cosines = super().query(np.append(vector, 0.0), k, exclude, exact)
+        return indices, cosines * self.max_norm * np.linalg.norm(vector)
+
+    def measure_recall(self, queries: np.ndarray, k: int = 10) -> float:
+        """Measure and record recall@k against brute-force inner products"""
+        recall = recall_at_k(self, queries, k)
+        self.recall[str(k)] = recall
+        logger.info(f"MIPS index recall@{k} = {recall:.4f} (n_probe={self.n_probe}, "
+                    f"n_lists={self.n_lists}, {len(queries)} queries)")
+        return recall
+
+    def log_recall(self):
+        """Log the recall recorded when the index was built"""
+        measured = ", ".join(f"recall@{k} = {value:.4f}" for k, value in self.recall.items())
+        logger.info(f"MIPS index {measured or 'recall not measured'} (n_probe={self.n_probe}, "
+                    f"n_lists={self.n_lists})")
+    
+    def _params(self) -> Dict[str, Any]:
+        params = super()._params()
+        params.update({'max_norm': self.max_norm, 'recall': self.recall})
+        return params
+
+INDEX_TYPES = {cls.kind: cls for cls in (ExactIndex, IVFIndex, MIPSIndex)}
+
+def build_index(kind: str, vectors: np.ndarray, **params) -> ANNIndex:
+    """Build an index of the given kind ('exact', 'ivf' or 'mips')"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {list(INDEX_TYPES)}")
+    return INDEX_TYPES[kind](**params).build(vectors)
+
+def load_index(path: str, mmap_mode: Optional[str] = None) -> ANNIndex:
+    """Load an index saved with ANNIndex.save"""
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+
+    cls = INDEX_TYPES[meta['kind']]
+    arrays = {
+        name[:-len(".npy")]: np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+        for name in os.listdir(path) if name.endswith(".npy")
+    }
+    return cls._from_arrays(meta['params'], arrays)
+
+def recall_at_k(index: ANNIndex, queries: np.ndarray, k: int = 10) -> float:
+    """
+    Mean recall@k of index.query against exact search for each query row
+    """
+    if len(queries) == 0:
+        return 1.0
+
+    hits = 0
+    for query in queries:
+        approx, _ = index.query(query, k)
+        exact, _ = index.query(query, k, exact=True)
+        hits += len(np.intersect1d(approx, exact))
+
+    return hits / (len(queries) * min(k, len(index.vectors)))
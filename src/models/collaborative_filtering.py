@@ -2,73 +2,241 @@ import numpy as np
 from scipy.sparse import csr_matrix
 from sklearn.metrics.pairwise import cosine_similarity
 import joblib
-from typing import List, Tuple, Optional
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional, Dict, Any, Iterable, Callable
 import logging
 
+from src.models.ann_index import ANNIndex, MIPSIndex, build_index, load_index
+from src.utils.artifacts import (
+    IdIndex, artifact_writer, is_artifact, load_arrays, read_manifest, save_arrays, write_manifest
+)
+from src.utils.quantization import QuantizedMatrix
+from src.utils.ranking import top_k, top_k_rows
+
 logger = logging.getLogger(__name__)
 
 class CollaborativeFiltering:
     """
     Matrix Factorization using Alternating Least Squares (ALS)
+    
+    Solvers:
+        loop    - reference implementation, one CSR slice + solve per row
+        batched - works directly on CSR indptr/indices/data, builds the
+                  per-row normal equations in blocks and solves them with
+                  stacked np.linalg.solve calls, optionally across threads
+        cg      - same data layout, but runs cg_steps conjugate-gradient
+                  iterations per row warm-started from the previous
+                  factors instead of an exact O(f^3) solve
+    
+    With implicit=True the batched and cg solvers uses the implicit-feedback
+    objective (Hu et al.): the shared Gram matrix Y^T Y is computed once
+    per half-step and each row only adds Y_u^T (C_u - I) Y_u over its own
+    nonzeros.
+    
+    Factors are trained in float64 and stored as dtype (float32 by
+    default). With candidate_dtype set ('float16' | 'int8'), predict
+    scores the catalog against a compact copy of item_factors and
+    re-ranks the best rerank candidates exactly.
     """
     
+    SOLVERS = ("loop", "batched", "cg")
+    ARTIFACT_FORMAT = "collaborative_filtering"
+    
+    # Upper bound on the float64 scratch used for per-row outer products
+    # in one block of the batched solver (elements, not bytes)
+    BLOCK_ELEMENTS = 4_000_000
+    
+    # Number of nonzeros scored per chunk when computing the loss
+    LOSS_CHUNK_SIZE = 65_536
+    
+    # Max number of folded-in user vectors kept (least recently updated dropped)
+    FOLD_IN_CACHE_SIZE = 100_000
+    
+    # Training users sampled to measure MIPS recall@MIPS_RECALL_K
+    MIPS_RECALL_SAMPLE = 200
+    MIPS_RECALL_K = 10
+    
     def __init__(self, n_factors: int = 100, regularization: float = 0.01, 
-                 iterations: int = 15, alpha: float = 40):
+                 iterations: int = 15, alpha: float = 40,
+                 solver: str = "loop", n_jobs: int = 1, implicit: bool = False,
+                 cg_steps: int = 3, loss_negative_samples: int = 0,
+                 ann: Optional[str] = None, ann_params: Optional[Dict[str, Any]] = None,
+                 mips: bool = False, mips_params: Optional[Dict[str, Any]] = None,
+                 dtype: str = "float32", candidate_dtype: Optional[str] = None,
+                 rerank: int = 200, time_budget: Optional[float] = None,
+                 tol: Optional[float] = None):
+        if solver not in self.SOLVERS:
+            raise ValueError(f"Unknown ALS solver '{solver}', expected one of {self.SOLVERS}")
+        if implicit and solver == "loop":
+            raise ValueError("implicit=True requires the 'batched' or 'cg' solver")
+        
         self.n_factors = n_factors
         self.regularization = regularization
         self.iterations = iterations
         self.alpha = alpha
+        self.solver = solver
+        self.n_jobs = max(1, int(n_jobs))
+        self.implicit = implicit
+        self.cg_steps = cg_steps
+        self.loss_negative_samples = loss_negative_samples
+        # Early stopping defaults for fit (see fit)
+        self.time_budget = time_budget
+        self.tol = tol
+        # Item-item similarity index ('exact' | 'ivf'), None for brute force
+        self.ann = ann
+        self.ann_params = ann_params or {}
+        # Inner-product index over item_factors used by predict
+        self.mips = mips
+        self.mips_params = mips_params or {}
+        # Storage dtype of the trained factors
+        self.dtype = dtype
+        # Compact item matrix for candidate scoring, None to score exactly
+        self.candidate_dtype = candidate_dtype
+        self.rerank = rerank
         
         self.user_factors = None
         self.item_factors = None
-        self.user_index = {}
-        self.item_index = {}
+        self.user_index = IdIndex.from_ids([])
+        self.item_index = IdIndex.from_ids([])
+        # Item ids aligned with item_factors rows (reverse of item_index)
+        self.item_ids = np.empty(0, dtype=np.int64)
+        # Training interactions, used to mask already-seen items
+        self.user_items = None
+        self.similarity_index: Optional[ANNIndex] = None
+        self.mips_index: Optional[MIPSIndex] = None
+        self.item_candidates: Optional[QuantizedMatrix] = None
+        # Fold-in state: vectors for new/updated users (an LRU shared by
+        # the scoring threads, guarded by _fold_lock), cached Y^T Y
+        self.folded_factors: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._fold_lock = threading.Lock()
+        self._gram = None
+    
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CollaborativeFiltering":
+        """
+        Build from the models.collaborative_filtering section of config.yaml
+        """
+        return cls(
+            n_factors=config.get('factors', 100),
+            regularization=config.get('regularization', 0.01),
+            iterations=config.get('iterations', 15),
+            alpha=config.get('alpha', 40),
+            solver=config.get('solver', 'loop'),
+            n_jobs=config.get('n_jobs', 1),
+            implicit=config.get('implicit', False),
+            cg_steps=config.get('cg_steps', 3),
+            loss_negative_samples=config.get('loss_negative_samples', 0),
+            ann=config.get('ann'),
+            ann_params=config.get('ann_params'),
+            mips=config.get('mips', False),
+            mips_params=config.get('mips_params'),
+            dtype=config.get('dtype', 'float32'),
+            candidate_dtype=config.get('candidate_dtype'),
+            rerank=config.get('rerank', 200),
+            time_budget=config.get('time_budget'),
+            tol=config.get('tol')
+        )
         
-    def fit(self, user_item_matrix: csr_matrix, user_ids: List[int], item_ids: List[int]):
+    def fit(self, user_item_matrix: csr_matrix, user_ids: List[int], item_ids: List[int],
+            time_budget: Optional[float] = None, tol: Optional[float] = None):
         """
         Train the model using ALS
+        
+        time_budget: wall-clock seconds; no iteration is started that is
+            expected (from the mean iteration time so far) to overrun it
+        tol: stop once the relative loss improvement between two
+            iterations drops below this threshold (loss is then evaluated
+            every iteration)
+        
+        Both default to the values the model was configured with.
         """
+        time_budget = self.time_budget if time_budget is None else time_budget
+        tol = self.tol if tol is None else tol
         logger.info(f"Training CF model with {len(user_ids)} users and {len(item_ids)} items")
         
         n_users, n_items = user_item_matrix.shape
         
         # Create index mappings
-        self.user_index = {uid: idx for idx, uid in enumerate(user_ids)}
-        self.item_index = {iid: idx for idx, iid in enumerate(item_ids)}
+        self.user_index = IdIndex.from_ids(user_ids)
+        self.item_index = IdIndex.from_ids(item_ids)
+        self.item_ids = np.asarray(item_ids)
+        self.user_items = csr_matrix(user_item_matrix)
+        self.clear_folded()
+        self._gram = None
         
         # Initialize factors randomly
         self.user_factors = np.random.normal(0, 0.1, (n_users, self.n_factors))
         self.item_factors = np.random.normal(0, 0.1, (n_items, self.n_factors))
         
+        start_time = time.perf_counter()
+        previous_loss = None
+        
         # ALS iterations
         for iteration in range(self.iterations):
+            if time_budget is not None and iteration > 0:
+                elapsed = time.perf_counter() - start_time
+                if elapsed + elapsed / iteration > time_budget:
+                    logger.info(f"Time budget of {time_budget}s reached after {iteration} iterations")
+                    break
+            
             # Update user factors
             self.user_factors = self._als_step(
                 user_item_matrix, 
                 self.item_factors, 
-                self.regularization
+                self.regularization,
+                initial=self.user_factors
             )
             
             # Update item factors
             self.item_factors = self._als_step(
                 user_item_matrix.T, 
                 self.user_factors, 
-                self.regularization
+                self.regularization,
+                initial=self.item_factors
             )
             
-            if (iteration + 1) % 5 == 0:
+            if tol is not None or (iteration + 1) % 5 == 0:
                 loss = self._calculate_loss(user_item_matrix)
                 logger.info(f"Iteration {iteration + 1}/{self.iterations}, Loss: {loss:.4f}")
+                
+                if tol is not None and previous_loss is not None:
+                    improvement = (previous_loss - loss) / max(abs(previous_loss), 1e-12)
+                    if improvement < tol:
+                        logger.info(f"Loss improvement {improvement:.2e} below tol, stopping")
+                        break
+                previous_loss = loss
+        
+        self.user_factors = self.user_factors.astype(self.dtype)
+        self.item_factors = self.item_factors.astype(self.dtype)
+        
+        self._build_similarity_index()
+        self._build_mips_index()
+        self._build_candidates()
         
         logger.info("CF model training completed!")
         
     def _als_step(self, ratings: csr_matrix, factors: np.ndarray, 
-                  regularization: float) -> np.ndarray:
+                  regularization: float, initial: Optional[np.ndarray] = None) -> np.ndarray:
         """
         One step of ALS
+        
+        initial: current factors of the entities being solved for, used as
+            the warm start by the CG solver
         """
-        n_entities, n_factors = factors.shape
-        new_factors = np.zeros_like(factors)
+        if self.solver == "batched":
+            return self._als_step_batched(ratings, factors, regularization)
+        if self.solver == "cg":
+            return self._als_step_cg(ratings, factors, regularization, initial)
+        
+        # Row slices of a CSC matrix (e.g. user_item_matrix.T) carry row,
+        # not column, indices
+        ratings = csr_matrix(ratings)
+        n_entities, n_factors = ratings.shape[0], factors.shape[1]
+        new_factors = np.zeros((n_entities, n_factors), dtype=factors.dtype)
         
         for i in range(n_entities):
             # Get non-zero entries
@@ -97,103 +265,685 @@ class CollaborativeFiltering:
         
         return new_factors
     
+    def _als_step_batched(self, ratings: csr_matrix, factors: np.ndarray,
+                          regularization: float) -> np.ndarray:
+        """
+        One step of ALS solved block-wise on the raw CSR arrays
+        """
+        ratings = csr_matrix(ratings)
+        indptr, indices, data = ratings.indptr, ratings.indices, ratings.data
+        n_entities, n_factors = ratings.shape[0], factors.shape[1]
+        new_factors = np.zeros((n_entities, n_factors), dtype=factors.dtype)
+        
+        # Shared Gram term, only needed by the implicit objective
+        gram = factors.T @ factors if self.implicit else None
+        ridge = regularization * np.eye(n_factors)
+        
+        def solve_block(bounds: Tuple[int, int]):
+            terms = self._block_terms(indptr, indices, data, factors, *bounds)
+            if terms is None:
+                return
+            rows, offsets, A, weights, targets = terms
+            
+            if len(rows) == 1:
+                # Single (possibly very dense) row: plain GEMM
+                AtA = (A.T @ (A * weights[:, np.newaxis]))[np.newaxis]
+            else:
+                outer = A[:, :, np.newaxis] * (A * weights[:, np.newaxis])[:, np.newaxis, :]
+                AtA = np.add.reduceat(outer, offsets, axis=0)
+            Atb = np.add.reduceat(A * targets[:, np.newaxis], offsets, axis=0)
+            
+            AtA += ridge
+            if gram is not None:
+                AtA += gram
+            
+            new_factors[rows] = np.linalg.solve(AtA, Atb[:, :, np.newaxis])[:, :, 0]
+        
+        self._run_blocks(solve_block, self._row_blocks(indptr, n_factors * n_factors))
+        
+        return new_factors
+    
+    def _als_step_cg(self, ratings: csr_matrix, factors: np.ndarray,
+                     regularization: float, initial: Optional[np.ndarray]) -> np.ndarray:
+        """
+        One step of ALS solved approximately with a few conjugate-gradient
+        iterations per row, warm-started from the previous factors
+        
+        Cost is O(cg_steps * nnz * f) instead of O(n * f^3), and the
+        normal-equation matrices are never formed.
+        """
+        ratings = csr_matrix(ratings)
+        indptr, indices, data = ratings.indptr, ratings.indices, ratings.data
+        n_entities, n_factors = ratings.shape[0], factors.shape[1]
+        new_factors = np.zeros((n_entities, n_factors), dtype=factors.dtype)
+        
+        gram = factors.T @ factors if self.implicit else None
+        
+        def solve_block(bounds: Tuple[int, int]):
+            terms = self._block_terms(indptr, indices, data, factors, *bounds)
+            if terms is None:
+                return
+            rows, offsets, A, weights, targets = terms
+            segment = np.repeat(np.arange(len(rows)), np.diff(np.append(offsets, len(A))))
+            
+            def matvec(P: np.ndarray) -> np.ndarray:
+                dots = np.einsum('ij,ij->i', A, P[segment]) * weights
+                out = np.add.reduceat(A * dots[:, np.newaxis], offsets, axis=0)
+                out += regularization * P
+                if gram is not None:
+                    out += P @ gram
+                return out
+            
+            b = np.add.reduceat(A * targets[:, np.newaxis], offsets, axis=0)
+            x = initial[rows].copy() if initial is not None else np.zeros_like(b)
+            
+            r = b - matvec(x)
+            p = r.copy()
+            rs_old = np.einsum('ij,ij->i', r, r)
+            
+            for _ in range(self.cg_steps):
+                if np.all(rs_old < 1e-20):
+                    break
+                Ap = matvec(p)
+                denom = np.einsum('ij,ij->i', p, Ap)
+                step = np.divide(rs_old, denom, out=np.zeros_like(rs_old), where=denom > 0)
+                x += step[:, np.newaxis] * p
+                r -= step[:, np.newaxis] * Ap
+                rs_new = np.einsum('ij,ij->i', r, r)
+                beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+                p = r + beta[:, np.newaxis] * p
+                rs_old = rs_new
+            
+            new_factors[rows] = x
+        
+        self._run_blocks(solve_block, self._row_blocks(indptr, 4 * n_factors))
+        
+        return new_factors
+    
+    def _block_terms(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                     factors: np.ndarray, start: int, end: int):
+        """
+        Gather the nonzeros of CSR rows [start, end) for the normal equations
+        
+        Returns (rows, offsets, A, weights, targets), or None if the block
+        has no nonzeros. Row r of the system is A^T diag(weights) A
+        (+ Y^T Y when implicit) with right-hand side A^T targets, where the
+        slice of A for the k-th non-empty row starts at offsets[k].
+        """
+        lo, hi = indptr[start], indptr[end]
+        if lo == hi:
+            return None
+        
+        counts = np.diff(indptr[start:end + 1])
+        rows = np.flatnonzero(counts) + start
+        offsets = indptr[rows] - lo
+        
+        A = factors[indices[lo:hi]]
+        values = data[lo:hi]
+        confidence = 1 + self.alpha * np.abs(values)
+        
+        if self.implicit:
+            # Y^T C Y = Y^T Y + Y_u^T (C - I) Y_u, preference p = 1
+            return rows, offsets, A, confidence - 1, confidence
+        return rows, offsets, A, confidence, values * confidence
+    
+    def _run_blocks(self, solve_block, blocks: List[Tuple[int, int]]):
+        """Run solve_block over all row blocks, threaded when n_jobs > 1"""
+        if self.n_jobs > 1 and len(blocks) > 1:
+            # NumPy releases the GIL inside BLAS/LAPACK, so threads scale here
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+                list(pool.map(solve_block, blocks))
+        else:
+            for bounds in blocks:
+                solve_block(bounds)
+    
+    def _row_blocks(self, indptr: np.ndarray, cost_per_nnz: int) -> List[Tuple[int, int]]:
+        """
+        Split CSR rows into contiguous blocks holding a bounded number of nonzeros
+        """
+        n_rows = len(indptr) - 1
+        max_nnz = max(1, self.BLOCK_ELEMENTS // max(1, cost_per_nnz))
+        
+        blocks = []
+        start = 0
+        while start < n_rows:
+            end = int(np.searchsorted(indptr, indptr[start] + max_nnz, side='right')) - 1
+            end = min(max(end, start + 1), n_rows)
+            blocks.append((start, end))
+            start = end
+        return blocks
+    
     def _calculate_loss(self, user_item_matrix: csr_matrix) -> float:
         """
         Calculate reconstruction loss
+        
+        Only the observed (positive) entries are scored, straight from the
+        CSR arrays in chunks of LOSS_CHUNK_SIZE, so memory and time are
+        O(nnz * f). With loss_negative_samples > 0 an estimate of the
+        squared error over the unobserved entries is added. With
+        implicit=True the implicit-feedback objective is returned instead
+        (see _implicit_loss).
         """
-        predictions = self.user_factors @ self.item_factors.T
-        mask = user_item_matrix.toarray() > 0
+        ratings = csr_matrix(user_item_matrix)
+        if self.implicit:
+            return self._implicit_loss(ratings)
+        indptr, indices, data = ratings.indptr, ratings.indices, ratings.data
+        
+        loss = 0.0
+        for start in range(0, ratings.nnz, self.LOSS_CHUNK_SIZE):
+            stop = min(start + self.LOSS_CHUNK_SIZE, ratings.nnz)
+            positions = np.arange(start, stop)
+            rows = np.searchsorted(indptr, positions, side='right') - 1
+            
+            observed = data[start:stop] > 0
+            rows, cols = rows[observed], indices[start:stop][observed]
+            
+            predictions = np.einsum('ij,ij->i', self.user_factors[rows], self.item_factors[cols])
+            loss += float(np.sum((data[start:stop][observed] - predictions) ** 2))
+        
+        if self.loss_negative_samples > 0:
+            loss += self._sampled_negative_loss(ratings, self.loss_negative_samples)
         
-        loss = np.sum((user_item_matrix.toarray()[mask] - predictions[mask]) ** 2)
         loss += self.regularization * (np.sum(self.user_factors ** 2) + 
                                        np.sum(self.item_factors ** 2))
         
         return loss
     
+    def _implicit_loss(self, ratings: csr_matrix) -> float:
+        """
+        Implicit-feedback objective (Hu et al.), exactly
+        
+        sum over all cells of c_ui (p_ui - x_u . y_i)^2 plus the ridge
+        term, with p = 1 and c = 1 + alpha |r| on nonzeros, p = 0 and
+        c = 1 elsewhere. The sum of squared predictions over every cell is
+        <X^T X, Y^T Y>, so only the nonzeros need a correction term and
+        the cost stays O(nnz * f + (n_users + n_items) * f^2).
+        """
+        X = np.asarray(self.user_factors, dtype=np.float64)
+        Y = np.asarray(self.item_factors, dtype=np.float64)
+        loss = float(np.sum((X.T @ X) * (Y.T @ Y)))
+        
+        indptr, indices, data = ratings.indptr, ratings.indices, ratings.data
+        for start in range(0, ratings.nnz, self.LOSS_CHUNK_SIZE):
+            stop = min(start + self.LOSS_CHUNK_SIZE, ratings.nnz)
+            rows = np.searchsorted(indptr, np.arange(start, stop), side='right') - 1
+            predictions = np.einsum('ij,ij->i', X[rows], Y[indices[start:stop]])
+            confidence = 1 + self.alpha * np.abs(data[start:stop])
+            loss += float(np.sum(confidence * (1 - predictions) ** 2 - predictions ** 2))
+        
+        loss += self.regularization * (np.sum(X ** 2) + np.sum(Y ** 2))
+        return loss
+    
+    def _sampled_negative_loss(self, ratings: csr_matrix, n_samples: int) -> float:
+        """
+        Estimate sum of squared predictions over unobserved (user, item) pairs
+        
+        Pairs are drawn uniformly, observed ones are dropped, and the mean
+        squared prediction is scaled up to the number of unobserved cells.
+        """
+        n_users, n_items = ratings.shape
+        n_unobserved = n_users * n_items - ratings.nnz
+        if n_unobserved <= 0:
+            return 0.0
+        
+        rows = np.random.randint(0, n_users, n_samples)
+        cols = np.random.randint(0, n_items, n_samples)
+        unobserved = np.asarray(ratings[rows, cols]).ravel() == 0
+        if not np.any(unobserved):
+            return 0.0
+        rows, cols = rows[unobserved], cols[unobserved]
+        
+        predictions = np.einsum('ij,ij->i', self.user_factors[rows], self.item_factors[cols])
+        return float(np.mean(predictions ** 2) * n_unobserved)
+    
     def predict(self, user_id: int, item_ids: Optional[List[int]] = None, 
-                n: int = 10) -> List[Tuple[int, float]]:
+                n: int = 10, exclude_items: Optional[Iterable[int]] = None,
+                exact: bool = False) -> List[Tuple[int, float]]:
         """
         Get top-N recommendations for a user
+        
+        exclude_items: item ids that must not be recommended
+        exact: bypass the MIPS index and the compact candidate matrix and
+            score the full catalog in full precision
         """
-        if user_id not in self.user_index:
+        user_vector = self.user_vector(user_id)
+        if user_vector is None:
             logger.warning(f"User {user_id} not found in training data")
             return []
         
-        user_idx = self.user_index[user_id]
-        user_vector = self.user_factors[user_idx]
+        excluded = None
+        if exclude_items is not None:
+            excluded = self.item_index.lookup(exclude_items)
+            excluded = excluded[excluded >= 0]
         
-        # Compute scores for all items
-        scores = self.item_factors @ user_vector
+        if item_ids is None and self.mips_index is not None and not exact:
+            # Sub-linear retrieval over the partitioned catalog, hits rescored exactly
+            indices, _ = self.mips_index.query(user_vector, n, exclude=excluded)
+            scores = self.item_factors[indices] @ user_vector
+            order = np.argsort(-scores, kind='stable')
+            return list(zip(self.item_ids[indices[order]].tolist(), scores[order].tolist()))
         
-        # Get top-N items
-        if item_ids is None:
-            top_indices = np.argsort(scores)[-n:][::-1]
-            recommendations = [
-                (list(self.item_index.keys())[idx], float(scores[idx]))
-                for idx in top_indices
-            ]
+        if item_ids is None and self.item_candidates is not None and not exact:
+            # Compact pass over the catalog, exact scores for the best candidates
+            approx = self.item_candidates.scores(user_vector)
+            if excluded is not None:
+                approx[excluded] = -np.inf
+            candidates = top_k(approx, max(self.rerank, n))
+            candidates = candidates[np.isfinite(approx[candidates])]
+            scores = self.item_factors[candidates] @ user_vector
+        elif item_ids is None:
+            # Score the full catalog
+            candidates = None
+            scores = self.item_factors @ user_vector
+            if excluded is not None:
+                scores[excluded] = -np.inf
         else:
-            # Filter by specific items
-            item_indices = [self.item_index[iid] for iid in item_ids 
-                           if iid in self.item_index]
-            filtered_scores = [(iid, float(scores[self.item_index[iid]])) 
-                              for iid in item_ids if iid in self.item_index]
-            recommendations = sorted(filtered_scores, key=lambda x: x[1], 
-                                    reverse=True)[:n]
+            # Only score the requested items
+            candidates = self.item_index.lookup(item_ids)
+            candidates = candidates[candidates >= 0]
+            if excluded is not None:
+                candidates = candidates[~np.isin(candidates, excluded)]
+            scores = self.item_factors[candidates] @ user_vector
+        
+        top = top_k(scores, n)
+        top = top[np.isfinite(scores[top])]
+        indices = top if candidates is None else candidates[top]
+        
+        return list(zip(self.item_ids[indices].tolist(), scores[top].tolist()))
+    
+    def item_scores(self, user_id: int, item_ids: Iterable[int]) -> np.ndarray:
+        """
+        Exact scores of the given items for a user, aligned with item_ids;
+        NaN for unknown items (all NaN for an unknown user)
+        """
+        positions = self.item_index.lookup(item_ids)
+        scores = np.full(len(positions), np.nan)
+        user_vector = self.user_vector(user_id)
+        if user_vector is not None:
+            known = positions >= 0
+            scores[known] = self.item_factors[positions[known]] @ user_vector
+        return scores
+    
+    def user_vector(self, user_id: int) -> Optional[np.ndarray]:
+        """Folded-in vector if there is one, else the trained factors"""
+        with self._fold_lock:
+            vector = self.folded_factors.get(user_id)
+        if vector is not None:
+            return vector
+        if user_id in self.user_index:
+            return self.user_factors[self.user_index[user_id]]
+        return None
+    
+    def fold_in(self, interactions: List[Tuple[int, float]],
+                user_id: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Compute a user vector against the fixed item_factors
+        
+        One ALS least-squares solve over the given (item_id, rating)
+        interactions, merged with the user's training row when user_id is
+        known (later ratings win). Returns None if no item is known.
+        """
+        rows, values = [], []
+        if user_id is not None and user_id in self.user_index and self.user_items is not None:
+            row = self.user_index[user_id]
+            start, end = self.user_items.indptr[row], self.user_items.indptr[row + 1]
+            rows.append(self.user_items.indices[start:end])
+            values.append(self.user_items.data[start:end])
+        if len(interactions):
+            item_ids, ratings = zip(*interactions)
+            positions = self.item_index.lookup(np.asarray(item_ids, dtype=np.int64))
+            known = positions >= 0
+            rows.append(positions[known])
+            values.append(np.asarray(ratings, dtype=np.float64)[known])
+        
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        if len(rows) == 0:
+            return None
+        values = np.concatenate(values).astype(np.float64)
+        # One rating per item, the last one given wins
+        rows, last = np.unique(rows[::-1], return_index=True)
+        values = values[::-1][last]
+        
+        A = self.item_factors[rows]
+        confidence = 1 + self.alpha * np.abs(values)
+        
+        if self.implicit:
+            AtA = self.item_gram() + A.T @ (A * (confidence - 1)[:, np.newaxis])
+            Atb = A.T @ confidence
+        else:
+            AtA = A.T @ (A * confidence[:, np.newaxis])
+            Atb = A.T @ (values * confidence)
+        AtA += self.regularization * np.eye(A.shape[1])
+        
+        return np.linalg.solve(AtA, Atb)
+    
+    def update_user(self, user_id: int, interactions: List[Tuple[int, float]]) -> bool:
+        """
+        Fold in a user's recent interactions so predict serves them
+        without retraining; returns False if none of the items is known
+        """
+        vector = self.fold_in(interactions, user_id)
+        if vector is None:
+            return False
+        
+        vector = vector.astype(self.item_factors.dtype)
+        with self._fold_lock:
+            self.folded_factors[user_id] = vector
+            self.folded_factors.move_to_end(user_id)
+            while len(self.folded_factors) > self.FOLD_IN_CACHE_SIZE:
+                self.folded_factors.popitem(last=False)
+        return True
+    
+    def is_folded(self, user_id: int) -> bool:
+        """Whether the user is served from a folded-in vector"""
+        with self._fold_lock:
+            return user_id in self.folded_factors
+    
+    def folded_snapshot(self) -> "OrderedDict[int, np.ndarray]":
+        """Copy of the folded-in vectors, least recently updated first"""
+        with self._fold_lock:
+            return OrderedDict(self.folded_factors)
+    
+    def clear_folded(self):
+        """Drop every folded-in vector"""
+        with self._fold_lock:
+            self.folded_factors.clear()
+    
+    def refold(self, user_ids: Iterable[int],
+               user_interactions: Callable[[int], List[Tuple[int, float]]]) -> int:
+        """
+        Fold in the given users again from their logged interactions
+        
+        Folded vectors only fit the item factors they were solved
+        against, so a new model carries a previous model's overlay over
+        by re-solving it (see ModelRegistry.publish). Users are visited
+        in order, so pass them least recently updated first to keep the
+        LRU order; users without logged interactions are skipped. Returns
+        the number of users folded in.
+        """
+        refolded = 0
+        for user_id in user_ids:
+            interactions = user_interactions(user_id)
+            if interactions and self.update_user(user_id, interactions):
+                refolded += 1
+        return refolded
+    
+    def item_gram(self) -> np.ndarray:
+        """Y^T Y over item_factors, cached until the factors change"""
+        if self._gram is None:
+            factors = np.asarray(self.item_factors, dtype=np.float64)
+            self._gram = factors.T @ factors
+        return self._gram
+    
+    def predict_batch(self, user_ids: List[int], n: int = 10, exclude_seen: bool = True,
+                      batch_size: int = 256,
+                      exclude_items: Optional[List[Optional[Iterable[int]]]] = None
+                      ) -> List[List[Tuple[int, float]]]:
+        """
+        Get top-N recommendations for many users at once
+        
+        User vectors are scored against item_factors with one matrix
+        multiply per chunk of batch_size users. Items the user interacted
+        with in training are masked when exclude_seen is set, and
+        exclude_items (aligned with user_ids, None entries allowed) masks
+        further item ids per user. With a
+        compact candidate matrix the GEMM runs on it and the top rerank
+        candidates of each user are rescored exactly. Results are aligned
+        with user_ids; unknown users get an empty list.
+        """
+        results: List[List[Tuple[int, float]]] = [[] for _ in user_ids]
+        
+        # Read each vector once: a concurrent update_user may evict a
+        # folded user between a membership test and a second lookup
+        user_vectors = [self.user_vector(uid) for uid in user_ids]
+        positions = [pos for pos, vector in enumerate(user_vectors) if vector is not None]
+        if len(positions) < len(user_ids):
+            logger.warning(f"{len(user_ids) - len(positions)} users not found in training data")
+        
+        for start in range(0, len(positions), batch_size):
+            chunk = positions[start:start + batch_size]
+            vectors = np.stack([user_vectors[pos] for pos in chunk])
+            
+            if self.item_candidates is not None:
+                scores = self.item_candidates.scores(vectors)
+            else:
+                scores = vectors @ self.item_factors.T
+            
+            if exclude_seen and self.user_items is not None:
+                train_rows = self.user_index.lookup([user_ids[pos] for pos in chunk])
+                known = np.flatnonzero(train_rows >= 0)
+                seen = self.user_items[train_rows[known]]
+                scores[np.repeat(known, np.diff(seen.indptr)), seen.indices] = -np.inf
+            
+            if exclude_items is not None:
+                for row, pos in enumerate(chunk):
+                    if exclude_items[pos] is not None:
+                        excluded = self.item_index.lookup(exclude_items[pos])
+                        scores[row, excluded[excluded >= 0]] = -np.inf
+            
+            candidates = None
+            if self.item_candidates is not None:
+                candidates = top_k_rows(scores, max(self.rerank, n))
+                masked = ~np.isfinite(np.take_along_axis(scores, candidates, axis=1))
+                scores = np.einsum('bf,bkf->bk', vectors, self.item_factors[candidates])
+                scores[masked] = -np.inf
+            
+            top = top_k_rows(scores, n)
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            if candidates is not None:
+                top = np.take_along_axis(candidates, top, axis=1)
+            top_ids = self.item_ids[top]
+            
+            for row, pos in enumerate(chunk):
+                valid = np.isfinite(top_scores[row])
+                results[pos] = list(zip(top_ids[row][valid].tolist(),
+                                        top_scores[row][valid].tolist()))
         
-        return recommendations
+        return results
     
-    def get_similar_items(self, item_id: int, n: int = 10) -> List[Tuple[int, float]]:
+    def get_similar_items(self, item_id: int, n: int = 10,
+                          exact: bool = False) -> List[Tuple[int, float]]:
         """
         Find similar items
+        
+        Uses the similarity index when one is built; exact=True forces a
+        full scan for verification.
         """
         if item_id not in self.item_index:
             return []
         
         item_idx = self.item_index[item_id]
+        
+        if self.similarity_index is not None:
+            top_indices, similarities = self.similarity_index.query(
+                self.item_factors[item_idx], n, exclude=[item_idx], exact=exact
+            )
+            return list(zip(self.item_ids[top_indices].tolist(), similarities.tolist()))
+        
         item_vector = self.item_factors[item_idx].reshape(1, -1)
         
         # Compute similarities
         similarities = cosine_similarity(item_vector, self.item_factors)[0]
         
         # Get top-N similar items (excluding itself)
-        top_indices = np.argsort(similarities)[-(n+1):-1][::-1]
+        similarities[item_idx] = -np.inf
+        top_indices = top_k(similarities, n)
         
-        similar_items = [
-            (list(self.item_index.keys())[idx], float(similarities[idx]))
-            for idx in top_indices
-        ]
+        return list(zip(self.item_ids[top_indices].tolist(),
+                        similarities[top_indices].tolist()))
+    
+    def _build_mips_index(self):
+        """Build the MIPS index over item_factors and measure its recall"""
+        self.mips_index = None
+        if not self.mips or self.item_factors is None or not len(self.item_factors):
+            return
         
-        return similar_items
+        self.mips_index = build_index("mips", self.item_factors, **self.mips_params)
+        
+        sample = np.random.default_rng(0).choice(
+            len(self.user_factors), min(self.MIPS_RECALL_SAMPLE, len(self.user_factors)),
+            replace=False
+        )
+        self.mips_index.measure_recall(self.user_factors[sample], self.MIPS_RECALL_K)
+    
+    def _build_candidates(self):
+        """Build the compact item matrix used for candidate scoring"""
+        self.item_candidates = None
+        if self.candidate_dtype and self.item_factors is not None:
+            self.item_candidates = QuantizedMatrix.quantize(self.item_factors, self.candidate_dtype)
+    
+    def _build_similarity_index(self):
+        """Build the item-item similarity index over item_factors"""
+        self.similarity_index = None
+        if self.ann and self.item_factors is not None and len(self.item_factors):
+            self.similarity_index = build_index(self.ann, self.item_factors, **self.ann_params)
+    
+    def _params(self) -> Dict[str, Any]:
+        return {
+            'n_factors': self.n_factors,
+            'regularization': self.regularization,
+            'iterations': self.iterations,
+            'alpha': self.alpha,
+            'solver': self.solver,
+            'n_jobs': self.n_jobs,
+            'implicit': self.implicit,
+            'cg_steps': self.cg_steps,
+            'loss_negative_samples': self.loss_negative_samples,
+            'ann': self.ann,
+            'ann_params': self.ann_params,
+            'mips': self.mips,
+            'mips_params': self.mips_params,
+            'dtype': self.dtype,
+            'candidate_dtype': self.candidate_dtype,
+            'rerank': self.rerank,
+            'time_budget': self.time_budget,
+            'tol': self.tol
+        }
+    
+    def _set_params(self, params: Dict[str, Any]):
+        self.n_factors = params['n_factors']
+        self.regularization = params['regularization']
+        self.iterations = params['iterations']
+        self.alpha = params['alpha']
+        self.solver = params.get('solver', 'loop')
+        self.n_jobs = params.get('n_jobs', 1)
+        self.implicit = params.get('implicit', False)
+        self.cg_steps = params.get('cg_steps', 3)
+        self.loss_negative_samples = params.get('loss_negative_samples', 0)
+        self.ann = params.get('ann')
+        self.ann_params = params.get('ann_params') or {}
+        self.mips = params.get('mips', False)
+        self.mips_params = params.get('mips_params') or {}
+        self.dtype = params.get('dtype', 'float64')
+        self.candidate_dtype = params.get('candidate_dtype')
+        self.rerank = params.get('rerank', 200)
+        self.time_budget = params.get('time_budget')
+        self.tol = params.get('tol')
     
     def save(self, filepath: str):
-        """Save model to disk"""
-        joblib.dump({
+        """
+        Save model to disk
+        
+        Writes a versioned artifact directory: factors, sorted id indexes
+        and the training CSR as raw .npy arrays plus manifest.json, and
+        the similarity / MIPS indexes in ann/ and mips/ subdirectories.
+        """
+        arrays = {
             'user_factors': self.user_factors,
             'item_factors': self.item_factors,
-            'user_index': self.user_index,
-            'item_index': self.item_index,
-            'params': {
-                'n_factors': self.n_factors,
-                'regularization': self.regularization,
-                'iterations': self.iterations,
-                'alpha': self.alpha
-            }
-        }, filepath)
+            'item_ids': self.item_ids
+        }
+        arrays.update(self.user_index.arrays('user_index'))
+        arrays.update(self.item_index.arrays('item_index'))
+        if self.user_items is not None:
+            arrays.update({
+                'user_items_indptr': self.user_items.indptr,
+                'user_items_indices': self.user_items.indices,
+                'user_items_data': self.user_items.data
+            })
+        if self.item_candidates is not None:
+            arrays.update(self.item_candidates.arrays('item_candidates'))
+        
+        with artifact_writer(filepath) as staging:
+            names = save_arrays(staging, arrays)
+            if self.similarity_index is not None:
+                self.similarity_index.save(os.path.join(staging, "ann"))
+            if self.mips_index is not None:
+                self.mips_index.save(os.path.join(staging, "mips"))
+            write_manifest(staging, self.ARTIFACT_FORMAT, self._params(), names)
+        
         logger.info(f"Model saved to {filepath}")
     
-    def load(self, filepath: str):
-        """Load model from disk"""
+    def load(self, filepath: str, mmap_mode: Optional[str] = 'r', allow_legacy: bool = True):
+        """
+        Load model from disk
+        
+        Arrays are memory-mapped read-only by default, so processes that
+        load the same artifact share its pages. Legacy joblib files are
+        still accepted unless allow_legacy is False (unpickling runs
+        arbitrary code, so never for untrusted paths).
+        """
+        if not is_artifact(filepath):
+            if not allow_legacy:
+                raise ValueError(f"{filepath} is not a model artifact directory")
+            self._load_legacy(filepath)
+            return
+        
+        manifest = read_manifest(filepath, self.ARTIFACT_FORMAT)
+        arrays = load_arrays(filepath, manifest['arrays'], mmap_mode)
+        
+        self.user_factors = arrays['user_factors']
+        self.item_factors = arrays['item_factors']
+        self.item_ids = arrays['item_ids']
+        self.user_index = IdIndex.from_arrays(arrays, 'user_index')
+        self.item_index = IdIndex.from_arrays(arrays, 'item_index')
+        self.user_items = None
+        if 'user_items_indptr' in arrays:
+            self.user_items = csr_matrix(
+                (arrays['user_items_data'], arrays['user_items_indices'], arrays['user_items_indptr']),
+                shape=(len(self.user_factors), len(self.item_factors)),
+                copy=False
+            )
+        self.clear_folded()
+        self._gram = None
+        self._set_params(manifest['params'])
+        
+        ann_path, mips_path = os.path.join(filepath, "ann"), os.path.join(filepath, "mips")
+        self.similarity_index = load_index(ann_path, mmap_mode) if os.path.isdir(ann_path) else None
+        self.mips_index = load_index(mips_path, mmap_mode) if os.path.isdir(mips_path) else None
+        if self.mips_index is not None:
+            self.mips_index.log_recall()
+        
+        self.item_candidates = QuantizedMatrix.from_arrays(arrays, 'item_candidates')
+        if self.item_candidates is None:
+            self._build_candidates()
+        
+        logger.info(f"Model loaded from {filepath}")
+    
+    def _load_legacy(self, filepath: str):
+        """Load a model pickled with joblib by earlier versions"""
         data = joblib.load(filepath)
         self.user_factors = data['user_factors']
         self.item_factors = data['item_factors']
-        self.user_index = data['user_index']
-        self.item_index = data['item_index']
+        self.clear_folded()
+        self._gram = None
         
-        params = data['params']
-        self.n_factors = params['n_factors']
-        self.regularization = params['regularization']
-        self.iterations = params['iterations']
-        self.alpha = params['alpha']
+        user_index, item_index = data['user_index'], data['item_index']
+        user_ids = np.empty(len(user_index), dtype=np.int64)
+        user_ids[np.fromiter(user_index.values(), dtype=np.int64)] = \
+            np.fromiter(user_index.keys(), dtype=np.int64)
+        self.item_ids = np.empty(len(item_index), dtype=np.int64)
+        self.item_ids[np.fromiter(item_index.values(), dtype=np.int64)] = \
+            np.fromiter(item_index.keys(), dtype=np.int64)
+        self.user_index = IdIndex.from_ids(user_ids)
+        self.item_index = IdIndex.from_ids(self.item_ids)
+        self.user_items = data.get('user_items')
+        
+        self._set_params(data['params'])
+        
+        # Rebuild indexes that older artifacts did not store
+        self._build_similarity_index()
+        self._build_mips_index()
+        self._build_candidates()
         
-        logger.info(f"Model loaded from {filepath}")
\ No newline at end of file
+        logger.info(f"Model loaded from {filepath}")
@@ -1,21 +1,43 @@
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.decomposition import TruncatedSVD
 import joblib
-from typing import List, Dict, Tuple
+import os
+from typing import List, Dict, Tuple, Optional, Any, Iterable
 import logging
 
+from src.models.ann_index import ANNIndex, build_index, load_index
+from src.utils.artifacts import (
+    IdIndex, MetadataTable, artifact_writer, is_artifact, load_arrays, read_manifest,
+    save_arrays, write_manifest
+)
+from src.utils.bitsets import encode_sets
+from src.utils.quantization import QuantizedMatrix
+from src.utils.ranking import top_k, top_k_rows
+
 logger = logging.getLogger(__name__)
 
 class ContentBasedFiltering:
     """
     Content-based recommendations using item features
+    
+    Features are stored as float32. With candidate_dtype set ('float16' |
+    'int8'), recommend scores a compact copy of the normalized features
+    and re-ranks the best rerank candidates exactly.
     """
     
-    def __init__(self, n_components: int = 50, similarity_metric: str = "cosine"):
+    ARTIFACT_FORMAT = "content_based"
+    
+    def __init__(self, n_components: int = 50, similarity_metric: str = "cosine",
+                 ann: Optional[str] = None, ann_params: Optional[Dict[str, Any]] = None,
+                 candidate_dtype: Optional[str] = None, rerank: int = 200):
         self.n_components = n_components
         self.similarity_metric = similarity_metric
+        # Item-item similarity index ('exact' | 'ivf'), None for brute force
+        self.ann = ann
+        self.ann_params = ann_params or {}
+        self.candidate_dtype = candidate_dtype
+        self.rerank = rerank
         
         self.tfidf = TfidfVectorizer(
             max_features=5000,
@@ -26,7 +48,31 @@ class ContentBasedFiltering:
         
         self.item_features = None
         self.item_ids = None
-        self.item_metadata = {}
+        self.item_metadata = MetadataTable.from_records([])
+        # Derived at fit/load: id -> row lookup and L2-normalized features
+        self.item_index = IdIndex.from_ids([])
+        self.normalized_features = None
+        self.feature_candidates: Optional[QuantizedMatrix] = None
+        # Genres of each item row as uint64 bitsets over genre_vocabulary
+        self.genre_bits = None
+        self.genre_vocabulary: List[str] = []
+        # Fitted tfidf/svd of a loaded artifact, see load_encoders()
+        self._encoders_path = None
+        self.similarity_index: Optional[ANNIndex] = None
+    
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ContentBasedFiltering":
+        """
+        Build from the models.content_based section of config.yaml
+        """
+        return cls(
+            n_components=config.get('n_components', 50),
+            similarity_metric=config.get('similarity_metric', 'cosine'),
+            ann=config.get('ann'),
+            ann_params=config.get('ann_params'),
+            candidate_dtype=config.get('candidate_dtype'),
+            rerank=config.get('rerank', 200)
+        )
         
     def fit(self, items_data: List[Dict]):
         """
@@ -36,20 +82,22 @@ class ContentBasedFiltering:
         """
         logger.info(f"Training content-based model with {len(items_data)} items")
         
-        self.item_ids = [item['item_id'] for item in items_data]
+        self.item_ids = np.asarray([item['item_id'] for item in items_data], dtype=np.int64)
+        self.item_metadata = MetadataTable.from_records(items_data)
         
         # Create text features
         texts = []
         for item in items_data:
             text = f"{item.get('title', '')} {item.get('genres', '')} {item.get('description', '')}"
             texts.append(text)
-            self.item_metadata[item['item_id']] = item
         
         # TF-IDF vectorization
         tfidf_matrix = self.tfidf.fit_transform(texts)
         
         # Dimensionality reduction
-        self.item_features = self.svd.fit_transform(tfidf_matrix)
+        self.item_features = self.svd.fit_transform(tfidf_matrix).astype(np.float32)
+        self._build_lookup()
+        self._build_similarity_index()
         
         logger.info(f"Content-based model trained! Feature shape: {self.item_features.shape}")
         
@@ -59,95 +107,304 @@ class ContentBasedFiltering:
         
         user_interactions: List of (item_id, rating) tuples
         """
-        profile = np.zeros(self.n_components)
-        total_weight = 0
+        if not len(user_interactions):
+            return np.zeros(self.item_features.shape[1])
+        item_ids, ratings = zip(*user_interactions)
+        indices = self.item_index.lookup(np.asarray(item_ids, dtype=np.int64))
+        known = indices >= 0
+        if not known.any():
+            return np.zeros(self.item_features.shape[1])
         
-        for item_id, rating in user_interactions:
-            if item_id in self.item_ids:
-                idx = self.item_ids.index(item_id)
-                weight = rating  # Use rating as weight
-                profile += self.item_features[idx] * weight
-                total_weight += weight
+        # Weighted sum of the gathered feature rows, rating as weight
+        weights = np.asarray(ratings, dtype=np.float64)[known]
+        profile = weights @ self.item_features[indices[known]]
         
+        total_weight = weights.sum()
         if total_weight > 0:
             profile /= total_weight
         
         return profile
     
+    def _score(self, user_profile: np.ndarray, rows: Optional[np.ndarray] = None,
+               approximate: bool = False) -> np.ndarray:
+        """
+        Cosine similarity of a profile to every item (one matvec), or to
+        the given rows; approximate scores the compact candidate matrix
+        """
+        norm = np.linalg.norm(user_profile)
+        if norm == 0:
+            return np.zeros(len(self.item_ids) if rows is None else len(rows))
+        query = user_profile / norm
+        if approximate:
+            return self.feature_candidates.scores(query)
+        features = self.normalized_features if rows is None else self.normalized_features[rows]
+        return features @ query
+    
     def recommend(self, user_profile: np.ndarray, n: int = 10, 
-                  exclude_items: List[int] = None) -> List[Tuple[int, float]]:
+                  exclude_items: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
         """
         Get recommendations based on user profile
-        """
-        if exclude_items is None:
-            exclude_items = []
         
+        exclude_items: item ids to leave out (list, set or array), applied
+            as a mask over the score array before top-K selection
+        """
         # Compute similarities
-        similarities = cosine_similarity([user_profile], self.item_features)[0]
+        approximate = self.feature_candidates is not None
+        similarities = self._score(user_profile, approximate=approximate)
+        
+        if exclude_items is not None:
+            similarities[self.item_positions(exclude_items)] = -np.inf
+        
+        candidates = None
+        if approximate:
+            # Exact rescoring of the best candidates
+            candidates = top_k(similarities, max(self.rerank, n))
+            candidates = candidates[np.isfinite(similarities[candidates])]
+            similarities = self._score(user_profile, rows=candidates)
         
         # Get top-N items
-        recommendations = []
-        for idx in np.argsort(similarities)[::-1]:
-            item_id = self.item_ids[idx]
-            if item_id not in exclude_items:
-                recommendations.append((item_id, float(similarities[idx])))
-                if len(recommendations) >= n:
-                    break
+        top = top_k(similarities, n)
+        top = top[np.isfinite(similarities[top])]
+        top_indices = top if candidates is None else candidates[top]
         
-        return recommendations
+        return list(zip(self.item_ids[top_indices].tolist(), similarities[top].tolist()))
     
-    def get_similar_items(self, item_id: int, n: int = 10) -> List[Tuple[int, float]]:
+    def recommend_batch(self, user_profiles: np.ndarray, n: int = 10,
+                        exclude_items: Optional[List[Optional[Iterable[int]]]] = None
+                        ) -> List[List[Tuple[int, float]]]:
+        """
+        recommend() for a stack of profiles, scored with one matrix multiply
+        
+        exclude_items: per-profile item ids to leave out (None entries allowed)
+        """
+        user_profiles = np.atleast_2d(np.asarray(user_profiles, dtype=np.float64))
+        norms = np.linalg.norm(user_profiles, axis=1, keepdims=True)
+        queries = user_profiles / np.maximum(norms, 1e-12)
+        
+        approximate = self.feature_candidates is not None
+        if approximate:
+            scores = self.feature_candidates.scores(queries)
+        else:
+            scores = queries @ self.normalized_features.T
+        
+        if exclude_items is not None:
+            for row, excluded in enumerate(exclude_items):
+                if excluded is not None:
+                    scores[row, self.item_positions(excluded)] = -np.inf
+        
+        candidates = None
+        if approximate:
+            # Exact rescoring of each profile's best candidates
+            candidates = top_k_rows(scores, max(self.rerank, n))
+            masked = ~np.isfinite(np.take_along_axis(scores, candidates, axis=1))
+            scores = np.einsum('bf,bkf->bk', queries, self.normalized_features[candidates])
+            scores[masked] = -np.inf
+        
+        top = top_k_rows(scores, n)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        if candidates is not None:
+            top = np.take_along_axis(candidates, top, axis=1)
+        top_ids = self.item_ids[top]
+        
+        results = []
+        for row in range(len(queries)):
+            valid = np.isfinite(top_scores[row])
+            results.append(list(zip(top_ids[row][valid].tolist(), top_scores[row][valid].tolist())))
+        return results
+    
+    def item_scores(self, user_profile: np.ndarray, item_ids: Iterable[int]) -> np.ndarray:
+        """
+        Cosine similarity of a profile to the given items, aligned with
+        item_ids; NaN for unknown items
+        """
+        positions = self.item_index.lookup(item_ids)
+        scores = np.full(len(positions), np.nan)
+        known = positions >= 0
+        scores[known] = self._score(user_profile, rows=positions[known])
+        return scores
+    
+    def genre_bits_for(self, item_ids: Iterable[int]) -> np.ndarray:
+        """Genre bitsets aligned with item_ids, all-zero rows for unknown items"""
+        positions = self.item_index.lookup(item_ids)
+        n_words = self.genre_bits.shape[1] if self.genre_bits is not None else 1
+        bits = np.zeros((len(positions), n_words), dtype=np.uint64)
+        known = positions >= 0
+        if self.genre_bits is not None:
+            bits[known] = self.genre_bits[positions[known]]
+        return bits
+    
+    def item_positions(self, item_ids: Iterable[int]) -> np.ndarray:
+        """Row indices of the known items among item_ids"""
+        positions = self.item_index.lookup(item_ids)
+        return positions[positions >= 0]
+    
+    def get_similar_items(self, item_id: int, n: int = 10,
+                          exact: bool = False) -> List[Tuple[int, float]]:
         """
         Find items similar to a given item
+        
+        Uses the similarity index when one is built; exact=True forces a
+        full scan for verification.
         """
-        if item_id not in self.item_ids:
+        if item_id not in self.item_index:
             return []
         
-        idx = self.item_ids.index(item_id)
-        item_vector = self.item_features[idx].reshape(1, -1)
+        idx = self.item_index[item_id]
+        
+        if self.similarity_index is not None:
+            indices, similarities = self.similarity_index.query(
+                self.item_features[idx], n, exclude=[idx], exact=exact
+            )
+            return list(zip(self.item_ids[indices].tolist(), similarities.tolist()))
         
         # Compute similarities
-        similarities = cosine_similarity(item_vector, self.item_features)[0]
+        similarities = self.normalized_features @ self.normalized_features[idx]
         
         # Get top-N similar items (excluding itself)
-        similar_items = []
-        for sim_idx in np.argsort(similarities)[::-1]:
-            if sim_idx != idx:
-                similar_items.append((
-                    self.item_ids[sim_idx],
-                    float(similarities[sim_idx])
-                ))
-                if len(similar_items) >= n:
-                    break
-        
-        return similar_items
+        similarities[idx] = -np.inf
+        top_indices = top_k(similarities, n)
+        
+        return list(zip(self.item_ids[top_indices].tolist(), similarities[top_indices].tolist()))
+    
+    def _build_lookup(self):
+        """Build the id -> row index and the L2-normalized feature matrix"""
+        self.item_index = IdIndex.from_ids(self.item_ids)
+        norms = np.linalg.norm(self.item_features, axis=1, keepdims=True)
+        self.normalized_features = self.item_features / np.maximum(norms, 1e-12)
+        self._build_candidates()
+        self._build_genres()
+    
+    def _build_candidates(self):
+        """Build the compact feature matrix used for candidate scoring"""
+        self.feature_candidates = None
+        if self.candidate_dtype and self.normalized_features is not None:
+            self.feature_candidates = QuantizedMatrix.quantize(self.normalized_features,
+                                                               self.candidate_dtype)
+    
+    def _build_genres(self):
+        """Encode the space-separated genres of every item row as a bitset"""
+        genres = self.item_metadata.columns.get('genres')
+        if genres is None or self.item_ids is None:
+            token_sets = [()] * (0 if self.item_ids is None else len(self.item_ids))
+        else:
+            positions = self.item_metadata.index.lookup(self.item_ids)
+            token_sets = [str(genres[pos]).split() if pos >= 0 else () for pos in positions]
+        self.genre_bits, self.genre_vocabulary = encode_sets(token_sets)
+    
+    def _build_similarity_index(self):
+        """Build the item-item similarity index over item_features"""
+        self.similarity_index = None
+        if self.ann and self.item_features is not None and len(self.item_features):
+            self.similarity_index = build_index(self.ann, self.item_features, **self.ann_params)
+    
+    def _params(self) -> Dict[str, Any]:
+        return {
+            'n_components': self.n_components,
+            'similarity_metric': self.similarity_metric,
+            'ann': self.ann,
+            'ann_params': self.ann_params,
+            'candidate_dtype': self.candidate_dtype,
+            'rerank': self.rerank
+        }
+    
+    def _set_params(self, params: Dict[str, Any]):
+        self.n_components = params['n_components']
+        self.similarity_metric = params['similarity_metric']
+        self.ann = params.get('ann')
+        self.ann_params = params.get('ann_params') or {}
+        self.candidate_dtype = params.get('candidate_dtype')
+        self.rerank = params.get('rerank', 200)
     
     def save(self, filepath: str):
-        """Save model to disk"""
-        joblib.dump({
-            'tfidf': self.tfidf,
-            'svd': self.svd,
+        """
+        Save model to disk
+        
+        Writes a versioned artifact directory: features, ids, the id index
+        and columnar metadata as raw .npy arrays plus manifest.json. The
+        fitted tfidf/svd go to encoders.joblib, which serving never reads.
+        """
+        arrays = {
             'item_features': self.item_features,
-            'item_ids': self.item_ids,
-            'item_metadata': self.item_metadata,
-            'params': {
-                'n_components': self.n_components,
-                'similarity_metric': self.similarity_metric
-            }
-        }, filepath)
+            'normalized_features': self.normalized_features,
+            'item_ids': self.item_ids
+        }
+        arrays.update(self.item_index.arrays('item_index'))
+        metadata_arrays, metadata_columns = self.item_metadata.arrays()
+        arrays.update(metadata_arrays)
+        if self.feature_candidates is not None:
+            arrays.update(self.feature_candidates.arrays('feature_candidates'))
+        if self.genre_bits is not None:
+            arrays['genre_bits'] = self.genre_bits
+        
+        with artifact_writer(filepath) as staging:
+            names = save_arrays(staging, arrays)
+            joblib.dump({'tfidf': self.tfidf, 'svd': self.svd},
+                        os.path.join(staging, "encoders.joblib"))
+            if self.similarity_index is not None:
+                self.similarity_index.save(os.path.join(staging, "ann"))
+            params = self._params()
+            params['metadata_columns'] = metadata_columns
+            params['genre_vocabulary'] = self.genre_vocabulary
+            write_manifest(staging, self.ARTIFACT_FORMAT, params, names)
+        
         logger.info(f"Content-based model saved to {filepath}")
     
-    def load(self, filepath: str):
-        """Load model from disk"""
+    def load(self, filepath: str, mmap_mode: Optional[str] = 'r', allow_legacy: bool = True):
+        """
+        Load model from disk
+        
+        Arrays are memory-mapped read-only by default. Legacy joblib
+        files are still accepted unless allow_legacy is False.
+        """
+        if not is_artifact(filepath):
+            if not allow_legacy:
+                raise ValueError(f"{filepath} is not a model artifact directory")
+            self._load_legacy(filepath)
+            return
+        
+        manifest = read_manifest(filepath, self.ARTIFACT_FORMAT)
+        arrays = load_arrays(filepath, manifest['arrays'], mmap_mode)
+        params = manifest['params']
+        
+        self.item_features = arrays['item_features']
+        self.normalized_features = arrays['normalized_features']
+        self.item_ids = arrays['item_ids']
+        self.item_index = IdIndex.from_arrays(arrays, 'item_index')
+        self.item_metadata = MetadataTable.from_arrays(arrays, params['metadata_columns'])
+        self._encoders_path = os.path.join(filepath, "encoders.joblib")
+        self._set_params(params)
+        self.feature_candidates = QuantizedMatrix.from_arrays(arrays, 'feature_candidates')
+        if self.feature_candidates is None:
+            self._build_candidates()
+        if 'genre_bits' in arrays:
+            self.genre_bits = arrays['genre_bits']
+            self.genre_vocabulary = list(params.get('genre_vocabulary', []))
+        else:
+            self._build_genres()
+        
+        ann_path = os.path.join(filepath, "ann")
+        self.similarity_index = load_index(ann_path, mmap_mode) if os.path.isdir(ann_path) else None
+        
+        logger.info(f"Content-based model loaded from {filepath}")
+    
+    def load_encoders(self):
+        """Load the fitted tfidf/svd of a loaded artifact (for re-encoding text)"""
+        if self._encoders_path and os.path.isfile(self._encoders_path):
+            encoders = joblib.load(self._encoders_path)
+            self.tfidf, self.svd = encoders['tfidf'], encoders['svd']
+    
+    def _load_legacy(self, filepath: str):
+        """Load a model pickled with joblib by earlier versions"""
         data = joblib.load(filepath)
         self.tfidf = data['tfidf']
         self.svd = data['svd']
         self.item_features = data['item_features']
-        self.item_ids = data['item_ids']
-        self.item_metadata = data['item_metadata']
-        
-        params = data['params']
-        self.n_components = params['n_components']
-        self.similarity_metric = params['similarity_metric']
+        self.item_ids = np.asarray(data['item_ids'], dtype=np.int64)
+        self.item_metadata = MetadataTable.from_records(
+            [data['item_metadata'].get(item_id, {'item_id': item_id}) for item_id in data['item_ids']]
+        )
+        self._set_params(data['params'])
+        self._build_lookup()
+        self._build_similarity_index()
         
-        logger.info(f"Content-based model loaded from {filepath}")
\ No newline at end of file
+        logger.info(f"Content-based model loaded from {filepath}")
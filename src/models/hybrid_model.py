@@ -1,35 +1,79 @@
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Any
 import logging
 
 from src.models.collaborative_filtering import CollaborativeFiltering
 from src.models.content_based import ContentBasedFiltering
+from src.models.precomputed import PrecomputedRecommendations
+from src.models.similar_items import SimilarItemsTable
+from src.utils.bitsets import jaccard_distance, popcount
+from src.utils.ranking import normalize_scores, top_k
 
 logger = logging.getLogger(__name__)
 
 class HybridRecommender:
     """
     Hybrid recommendation system combining multiple approaches
+    
+    Each model's top list contributes candidates; both models then score
+    the whole candidate array, scores are normalized per model
+    (normalization: 'zscore' | 'rank') and combined with cf_weight /
+    content_weight.
+    
+    Candidate lists are candidate_depth long whatever n is (longer only
+    when n exceeds it), so the top n of a request is a prefix of any
+    longer list: offline tables of top-50 serve /recommend at any n.
     """
     
-    def __init__(self, cf_weight: float = 0.6, content_weight: float = 0.4):
+    def __init__(self, cf_weight: float = 0.6, content_weight: float = 0.4,
+                 normalization: str = "zscore",
+                 cf_model: Optional[CollaborativeFiltering] = None,
+                 content_model: Optional[ContentBasedFiltering] = None,
+                 candidate_depth: int = 100):
+        normalize_scores(np.empty(0), normalization)  # validate early
         self.cf_weight = cf_weight
         self.content_weight = content_weight
+        self.normalization = normalization
+        self.candidate_depth = candidate_depth
         
-        self.cf_model = CollaborativeFiltering()
-        self.content_model = ContentBasedFiltering()
+        self.cf_model = cf_model if cf_model is not None else CollaborativeFiltering()
+        self.content_model = content_model if content_model is not None else ContentBasedFiltering()
+        # Precomputed neighbours (src/jobs/similar_items.py), optional
+        self.similar_items_table: Optional[SimilarItemsTable] = None
+        # Offline top-N per user (src/jobs/precompute_recommendations.py), optional
+        self.precomputed: Optional[PrecomputedRecommendations] = None
         
         self.is_trained = False
         
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "HybridRecommender":
+        """
+        Build from the models section of config.yaml: fusion settings from
+        models.hybrid, sub-models from their own sections
+        """
+        hybrid = config.get('hybrid', {})
+        return cls(
+            cf_weight=hybrid.get('cf_weight', 0.6),
+            content_weight=hybrid.get('content_weight', 0.4),
+            normalization=hybrid.get('normalization', 'zscore'),
+            candidate_depth=hybrid.get('candidate_depth', 100),
+            cf_model=CollaborativeFiltering.from_config(config.get('collaborative_filtering', {})),
+            content_model=ContentBasedFiltering.from_config(config.get('content_based', {}))
+        )
+        
     def train(self, user_item_matrix, user_ids: List[int], 
-              item_ids: List[int], items_data: List[Dict]):
+              item_ids: List[int], items_data: List[Dict],
+              time_budget: Optional[float] = None, tol: Optional[float] = None):
         """
         Train both models
+        
+        time_budget / tol: CF early stopping, overriding the
+            models.collaborative_filtering settings
         """
         logger.info("Training hybrid model...")
         
         # Train collaborative filtering
-        self.cf_model.fit(user_item_matrix, user_ids, item_ids)
+        self.cf_model.fit(user_item_matrix, user_ids, item_ids, time_budget=time_budget, tol=tol)
         
         # Train content-based
         self.content_model.fit(items_data)
@@ -38,58 +82,232 @@ class HybridRecommender:
         logger.info("Hybrid model training completed!")
         
     def recommend(self, user_id: int, user_interactions: List[Tuple[int, float]] = None,
-                  n: int = 10, diversity_weight: float = 0.2) -> List[Dict]:
+                  n: int = 10, diversity_weight: float = 0.2,
+                  filter_watched: bool = False) -> List[Dict]:
         """
         Get hybrid recommendations
+        
+        filter_watched: leave out items from the user's training row and
+            from user_interactions
         """
         if not self.is_trained:
             logger.warning("Model not trained yet!")
             return []
         
+        # Cold-start users: fold their interactions into the CF model
+        if user_interactions and self.cf_model.user_vector(user_id) is None:
+            self.cf_model.update_user(user_id, user_interactions)
+        
+        exclude_items = self.watched_items(user_id, user_interactions) if filter_watched else None
+        
+        depth = self.depth(n)
+        
         # Get CF recommendations
-        cf_recs = self.cf_model.predict(user_id, n=n*2)
-        cf_dict = {item_id: score for item_id, score in cf_recs}
+        cf_recs = self.cf_model.predict(user_id, n=depth, exclude_items=exclude_items)
         
         # Get content-based recommendations
-        cb_recs = []
+        cb_recs, user_profile = [], None
         if user_interactions:
             user_profile = self.content_model.get_user_profile(user_interactions)
-            cb_recs = self.content_model.recommend(user_profile, n=n*2)
-        cb_dict = {item_id: score for item_id, score in cb_recs}
-        
-        # Combine scores
-        all_items = set(cf_dict.keys()) | set(cb_dict.keys())
-        hybrid_scores = {}
-        
-        for item_id in all_items:
-            cf_score = cf_dict.get(item_id, 0)
-            cb_score = cb_dict.get(item_id, 0)
-            
-            # Weighted combination
-            hybrid_score = (self.cf_weight * cf_score + 
-                          self.content_weight * cb_score)
-            
-            hybrid_scores[item_id] = hybrid_score
-        
-        # Sort by score
-        sorted_items = sorted(hybrid_scores.items(), 
-                            key=lambda x: x[1], reverse=True)
+            cb_recs = self.content_model.recommend(user_profile, n=depth,
+                                                   exclude_items=exclude_items)
+        
+        return self._blend(user_id, user_profile, cf_recs, cb_recs, n, diversity_weight)
+    
+    def depth(self, n: int) -> int:
+        """Length of the candidate lists behind a top-n request"""
+        return max(self.candidate_depth, n)
+    
+    def precomputed_recommendations(self, user_id: int, n: int = 10) -> Optional[List[Dict]]:
+        """
+        Offline recommendations of a returning user, formatted like
+        recommend(); None when the table is missing, too short or does
+        not cover the user, or the user was folded in since
+        """
+        table = self.precomputed
+        if table is None or n > table.n or self.cf_model.is_folded(user_id):
+            return None
+        recs = table.get(user_id, n)
+        return self._format(recs, 'hybrid') if recs is not None else None
+    
+    def recommend_many(self, requests: List[Dict]) -> List[List[Dict]]:
+        """
+        recommend() for several users at once
+        
+        requests: dicts with recommend()'s keyword arguments (user_id
+            required). CF and content scores of all requests are computed
+            with one matrix multiply each; fusion and diversity then run
+            per request. Results are aligned with requests.
+        """
+        if not self.is_trained:
+            logger.warning("Model not trained yet!")
+            return [[] for _ in requests]
+        
+        user_ids, interactions, excludes = [], [], []
+        for request in requests:
+            user_id, user_interactions = request['user_id'], request.get('user_interactions')
+            if user_interactions and self.cf_model.user_vector(user_id) is None:
+                self.cf_model.update_user(user_id, user_interactions)
+            user_ids.append(user_id)
+            interactions.append(user_interactions)
+            excludes.append(self.watched_items(user_id, user_interactions)
+                            if request.get('filter_watched', False) else None)
+        
+        depth = self.depth(max(request.get('n', 10) for request in requests))
+        cf_batch = self.cf_model.predict_batch(user_ids, n=depth, exclude_seen=False,
+                                               exclude_items=excludes)
+        
+        cb_batch = [[] for _ in requests]
+        profiles = [None for _ in requests]
+        with_profile = [pos for pos, user_interactions in enumerate(interactions) if user_interactions]
+        if with_profile:
+            for pos in with_profile:
+                profiles[pos] = self.content_model.get_user_profile(interactions[pos])
+            cb_recs = self.content_model.recommend_batch(
+                np.stack([profiles[pos] for pos in with_profile]), n=depth,
+                exclude_items=[excludes[pos] for pos in with_profile]
+            )
+            for pos, recs in zip(with_profile, cb_recs):
+                cb_batch[pos] = recs
+        
+        results = []
+        for request, profile, cf_recs, cb_recs in zip(requests, profiles, cf_batch, cb_batch):
+            n = request.get('n', 10)
+            results.append(self._blend(request['user_id'], profile, cf_recs[:self.depth(n)],
+                                       cb_recs[:self.depth(n)], n, request.get('diversity_weight', 0.2)))
+        return results
+    
+    def _blend(self, user_id: int, user_profile: Optional[np.ndarray],
+               cf_recs: List[Tuple[int, float]], cb_recs: List[Tuple[int, float]],
+               n: int, diversity_weight: float) -> List[Dict]:
+        """
+        Fuse CF and content scores over the union of both top lists, then
+        re-rank for diversity
+        """
+        candidates = np.unique(np.fromiter(
+            (item_id for item_id, _ in cf_recs + cb_recs), dtype=np.int64
+        ))
+        if len(candidates) == 0:
+            return []
+        
+        fused = self.fuse(self.cf_model.item_scores(user_id, candidates),
+                          self.content_model.item_scores(user_profile, candidates)
+                          if user_profile is not None else None)
+        top = top_k(fused, self.depth(n))
+        ranked = list(zip(candidates[top].tolist(), fused[top].tolist()))
         
         # Apply diversity
-        final_recommendations = self._apply_diversity(
-            sorted_items[:n*2], n, diversity_weight
-        )
+        final_recommendations = self._apply_diversity(ranked, n, diversity_weight)
         
         # Format output
+        return self._format(final_recommendations[:n], 'hybrid')
+    
+    def fuse(self, cf_scores: np.ndarray, cb_scores: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Weighted sum of per-model normalized scores over one candidate array
+        
+        Missing scores (NaN: item unknown to a model) get the neutral
+        value of the normalization instead of a penalty. A model with no
+        score at all for this user is left out.
+        """
+        fused = np.zeros(len(cf_scores))
+        for weight, scores in ((self.cf_weight, cf_scores), (self.content_weight, cb_scores)):
+            if scores is not None and np.isfinite(scores).any():
+                fused += weight * normalize_scores(scores, self.normalization)
+        return fused
+    
+    def recommend_collaborative(self, user_id: int, n: int = 10,
+                                exclude_items: Optional[Iterable[int]] = None) -> List[Dict]:
+        """
+        CF-only recommendations, formatted like recommend()
+        """
+        if not self.is_trained:
+            return []
+        recs = self.cf_model.predict(user_id, n=n, exclude_items=exclude_items)
+        return self._format(recs, 'collaborative_filtering')
+    
+    def recommend_content(self, user_interactions: List[Tuple[int, float]], n: int = 10,
+                          exclude_items: Optional[Iterable[int]] = None) -> List[Dict]:
+        """
+        Content-only recommendations from a profile of user_interactions
+        """
+        if not self.is_trained or not user_interactions:
+            return []
+        user_profile = self.content_model.get_user_profile(user_interactions)
+        recs = self.content_model.recommend(user_profile, n=n, exclude_items=exclude_items)
+        return self._format(recs, 'content_based')
+    
+    def similar_items(self, item_id: int, n: int = 10) -> List[Tuple[int, float]]:
+        """
+        Neighbours from the precomputed table when it covers the request,
+        else by content features, falling back to CF factors for items
+        without metadata
+        """
+        if not self.is_trained:
+            return []
+        table = self.similar_items_table
+        if table is not None and n <= table.k:
+            neighbours = table.get(item_id, n)
+            if neighbours is not None:
+                return neighbours
+        return (self.content_model.get_similar_items(item_id, n) or
+                self.cf_model.get_similar_items(item_id, n))
+    
+    def update_user(self, user_id: int, user_interactions: List[Tuple[int, float]]) -> bool:
+        """
+        Refresh a user's CF vector from recent interactions (fold-in)
+        """
+        if not self.is_trained:
+            return False
+        return self.cf_model.update_user(user_id, user_interactions)
+    
+    def watched_items(self, user_id: int,
+                      user_interactions: Optional[List[Tuple[int, float]]] = None) -> np.ndarray:
+        """
+        Item ids the user has interacted with: their CF training CSR row
+        plus any recent interactions
+        """
+        watched = []
+        cf = self.cf_model
+        if cf.user_items is not None and user_id in cf.user_index:
+            row = cf.user_index[user_id]
+            indptr = cf.user_items.indptr
+            watched.append(cf.item_ids[cf.user_items.indices[indptr[row]:indptr[row + 1]]])
+        if user_interactions:
+            watched.append(np.fromiter((item_id for item_id, _ in user_interactions),
+                                       dtype=np.int64))
+        
+        if not watched:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(watched))
+    
+    def recommend_batch(self, user_ids: List[int], n: int = 10,
+                        batch_size: int = 256) -> List[List[Dict]]:
+        """
+        Get recommendations for many users with batched CF scoring
+        
+        Results are aligned with user_ids.
+        """
+        if not self.is_trained:
+            logger.warning("Model not trained yet!")
+            return [[] for _ in user_ids]
+        
+        batch_recs = self.cf_model.predict_batch(user_ids, n=n, batch_size=batch_size)
+        return [self._format(recs, 'collaborative_filtering') for recs in batch_recs]
+    
+    def _format(self, items: List[Tuple[int, float]], method: str) -> List[Dict]:
+        """
+        Attach item metadata to (item_id, score) pairs
+        """
         recommendations = []
-        for item_id, score in final_recommendations[:n]:
+        for item_id, score in items:
             item_data = self.content_model.item_metadata.get(item_id, {})
             recommendations.append({
                 'item_id': item_id,
                 'score': round(score, 4),
                 'title': item_data.get('title', f'Item {item_id}'),
                 'genres': item_data.get('genres', ''),
-                'method': 'hybrid'
+                'method': method
             })
         
         return recommendations
@@ -97,65 +315,39 @@ class HybridRecommender:
     def _apply_diversity(self, items: List[Tuple[int, float]], 
                         n: int, diversity_weight: float) -> List[Tuple[int, float]]:
         """
-        Apply diversity to recommendations
+        Greedy diversity re-ranking (MMR)
+        
+        Starting from the top item, repeatedly picks the item maximizing
+        score + diversity_weight * mean genre dissimilarity (Jaccard
+        distance, 0.5 when either item has no genres) to the items already
+        picked. Genres are precomputed bitsets and the dissimilarity sums
+        are updated incrementally, one vectorized pass per picked item.
+        Picks are greedy, so the result for n is a prefix of that for any
+        larger n.
         """
-        if diversity_weight == 0 or len(items) <= n:
+        n = min(n, len(items))
+        if diversity_weight == 0 or n <= 1:
             return items[:n]
         
-        selected = [items[0]]  # Start with top item
-        remaining = items[1:]
-        
-        while len(selected) < n and remaining:
-            max_score = -float('inf')
-            best_idx = 0
-            
-            for idx, (item_id, score) in enumerate(remaining):
-                # Calculate diversity bonus
-                diversity_bonus = self._calculate_diversity(
-                    item_id, [s[0] for s in selected]
-                )
-                
-                # Combined score
-                combined_score = score + diversity_weight * diversity_bonus
-                
-                if combined_score > max_score:
-                    max_score = combined_score
-                    best_idx = idx
-            
-            selected.append(remaining.pop(best_idx))
-        
-        return selected
-    
-    def _calculate_diversity(self, item_id: int, 
-                            selected_items: List[int]) -> float:
-        """
-        Calculate diversity bonus for an item
-        """
-        if not selected_items:
-            return 1.0
-        
-        # Get item genres
-        item_genres = set(self.content_model.item_metadata.get(
-            item_id, {}
-        ).get('genres', '').split())
-        
-        # Calculate average dissimilarity
-        dissimilarities = []
-        for selected_id in selected_items:
-            selected_genres = set(self.content_model.item_metadata.get(
-                selected_id, {}
-            ).get('genres', '').split())
-            
-            if not item_genres or not selected_genres:
-                dissimilarities.append(0.5)
-            else:
-                # Jaccard distance
-                intersection = len(item_genres & selected_genres)
-                union = len(item_genres | selected_genres)
-                dissimilarity = 1 - (intersection / union if union > 0 else 0)
-                dissimilarities.append(dissimilarity)
-        
-        return np.mean(dissimilarities) if dissimilarities else 0.5
+        item_ids = np.fromiter((item_id for item_id, _ in items), dtype=np.int64, count=len(items))
+        scores = np.fromiter((score for _, score in items), dtype=np.float64, count=len(items))
+        bits = self.content_model.genre_bits_for(item_ids)
+        counts = popcount(bits)
+        
+        selected = [0]  # Start with top item
+        available = np.ones(len(items), dtype=bool)
+        available[0] = False
+        dissimilarity = np.zeros(len(items))
+        
+        while len(selected) < n:
+            dissimilarity += jaccard_distance(bits, bits[selected[-1]], counts=counts)
+            combined = scores + diversity_weight * dissimilarity / len(selected)
+            combined[~available] = -np.inf
+            best = int(np.argmax(combined))
+            selected.append(best)
+            available[best] = False
+        
+        return [items[idx] for idx in selected]
     
     def save(self, cf_path: str, content_path: str):
         """Save both models"""
@@ -163,9 +355,19 @@ class HybridRecommender:
         self.content_model.save(content_path)
         logger.info("Hybrid model saved!")
     
-    def load(self, cf_path: str, content_path: str):
-        """Load both models"""
-        self.cf_model.load(cf_path)
-        self.content_model.load(content_path)
+    def load(self, cf_path: str, content_path: str, similar_items_path: Optional[str] = None,
+             recommendations_path: Optional[str] = None, allow_legacy: bool = True):
+        """
+        Load both models, plus precomputed similar items and per-user
+        recommendations when their paths are given
+        
+        allow_legacy: accept joblib pickles for the two models
+        """
+        self.cf_model.load(cf_path, allow_legacy=allow_legacy)
+        self.content_model.load(content_path, allow_legacy=allow_legacy)
+        self.similar_items_table = (SimilarItemsTable.load(similar_items_path)
+                                    if similar_items_path else None)
+        self.precomputed = (PrecomputedRecommendations.load(recommendations_path)
+                            if recommendations_path else None)
         self.is_trained = True
         logger.info("Hybrid model loaded!")
\ No newline at end of file
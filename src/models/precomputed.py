@@ -0,0 +1,82 @@
+import time
+import numpy as np
+from typing import List, Tuple, Optional, Dict, Any
+import logging
+
+from src.utils.artifacts import (
+    IdIndex, artifact_writer, load_arrays, read_manifest, save_arrays, write_manifest
+)
+
+logger = logging.getLogger(__name__)
+
+class PrecomputedRecommendations:
+    """
+    Offline top-N recommendations for every known user
+
+    Columnar, fixed-width layout: row r of items (int32 rows into
+    item_ids) and scores (float32) holds the ranked recommendations of
+    user_ids[r], padded with -1 / NaN when fewer than n were found.
+    generated_at (epoch seconds) lets the API detect users who have been
+    active since.
+    """
+
+    ARTIFACT_FORMAT = "precomputed_recommendations"
+
+    def __init__(self, user_ids: np.ndarray, item_ids: np.ndarray, items: np.ndarray,
+                 scores: np.ndarray, generated_at: Optional[float] = None,
+                 params: Optional[Dict[str, Any]] = None, user_index: Optional[IdIndex] = None):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.items = items
+        self.scores = scores
+        self.generated_at = generated_at if generated_at is not None else time.time()
+        self.params = params or {}
+        self.user_index = user_index if user_index is not None else IdIndex.from_ids(user_ids)
+
+    @property
+    def n(self) -> int:
+        """Recommendations stored per user"""
+        return self.items.shape[1]
+
+    def get(self, user_id: int, n: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """Top-n (item_id, score) pairs of user_id, None for unknown users"""
+        row = self.user_index.get(user_id)
+        if row is None:
+            return None
+        items = self.items[row, :n]
+        items = items[items >= 0]
+        return list(zip(self.item_ids[items].tolist(),
+                        self.scores[row, :len(items)].tolist()))
+
+    def __contains__(self, user_id) -> bool:
+        return user_id in self.user_index
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def save(self, filepath: str):
+        """Write the table as an artifact directory of .npy arrays"""
+        arrays = {
+            'user_ids': self.user_ids,
+            'item_ids': self.item_ids,
+            'items': self.items,
+            'scores': self.scores
+        }
+        arrays.update(self.user_index.arrays('user_index'))
+
+        with artifact_writer(filepath) as staging:
+            names = save_arrays(staging, arrays)
+            params = dict(self.params, generated_at=self.generated_at)
+            write_manifest(staging, self.ARTIFACT_FORMAT, params, names)
+
+        logger.info(f"Recommendations for {len(self)} users (n={self.n}) saved to {filepath}")
+
+    @classmethod
+    def load(cls, filepath: str, mmap_mode: Optional[str] = 'r') -> "PrecomputedRecommendations":
+        """Open saved recommendations, memory-mapped read-only by default"""
+        manifest = read_manifest(filepath, cls.ARTIFACT_FORMAT)
+        arrays = load_arrays(filepath, manifest['arrays'], mmap_mode)
+        params = dict(manifest['params'])
+        generated_at = params.pop('generated_at')
+        return cls(arrays['user_ids'], arrays['item_ids'], arrays['items'], arrays['scores'],
+                   generated_at, params, IdIndex.from_arrays(arrays, 'user_index'))
@@ -0,0 +1,198 @@
+import threading
+import time
+import weakref
+import numpy as np
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional, Dict, Any, Tuple
+import logging
+
+from src.models.hybrid_model import HybridRecommender
+from src.utils.config import get_section
+
+logger = logging.getLogger(__name__)
+
+class ModelGeneration:
+    """
+    One loaded, immutable-after-publish model version
+    """
+
+    def __init__(self, model: HybridRecommender, version: str, source: Optional[Dict[str, str]] = None):
+        self.model = model
+        self.version = version
+        self.source = source or {}
+        self.loaded_at = datetime.now().isoformat()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'source': self.source
+        }
+
+class ModelRegistry:
+    """
+    Holds the serving model generation and swaps it atomically
+
+    Readers take `registry.current` once per request and use only that
+    generation: a single attribute read, no locks. A new generation is
+    loaded and warmed up off the request path, then published by
+    rebinding one reference. The registry drops its reference to the
+    old generation immediately; the generation (and its memory maps) is
+    freed once the last in-flight request holding it finishes.
+
+    The outcome of the latest background load (load_async) is kept in
+    last_load, failures included.
+    
+    Users folded in on the serving generation (online updates since its
+    training) are folded in again on the new one when user_interactions
+    is given: a callable returning a user's logged (item_id, rating)
+    pairs.
+    """
+
+    def __init__(self, warmup_queries: int = 5,
+                 user_interactions: Optional[Callable[[int], List[Tuple[int, float]]]] = None):
+        self.warmup_queries = warmup_queries
+        self.user_interactions = user_interactions
+
+        self._current: Optional[ModelGeneration] = None
+        self._write_lock = threading.Lock()
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+        self._retired: Dict[str, weakref.ref] = {}
+        self.last_load: Optional[Dict[str, Any]] = None
+
+    @property
+    def current(self) -> Optional[ModelGeneration]:
+        """Serving generation (None until a model is published)"""
+        return self._current
+
+    @property
+    def model(self) -> Optional[HybridRecommender]:
+        generation = self._current
+        return generation.model if generation is not None else None
+
+    def load(self, cf_path: str, content_path: str, version: Optional[str] = None,
+             similar_items_path: Optional[str] = None,
+             recommendations_path: Optional[str] = None,
+             allow_legacy: bool = True) -> ModelGeneration:
+        """
+        Load models from disk, warm them up and publish them
+
+        Runs on the calling thread; use load_async from request handlers.
+        allow_legacy=False refuses joblib pickles (see HybridRecommender.load).
+        """
+        model = HybridRecommender.from_config(get_section('models'))
+        model.load(cf_path, content_path, similar_items_path, recommendations_path,
+                   allow_legacy=allow_legacy)
+        source = {'cf_path': cf_path, 'content_path': content_path}
+        if similar_items_path:
+            source['similar_items_path'] = similar_items_path
+        if recommendations_path:
+            source['recommendations_path'] = recommendations_path
+        return self.publish(model, version, source=source)
+
+    def load_async(self, cf_path: str, content_path: str, version: Optional[str] = None,
+                   similar_items_path: Optional[str] = None,
+                   recommendations_path: Optional[str] = None,
+                   allow_legacy: bool = True) -> Future:
+        """
+        Load and publish a new generation on the background loader thread
+
+        The result is recorded in last_load (and failures logged) whether
+        or not the caller waits on the returned future.
+        """
+        status = {
+            'status': 'loading',
+            'version': version,
+            'source': {'cf_path': cf_path, 'content_path': content_path},
+            'requested_at': datetime.now().isoformat()
+        }
+        self.last_load = status
+        future = self._loader.submit(self.load, cf_path, content_path, version,
+                                     similar_items_path, recommendations_path, allow_legacy)
+        future.add_done_callback(lambda done: self._load_finished(status, done))
+        return future
+
+    def _load_finished(self, status: Dict[str, Any], future: Future):
+        error = CancelledError() if future.cancelled() else future.exception()
+        if error is None:
+            status.update(status='published', version=future.result().version)
+        else:
+            logger.error(f"Model load from {status['source']} failed: {error!r}")
+            status.update(status='failed', error=str(error))
+        status['finished_at'] = datetime.now().isoformat()
+
+    def publish(self, model: HybridRecommender, version: Optional[str] = None,
+                source: Optional[Dict[str, str]] = None, warm_up: bool = True) -> ModelGeneration:
+        """Warm up an already-built model and make it the serving generation"""
+        generation = ModelGeneration(model, version or time.strftime("%Y%m%d-%H%M%S"), source)
+        if warm_up:
+            self._warm_up(model)
+
+        carried = self._carry_over(self._current, model)
+        
+        with self._write_lock:
+            previous = self._current
+            self._current = generation
+
+        if previous is not None:
+            # Users folded in on the old generation while the first pass ran
+            self._carry_over(previous, model, carried)
+            self._retire(previous)
+        logger.info(f"Model generation {generation.version} is now serving")
+        return generation
+
+    def _warm_up(self, model: HybridRecommender):
+        """Run a few synthetic queries so lazy state and page cache are hot"""
+        if not model.is_trained or self.warmup_queries <= 0:
+            return
+
+        start_time = time.time()
+        rng = np.random.default_rng()
+        user_ids = np.asarray(model.cf_model.user_index.sorted_ids)
+        item_ids = np.asarray(model.content_model.item_ids)
+
+        for _ in range(self.warmup_queries):
+            if len(user_ids):
+                user_id = int(user_ids[rng.integers(len(user_ids))])
+                model.recommend(user_id, n=10)
+            if len(item_ids):
+                model.content_model.get_similar_items(int(item_ids[rng.integers(len(item_ids))]), 10)
+
+        logger.info(f"Warm-up finished in {(time.time() - start_time) * 1000:.1f}ms")
+
+    def _carry_over(self, previous: Optional[ModelGeneration], model: HybridRecommender,
+                    done: Optional[Dict[int, Any]] = None) -> Dict[int, Any]:
+        """
+        Fold the previous generation's folded-in users into model
+        
+        Folded vectors are tied to the item factors they were solved
+        against, so they are re-solved from the logged interactions.
+        Users whose vector is unchanged since `done` (an earlier
+        snapshot) are skipped. Returns the snapshot that was carried.
+        """
+        if previous is None or self.user_interactions is None or not model.is_trained:
+            return {}
+        snapshot = previous.model.cf_model.folded_snapshot()
+        done = done or {}
+        pending = [user_id for user_id, vector in snapshot.items() if done.get(user_id) is not vector]
+        if pending:
+            start_time = time.time()
+            refolded = model.cf_model.refold(pending, self.user_interactions)
+            logger.info(f"Carried {refolded}/{len(pending)} folded-in users over "
+                        f"in {(time.time() - start_time) * 1000:.1f}ms")
+        return snapshot
+    
+    def _retire(self, generation: ModelGeneration):
+        """Track an old generation until in-flight requests release it"""
+        version = generation.version
+        self._retired[version] = weakref.ref(generation)
+        weakref.finalize(generation, self._released, version)
+
+    def _released(self, version: str):
+        self._retired.pop(version, None)
+        logger.info(f"Model generation {version} drained and released")
+
+    def draining(self) -> list:
+        """Versions of retired generations still referenced by requests"""
+        return [version for version, ref in list(self._retired.items()) if ref() is not None]
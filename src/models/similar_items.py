@@ -0,0 +1,75 @@
+import numpy as np
+from typing import List, Tuple, Optional, Dict, Any
+import logging
+
+from src.utils.artifacts import (
+    IdIndex, artifact_writer, load_arrays, read_manifest, save_arrays, write_manifest
+)
+
+logger = logging.getLogger(__name__)
+
+class SimilarItemsTable:
+    """
+    Precomputed top-K neighbours of every item
+
+    CSR-style layout: the neighbours of the item at row i are
+    indices[offsets[i]:offsets[i + 1]] (rows into item_ids, int32) with
+    scores in the same slice of scores (float32), highest first. A lookup
+    is one id search plus an O(K) slice.
+    """
+
+    ARTIFACT_FORMAT = "similar_items"
+
+    def __init__(self, item_ids: np.ndarray, offsets: np.ndarray, indices: np.ndarray,
+                 scores: np.ndarray, k: int, params: Optional[Dict[str, Any]] = None,
+                 item_index: Optional[IdIndex] = None):
+        self.item_ids = item_ids
+        self.offsets = offsets
+        self.indices = indices
+        self.scores = scores
+        self.k = k
+        self.params = params or {}
+        self.item_index = item_index if item_index is not None else IdIndex.from_ids(item_ids)
+
+    def get(self, item_id: int, n: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """Top-n neighbours of item_id, None if the item is not in the table"""
+        row = self.item_index.get(item_id)
+        if row is None:
+            return None
+        start = self.offsets[row]
+        end = min(self.offsets[row + 1], start + n)
+        return list(zip(self.item_ids[self.indices[start:end]].tolist(),
+                        self.scores[start:end].tolist()))
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self.item_index
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def save(self, filepath: str):
+        """Write the table as an artifact directory of .npy arrays"""
+        arrays = {
+            'item_ids': self.item_ids,
+            'offsets': self.offsets,
+            'indices': self.indices,
+            'scores': self.scores
+        }
+        arrays.update(self.item_index.arrays('item_index'))
+
+        with artifact_writer(filepath) as staging:
+            names = save_arrays(staging, arrays)
+            params = dict(self.params, k=self.k)
+            write_manifest(staging, self.ARTIFACT_FORMAT, params, names)
+
+        logger.info(f"Similar-items table ({len(self)} items, k={self.k}) saved to {filepath}")
+
+    @classmethod
+    def load(cls, filepath: str, mmap_mode: Optional[str] = 'r') -> "SimilarItemsTable":
+        """Open a saved table, memory-mapped read-only by default"""
+        manifest = read_manifest(filepath, cls.ARTIFACT_FORMAT)
+        arrays = load_arrays(filepath, manifest['arrays'], mmap_mode)
+        params = dict(manifest['params'])
+        k = params.pop('k')
+        return cls(arrays['item_ids'], arrays['offsets'], arrays['indices'], arrays['scores'],
+                   k, params, IdIndex.from_arrays(arrays, 'item_index'))
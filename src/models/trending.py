@@ -0,0 +1,571 @@
+import heapq
+import json
+import os
+import time
+import numpy as np
+from typing import List, Tuple, Optional, Dict, Any, Set, Iterable
+import logging
+
+from src.utils.artifacts import (
+    MANIFEST_FILE, artifact_writer, load_arrays, read_manifest, save_arrays, write_manifest
+)
+from src.utils.ranking import top_k
+from src.utils.sketches import CountMinSketch, SpaceSaving
+
+logger = logging.getLogger(__name__)
+
+# Ring name -> (bucket width in ms, buckets kept)
+RINGS = {
+    'hour': (3_600_000, 24),
+    'day': (86_400_000, 30)
+}
+
+# Window name -> (ring, buckets covered)
+WINDOWS = {
+    '24h': ('hour', 24),
+    '7d': ('day', 7),
+    '30d': ('day', 30)
+}
+
+DEFAULT_HALF_LIFE_HOURS = {'24h': 6.0, '7d': 48.0, '30d': 168.0}
+
+def window_age_weights(half_life_hours: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """Per window, the decay weight of a bucket by its age (0 outside the window)"""
+    age_weights = {}
+    for window, (ring, covered) in WINDOWS.items():
+        bucket_hours = RINGS[ring][0] / 3_600_000
+        ages = np.arange(RINGS[ring][1])
+        weights = 0.5 ** (ages * bucket_hours / half_life_hours[window])
+        age_weights[window] = np.where(ages < covered, weights, 0.0)
+    return age_weights
+
+def bucket_ages(ring: str, current: int) -> np.ndarray:
+    """Age (in buckets) of each position of a ring whose newest bucket is current"""
+    buckets = RINGS[ring][1]
+    return (current - np.arange(buckets)) % buckets
+
+class TrendingEngine:
+    """
+    Sliding-window trending items from the stream of interactions
+
+    Each tracked item owns a slot (column) in two rings of event counts:
+    24 hour buckets and 30 day buckets (float32 arrays of shape
+    (buckets, capacity)). A window's score is the count of each bucket in
+    the window, decayed by the bucket's age with the window's half-life.
+
+    record() adds one event to the current buckets and to the window
+    scores, then offers the item to a per-window top-K heap, so queries
+    only sort K entries. When time moves into a new bucket the expired
+    bucket is cleared and scores and heaps are rebuilt with one
+    vectorized pass over the ring.
+
+    Memory is bounded by capacity: when every slot is taken the 1% of
+    items with the lowest 30d score are evicted.
+    """
+
+    ARTIFACT_FORMAT = "trending"
+
+    def __init__(self, capacity: int = 100_000, top_k: int = 100,
+                 half_life_hours: Optional[Dict[str, float]] = None):
+        self.capacity = int(capacity)
+        self.top_k = max(1, int(top_k))
+        self.half_life_hours = dict(DEFAULT_HALF_LIFE_HOURS, **(half_life_hours or {}))
+
+        self.slot_items = np.full(self.capacity, -1, dtype=np.int64)
+        self._slots: Dict[int, int] = {}
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self.rings = {name: np.zeros((buckets, self.capacity), dtype=np.float32)
+                      for name, (_, buckets) in RINGS.items()}
+        # Absolute number of the newest bucket of each ring, None before any event
+        self.current: Dict[str, Optional[int]] = {name: None for name in RINGS}
+
+        self.scores = {window: np.zeros(self.capacity) for window in WINDOWS}
+        self._age_weights = window_age_weights(self.half_life_hours)
+        self._heaps: Dict[str, List[Tuple[float, int]]] = {window: [] for window in WINDOWS}
+        self._top: Dict[str, Set[int]] = {window: set() for window in WINDOWS}
+        # Epoch ms of the snapshot this engine was restored from
+        self.saved_at: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "TrendingEngine":
+        """
+        Build from the trending section of config.yaml
+        """
+        return cls(
+            capacity=config.get('capacity', 100_000),
+            top_k=config.get('top_k', 100),
+            half_life_hours=config.get('half_life_hours')
+        )
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def nbytes(self) -> int:
+        """Array memory (the id -> slot dict comes on top)"""
+        return (self.slot_items.nbytes + sum(ring.nbytes for ring in self.rings.values()) +
+                sum(scores.nbytes for scores in self.scores.values()))
+
+    def error_bound(self, window: str) -> Optional[Dict[str, float]]:
+        """Counts are exact"""
+        return None
+
+    def record(self, item_id: int, timestamp_ms: Optional[int] = None, weight: float = 1.0):
+        """Count one event for item_id; events older than the rings are ignored"""
+        timestamp_ms = int(time.time() * 1000) if timestamp_ms is None else int(timestamp_ms)
+        self._advance(timestamp_ms)
+
+        ages = {name: self.current[name] - timestamp_ms // width
+                for name, (width, _) in RINGS.items()}
+        if all(ages[name] >= buckets for name, (_, buckets) in RINGS.items()):
+            return
+
+        slot = self._slot(item_id)
+        for name, (_, buckets) in RINGS.items():
+            if ages[name] < buckets:
+                self.rings[name][(self.current[name] - ages[name]) % buckets, slot] += weight
+        for window, (ring, _) in WINDOWS.items():
+            age = ages[ring]
+            if age < RINGS[ring][1] and self._age_weights[window][age] > 0:
+                self.scores[window][slot] += weight * self._age_weights[window][age]
+                self._offer(window, slot)
+
+    def ingest(self, item_ids: np.ndarray, timestamps_ms: np.ndarray):
+        """
+        Bulk-load past events (e.g. an interaction log scan)
+
+        Does not evict: when more distinct items arrive than free slots,
+        the most frequent ones are kept.
+        """
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        if len(item_ids) == 0:
+            return
+        self._advance(int(timestamps_ms.max()))
+
+        unique, inverse, counts = np.unique(item_ids, return_inverse=True, return_counts=True)
+        slots = np.full(len(unique), -1, dtype=np.int64)
+        for pos in np.argsort(-counts, kind='stable'):
+            item_id = int(unique[pos])
+            if item_id in self._slots or self._free:
+                slots[pos] = self._slot(item_id, evict=False)
+        event_slots = slots[inverse]
+
+        for name, (width, buckets) in RINGS.items():
+            ages = self.current[name] - timestamps_ms // width
+            keep = (ages < buckets) & (event_slots >= 0)
+            np.add.at(self.rings[name],
+                      ((self.current[name] - ages[keep]) % buckets, event_slots[keep]), 1.0)
+        self._rebuild(WINDOWS)
+
+    def top(self, window: str = '24h', n: int = 20,
+            now_ms: Optional[int] = None) -> List[Tuple[int, float, int]]:
+        """
+        Top-n (item_id, score, events in window) of a window, best first
+        """
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown window '{window}', expected one of {tuple(WINDOWS)}")
+        self._advance(int(time.time() * 1000) if now_ms is None else int(now_ms))
+
+        scores = self.scores[window]
+        slots = sorted(self._top[window], key=lambda slot: -scores[slot])[:n]
+        if not slots:
+            return []
+
+        ring, covered = WINDOWS[window]
+        rows = (self.current[ring] - np.arange(covered)) % RINGS[ring][1]
+        events = self.rings[ring][np.ix_(rows, slots)].sum(axis=0)
+        return [(int(self.slot_items[slot]), float(scores[slot]), int(round(count)))
+                for slot, count in zip(slots, events)]
+
+    def _slot(self, item_id: int, evict: bool = True) -> int:
+        slot = self._slots.get(item_id)
+        if slot is not None:
+            return slot
+        if not self._free and evict:
+            self._evict()
+        slot = self._free.pop()
+        self.slot_items[slot] = item_id
+        self._slots[item_id] = slot
+        return slot
+
+    def _evict(self):
+        """Free the slots of the items with the lowest 30d scores"""
+        count = max(1, self.capacity // 100)
+        victims = np.argpartition(self.scores['30d'], count - 1)[:count]
+        for slot in victims.tolist():
+            del self._slots[int(self.slot_items[slot])]
+        self.slot_items[victims] = -1
+        for ring in self.rings.values():
+            ring[:, victims] = 0
+        for scores in self.scores.values():
+            scores[victims] = 0
+        self._free.extend(victims.tolist())
+        self._rebuild_heaps(WINDOWS)
+
+    def _advance(self, timestamp_ms: int):
+        """Move the rings forward to the bucket of timestamp_ms"""
+        changed = []
+        for name, (width, buckets) in RINGS.items():
+            bucket = timestamp_ms // width
+            current = self.current[name]
+            if current is None or bucket > current:
+                if current is not None:
+                    steps = min(bucket - current, buckets)
+                    self.rings[name][(current + 1 + np.arange(steps)) % buckets] = 0
+                self.current[name] = bucket
+                changed.append(name)
+        if changed:
+            self._rebuild([window for window, (ring, _) in WINDOWS.items() if ring in changed])
+
+    def _rebuild(self, windows):
+        """Recompute window scores from the rings, then their heaps"""
+        for window in windows:
+            ring, _ = WINDOWS[window]
+            ages = bucket_ages(ring, self.current[ring])
+            self.scores[window] = self._age_weights[window][ages] @ self.rings[ring]
+        self._rebuild_heaps(windows)
+
+    def _rebuild_heaps(self, windows):
+        for window in windows:
+            scores = self.scores[window]
+            slots = top_k(np.where(self.slot_items >= 0, scores, 0.0), self.top_k)
+            slots = slots[scores[slots] > 0].tolist()
+            self._heaps[window] = [(scores[slot], slot) for slot in slots]
+            heapq.heapify(self._heaps[window])
+            self._top[window] = set(slots)
+
+    def _offer(self, window: str, slot: int):
+        """Let a slot whose score just grew into the window's top-K heap"""
+        top, heap, scores = self._top[window], self._heaps[window], self.scores[window]
+        if slot in top:
+            return
+        score = scores[slot]
+        if len(top) < self.top_k:
+            heapq.heappush(heap, (score, slot))
+            top.add(slot)
+            return
+
+        # Heap entries of members only lag behind (scores grow between
+        # rebuilds): refresh the minimum until it is current
+        while heap[0][0] != scores[heap[0][1]]:
+            heapq.heapreplace(heap, (scores[heap[0][1]], heap[0][1]))
+        if score > heap[0][0]:
+            _, dropped = heapq.heapreplace(heap, (score, slot))
+            top.discard(dropped)
+            top.add(slot)
+
+    def save(self, filepath: str):
+        """Snapshot the counters as an artifact directory"""
+        arrays = {'slot_items': self.slot_items}
+        arrays.update({f"{name}_ring": ring for name, ring in self.rings.items()})
+
+        with artifact_writer(filepath) as staging:
+            names = save_arrays(staging, arrays)
+            params = {
+                'capacity': self.capacity,
+                'top_k': self.top_k,
+                'half_life_hours': self.half_life_hours,
+                'current': self.current,
+                'saved_at': int(time.time() * 1000)
+            }
+            write_manifest(staging, self.ARTIFACT_FORMAT, params, names)
+
+        logger.info(f"Trending snapshot ({len(self)} items) saved to {filepath}")
+
+    @classmethod
+    def load(cls, filepath: str) -> "TrendingEngine":
+        """Restore a snapshot written by save()"""
+        manifest = read_manifest(filepath, cls.ARTIFACT_FORMAT)
+        arrays = load_arrays(filepath, manifest['arrays'], mmap_mode=None)
+        params = manifest['params']
+
+        engine = cls(params['capacity'], params['top_k'], params['half_life_hours'])
+        engine.slot_items = arrays['slot_items'].copy()
+        for name in RINGS:
+            engine.rings[name] = arrays[f"{name}_ring"].copy()
+        engine.current = {name: params['current'].get(name) for name in RINGS}
+        engine.saved_at = params.get('saved_at')
+        occupied = np.flatnonzero(engine.slot_items >= 0)
+        engine._slots = dict(zip(engine.slot_items[occupied].tolist(), occupied.tolist()))
+        engine._free = np.flatnonzero(engine.slot_items < 0)[::-1].tolist()
+        if all(current is not None for current in engine.current.values()):
+            engine._rebuild(WINDOWS)
+
+        logger.info(f"Trending snapshot ({len(engine)} items) loaded from {filepath}")
+        return engine
+
+class SketchTrendingEngine:
+    """
+    Approximate trending items in memory independent of the catalog size
+
+    Same rings, windows and decay as TrendingEngine, but each bucket is a
+    Count-Min sketch (rings of shape (buckets, depth, width)) and the
+    candidates of each window come from a Space-Saving list of
+    heavy_hitters items. Candidate scores are estimated from the summed,
+    decayed bucket sketches and over-count by at most error_bound(window)
+    with probability 1 - delta. When a bucket expires the candidate lists
+    are re-seeded with their sketch estimates.
+
+    Memory is 216 * depth * width bytes: about 5.9 MB at the default
+    epsilon, against 12.4 MB for TrendingEngine with capacity 50k. Saved
+    engines with the same epsilon, delta and seed can be combined offline
+    with merge(); the API keeps one engine per process.
+    """
+
+    ARTIFACT_FORMAT = "trending_sketch"
+
+    def __init__(self, epsilon: float = 5e-4, delta: float = 0.01, heavy_hitters: int = 1000,
+                 half_life_hours: Optional[Dict[str, float]] = None, seed: int = 0):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.heavy_hitters = int(heavy_hitters)
+        self.half_life_hours = dict(DEFAULT_HALF_LIFE_HOURS, **(half_life_hours or {}))
+        # Shape and hash functions shared by every bucket
+        self.sketch = CountMinSketch.from_error(epsilon, delta, seed)
+
+        shape = (self.sketch.depth, self.sketch.width)
+        self.rings = {name: np.zeros((buckets,) + shape, dtype=np.float32)
+                      for name, (_, buckets) in RINGS.items()}
+        # Total weight added to each bucket, for the error bounds
+        self.totals = {name: np.zeros(buckets) for name, (_, buckets) in RINGS.items()}
+        self.current: Dict[str, Optional[int]] = {name: None for name in RINGS}
+        self.candidates = {window: SpaceSaving(self.heavy_hitters) for window in WINDOWS}
+        self._age_weights = window_age_weights(self.half_life_hours)
+        self._rows = np.arange(self.sketch.depth)
+        self.saved_at: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "SketchTrendingEngine":
+        """
+        Build from the trending section of config.yaml
+        """
+        sketch = config.get('sketch') or {}
+        return cls(
+            epsilon=sketch.get('epsilon', 5e-4),
+            delta=sketch.get('delta', 0.01),
+            heavy_hitters=sketch.get('heavy_hitters', 1000),
+            half_life_hours=config.get('half_life_hours'),
+            seed=sketch.get('seed', 0)
+        )
+
+    def __len__(self) -> int:
+        return len(self.candidates['30d'])
+
+    @property
+    def nbytes(self) -> int:
+        """Sketch memory (the candidate lists come on top)"""
+        return sum(ring.nbytes for ring in self.rings.values())
+
+    def record(self, item_id: int, timestamp_ms: Optional[int] = None, weight: float = 1.0):
+        """Count one event for item_id; events older than the rings are ignored"""
+        timestamp_ms = int(time.time() * 1000) if timestamp_ms is None else int(timestamp_ms)
+        self._advance(timestamp_ms)
+
+        columns = None
+        for name, (width, buckets) in RINGS.items():
+            age = self.current[name] - timestamp_ms // width
+            if age >= buckets:
+                continue
+            if columns is None:
+                columns = self.sketch.columns(np.array([item_id]))[:, 0]
+            position = (self.current[name] - age) % buckets
+            self.rings[name][position, self._rows, columns] += weight
+            self.totals[name][position] += weight
+            for window, (ring, _) in WINDOWS.items():
+                if ring == name and self._age_weights[window][age] > 0:
+                    self.candidates[window].add(item_id, weight * self._age_weights[window][age])
+
+    def ingest(self, item_ids: np.ndarray, timestamps_ms: np.ndarray):
+        """Bulk-load past events (e.g. an interaction log scan)"""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        if len(item_ids) == 0:
+            return
+        self._advance(int(timestamps_ms.max()))
+
+        columns = self.sketch.columns(item_ids)
+        unique, inverse = np.unique(item_ids, return_inverse=True)
+        for name, (width, buckets) in RINGS.items():
+            ages = self.current[name] - timestamps_ms // width
+            keep = ages < buckets
+            positions = (self.current[name] - ages[keep]) % buckets
+            np.add.at(self.rings[name],
+                      (positions[np.newaxis, :], self._rows[:, np.newaxis], columns[:, keep]), 1.0)
+            np.add.at(self.totals[name], positions, 1.0)
+            for window, (ring, _) in WINDOWS.items():
+                if ring != name:
+                    continue
+                weights = np.where(keep, self._age_weights[window][np.minimum(ages, buckets - 1)], 0.0)
+                counts = np.bincount(inverse, weights=weights, minlength=len(unique))
+                present = counts > 0
+                batch = SpaceSaving.from_counts(self.heavy_hitters,
+                                                dict(zip(unique[present].tolist(), counts[present].tolist())))
+                self.candidates[window] = self.candidates[window].merge(batch)
+        self._rebuild(WINDOWS)
+
+    def estimate(self, window: str, item_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(decayed score, events) of items in a window, both upper estimates"""
+        ring, covered = WINDOWS[window]
+        columns = self.sketch.columns(item_ids)
+        if self.current[ring] is None:
+            return np.zeros(columns.shape[1]), np.zeros(columns.shape[1])
+        ages = bucket_ages(ring, self.current[ring])
+        counters = self.rings[ring][:, self._rows[:, np.newaxis], columns]
+        scores = np.tensordot(self._age_weights[window][ages], counters, axes=1).min(axis=0)
+        events = counters[ages < covered].sum(axis=0).min(axis=0)
+        return scores, events
+
+    def top(self, window: str = '24h', n: int = 20,
+            now_ms: Optional[int] = None) -> List[Tuple[int, float, int]]:
+        """
+        Top-n (item_id, score, events in window) of a window, best first
+        """
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown window '{window}', expected one of {tuple(WINDOWS)}")
+        self._advance(int(time.time() * 1000) if now_ms is None else int(now_ms))
+
+        items = np.fromiter(self.candidates[window].counts, dtype=np.int64)
+        if len(items) == 0:
+            return []
+        scores, events = self.estimate(window, items)
+        best = top_k(scores, n)
+        best = best[scores[best] > 0]
+        return [(int(items[pos]), float(scores[pos]), int(round(events[pos]))) for pos in best]
+
+    def error_bound(self, window: str) -> Dict[str, float]:
+        """
+        Largest over-count of a reported score and event count, holding
+        with probability 1 - delta
+        """
+        ring, covered = WINDOWS[window]
+        score = events = 0.0
+        if self.current[ring] is not None:
+            ages = bucket_ages(ring, self.current[ring])
+            score = float(self._age_weights[window][ages] @ self.totals[ring])
+            events = float(self.totals[ring][ages < covered].sum())
+        epsilon = self.sketch.epsilon
+        return {
+            'epsilon': epsilon,
+            'delta': self.sketch.delta,
+            'score': epsilon * score,
+            'views': epsilon * events
+        }
+
+    def merge(self, other: "SketchTrendingEngine") -> "SketchTrendingEngine":
+        """Add another engine's counts (e.g. a restored snapshot's) into this one"""
+        if not self.sketch.compatible(other.sketch):
+            raise ValueError("Trending sketches differ in epsilon, delta or seed")
+        if all(current is None for current in other.current.values()):
+            return self
+        self._advance(max(other.current[name] * RINGS[name][0] for name in RINGS
+                          if other.current[name] is not None))
+
+        for name, (_, buckets) in RINGS.items():
+            if other.current[name] is None:
+                continue
+            # Absolute bucket of each of the other ring's positions
+            absolute = other.current[name] - bucket_ages(name, other.current[name])
+            live = self.current[name] - absolute < buckets
+            positions = absolute[live] % buckets
+            self.rings[name][positions] += other.rings[name][live]
+            self.totals[name][positions] += other.totals[name][live]
+        for window in WINDOWS:
+            self.candidates[window] = self.candidates[window].merge(other.candidates[window])
+        self._rebuild(WINDOWS)
+        return self
+
+    def _advance(self, timestamp_ms: int):
+        """Move the rings forward to the bucket of timestamp_ms"""
+        changed = []
+        for name, (width, buckets) in RINGS.items():
+            bucket = timestamp_ms // width
+            current = self.current[name]
+            if current is None or bucket > current:
+                if current is not None:
+                    expired = (current + 1 + np.arange(min(bucket - current, buckets))) % buckets
+                    self.rings[name][expired] = 0
+                    self.totals[name][expired] = 0
+                self.current[name] = bucket
+                changed.append(name)
+        if changed:
+            self._rebuild([window for window, (ring, _) in WINDOWS.items() if ring in changed])
+
+    def _rebuild(self, windows):
+        """Re-seed candidate lists with their current sketch estimates"""
+        for window in windows:
+            items = np.fromiter(self.candidates[window].counts, dtype=np.int64)
+            if len(items) == 0:
+                continue
+            scores, _ = self.estimate(window, items)
+            present = scores > 0
+            self.candidates[window] = SpaceSaving.from_counts(
+                self.heavy_hitters, dict(zip(items[present].tolist(), scores[present].tolist()))
+            )
+
+    def save(self, filepath: str):
+        """Snapshot the sketches and candidate lists as an artifact directory"""
+        arrays = {}
+        for name in RINGS:
+            arrays[f"{name}_ring"] = self.rings[name]
+            arrays[f"{name}_totals"] = self.totals[name]
+        for window, candidates in self.candidates.items():
+            arrays.update(candidates.arrays(f"candidates_{window}"))
+
+        with artifact_writer(filepath) as staging:
+            names = save_arrays(staging, arrays)
+            params = {
+                'epsilon': self.epsilon,
+                'delta': self.delta,
+                'heavy_hitters': self.heavy_hitters,
+                'half_life_hours': self.half_life_hours,
+                'seed': self.sketch.seed,
+                'current': self.current,
+                'saved_at': int(time.time() * 1000)
+            }
+            write_manifest(staging, self.ARTIFACT_FORMAT, params, names)
+
+        logger.info(f"Trending sketch snapshot ({len(self)} candidates) saved to {filepath}")
+
+    @classmethod
+    def load(cls, filepath: str) -> "SketchTrendingEngine":
+        """Restore a snapshot written by save()"""
+        manifest = read_manifest(filepath, cls.ARTIFACT_FORMAT)
+        arrays = load_arrays(filepath, manifest['arrays'], mmap_mode=None)
+        params = manifest['params']
+
+        engine = cls(params['epsilon'], params['delta'], params['heavy_hitters'],
+                     params['half_life_hours'], params['seed'])
+        for name in RINGS:
+            engine.rings[name] = arrays[f"{name}_ring"]
+            engine.totals[name] = arrays[f"{name}_totals"]
+        engine.current = {name: params['current'].get(name) for name in RINGS}
+        engine.candidates = {
+            window: SpaceSaving.from_arrays(engine.heavy_hitters, arrays, f"candidates_{window}")
+            for window in WINDOWS
+        }
+        engine.saved_at = params.get('saved_at')
+
+        logger.info(f"Trending sketch snapshot ({len(engine)} candidates) loaded from {filepath}")
+        return engine
+
+TRENDING_MODES = {
+    'exact': TrendingEngine,
+    'sketch': SketchTrendingEngine
+}
+
+def build_trending(config: Dict[str, Any]):
+    """Trending engine for the trending section of config.yaml (mode: exact | sketch)"""
+    mode = config.get('mode', 'exact')
+    if mode not in TRENDING_MODES:
+        raise ValueError(f"Unknown trending mode '{mode}', expected one of {list(TRENDING_MODES)}")
+    return TRENDING_MODES[mode].from_config(config)
+
+def load_trending(path: str):
+    """Restore a snapshot of either engine"""
+    with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+        kind = json.load(f).get('format')
+    for cls in TRENDING_MODES.values():
+        if cls.ARTIFACT_FORMAT == kind:
+            return cls.load(path)
+    raise ValueError(f"{path} is not a trending snapshot")
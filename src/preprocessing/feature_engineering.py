@@ -3,6 +3,8 @@ import numpy as np
 from typing import List, Dict
 import logging
 
+from src.preprocessing.feature_store import RunningAggregates, group_moments, sample_std, to_epoch
+
 logger = logging.getLogger(__name__)
 
 class FeatureEngineer:
@@ -17,12 +19,7 @@ class FeatureEngineer:
         """
         logger.info("Creating user features...")
         
-        user_features = ratings_df.groupby('user_id').agg({
-            'rating': ['count', 'mean', 'std'],
-            'item_id': 'nunique',
-            'timestamp': ['min', 'max']
-        }).reset_index()
-        
+        user_features = FeatureEngineer._rating_stats(ratings_df, 'user_id', 'item_id')
         user_features.columns = ['user_id', 'rating_count', 'avg_rating', 
                                 'rating_std', 'unique_items', 'first_rating', 'last_rating']
         
@@ -48,11 +45,8 @@ class FeatureEngineer:
         logger.info("Creating item features...")
         
         # Rating statistics
-        item_stats = ratings_df.groupby('item_id').agg({
-            'rating': ['count', 'mean', 'std'],
-            'user_id': 'nunique'
-        }).reset_index()
-        
+        item_stats = FeatureEngineer._rating_stats(ratings_df, 'item_id', 'user_id')
+        item_stats = item_stats.drop(columns=['first_rating', 'last_rating'])
         item_stats.columns = ['item_id', 'rating_count', 'avg_rating', 
                              'rating_std', 'unique_users']
         
@@ -83,25 +77,50 @@ class FeatureEngineer:
         """
         logger.info("Creating interaction features...")
         
-        interactions = ratings_df.copy()
+        # New columns go on a shallow copy: the ratings data is not copied
+        interactions = ratings_df.copy(deep=False)
         
         # Time-based features
-        interactions['hour'] = interactions['timestamp'].dt.hour
-        interactions['day_of_week'] = interactions['timestamp'].dt.dayofweek
-        interactions['is_weekend'] = interactions['day_of_week'].isin([5, 6]).astype(int)
+        timestamps = interactions['timestamp'].dt
+        interactions['hour'] = timestamps.hour
+        interactions['day_of_week'] = timestamps.dayofweek
+        interactions['is_weekend'] = (interactions['day_of_week'] >= 5).astype(int)
         
         # Rating recency
         interactions['days_since_rating'] = (
             interactions['timestamp'].max() - interactions['timestamp']
         ).dt.days
         
-        # Normalized rating (z-score per user)
-        user_means = interactions.groupby('user_id')['rating'].transform('mean')
-        user_stds = interactions.groupby('user_id')['rating'].transform('std')
+        # Normalized rating (z-score per user), mean and std from one grouping
+        ratings = interactions['rating'].to_numpy(dtype=np.float64)
+        users, inverse = np.unique(interactions['user_id'].to_numpy(), return_inverse=True)
+        count, mean, m2 = group_moments(inverse, ratings, len(users))
         interactions['rating_normalized'] = (
-            (interactions['rating'] - user_means) / (user_stds + 1e-8)
+            (ratings - mean[inverse]) / (sample_std(count, m2)[inverse] + 1e-8)
         )
         
         logger.info(f"Created interaction features for {len(interactions)} interactions")
         
-        return interactions
\ No newline at end of file
+        return interactions
+    
+    @staticmethod
+    def _rating_stats(ratings_df: pd.DataFrame, key: str, other: str) -> pd.DataFrame:
+        """
+        Per-key count, mean, std, distinct other keys and first/last
+        timestamp, sorted by key, in one pass over the columns
+        """
+        keys = ratings_df[key].to_numpy()
+        stats = RunningAggregates()
+        stats.update(keys, ratings_df['rating'].to_numpy(),
+                     to_epoch(ratings_df['timestamp'], 'ns'))
+        frame = stats.frame(key, unit='ns')
+        
+        # Distinct (key, other) pairs per key
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        others = ratings_df[other].to_numpy()
+        order = np.lexsort((others, inverse))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (np.diff(inverse[order]) != 0) | (np.diff(others[order]) != 0)
+        frame.insert(4, f"unique_{other.replace('_id', '')}s",
+                     np.bincount(inverse[order][first], minlength=len(unique_keys)))
+        return frame
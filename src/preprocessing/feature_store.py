@@ -0,0 +1,269 @@
+import time
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, Optional, Tuple
+import logging
+
+from src.utils.artifacts import artifact_writer, load_arrays, read_manifest, save_arrays, write_manifest
+from src.utils.data_loader import IdCodebook
+
+logger = logging.getLogger(__name__)
+
+def group_moments(inverse: np.ndarray, values: np.ndarray,
+                  n_groups: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (count, mean, M2) of values per group, inverse giving each value's group
+
+    M2 is the sum of squared deviations from the group mean; variance is
+    M2 / (count - ddof). Empty groups get count 0 and mean NaN.
+    """
+    count = np.bincount(inverse, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(inverse, weights=values, minlength=n_groups) / count
+    m2 = np.bincount(inverse, weights=(values - mean[inverse]) ** 2, minlength=n_groups)
+    return count, mean, m2
+
+def sample_std(count: np.ndarray, m2: np.ndarray, ddof: int = 1) -> np.ndarray:
+    """Standard deviation from (count, M2), NaN with fewer than ddof + 1 values"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count > ddof, np.sqrt(m2 / (count - ddof)), np.nan)
+
+def to_epoch(timestamps: pd.Series, unit: str = 'ms') -> np.ndarray:
+    """datetime64 column as int64 time since the epoch in unit"""
+    return timestamps.to_numpy().astype(f'datetime64[{unit}]').astype(np.int64)
+
+class RunningAggregates:
+    """
+    Running per-key rating statistics in dense arrays
+
+    Keys (user or item ids) get dense codes from an IdCodebook; seeding it
+    with a model's id array (from_ids) makes code == model row. For each
+    code the table keeps count, mean and M2 of the ratings plus the first
+    and last timestamp (int64, in the caller's unit). update() folds a
+    batch in with Chan's parallel form of Welford's algorithm, so it costs
+    O(batch) however long the history is; merge() combines two tables the
+    same way.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.codebook = IdCodebook()
+        capacity = max(1, int(capacity))
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros(capacity)
+        self.m2 = np.zeros(capacity)
+        self.first_ts = np.full(capacity, np.iinfo(np.int64).max, dtype=np.int64)
+        self.last_ts = np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64)
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int]) -> "RunningAggregates":
+        """Empty table whose codes follow the order of ids"""
+        ids = np.asarray(ids if isinstance(ids, np.ndarray) else list(ids), dtype=np.int64)
+        table = cls(capacity=len(ids))
+        table.codebook.encode(ids)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.codebook)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.codebook.ids
+
+    def _reserve(self, size: int):
+        capacity = len(self.count)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, fill in (('count', 0), ('mean', 0.0), ('m2', 0.0),
+                           ('first_ts', np.iinfo(np.int64).max), ('last_ts', np.iinfo(np.int64).min)):
+            old = getattr(self, name)
+            grown = np.full(capacity, fill, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def update(self, keys: np.ndarray, values: np.ndarray, timestamps: np.ndarray):
+        """Fold a batch of (key, rating, timestamp) observations in"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) == 0:
+            return
+        codes = self.codebook.encode(keys)
+        size = len(self.codebook)
+        self._reserve(size)
+        values = np.asarray(values, dtype=np.float64)
+        if len(codes) * 4 >= size:
+            # Codes are dense already: group over all of them, keep the ones hit
+            count, mean, m2 = group_moments(codes, values, size)
+            unique = np.flatnonzero(count)
+            count, mean, m2 = count[unique], mean[unique], m2[unique]
+        else:
+            unique, inverse = np.unique(codes, return_inverse=True)
+            count, mean, m2 = group_moments(inverse, values, len(unique))
+        self._merge_moments(unique, count, mean, m2)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        np.minimum.at(self.first_ts, codes, timestamps)
+        np.maximum.at(self.last_ts, codes, timestamps)
+
+    def _merge_moments(self, codes: np.ndarray, count: np.ndarray, mean: np.ndarray, m2: np.ndarray):
+        """Chan et al. pairwise update of (count, mean, M2) at codes"""
+        old_count = self.count[codes]
+        total = old_count + count
+        delta = mean - self.mean[codes]
+        self.mean[codes] += delta * count / total
+        self.m2[codes] += m2 + delta ** 2 * old_count * count / total
+        self.count[codes] = total
+
+    def merge(self, other: "RunningAggregates") -> "RunningAggregates":
+        """Add another table's statistics (e.g. of another partition) into this one"""
+        n = len(other)
+        if n == 0:
+            return self
+        codes = self.codebook.encode(other.ids)
+        self._reserve(len(self.codebook))
+        present = other.count[:n] > 0
+        self._merge_moments(codes[present], other.count[:n][present], other.mean[:n][present],
+                            other.m2[:n][present])
+        np.minimum.at(self.first_ts, codes, other.first_ts[:n])
+        np.maximum.at(self.last_ts, codes, other.last_ts[:n])
+        return self
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        """Standard deviation per code, NaN with fewer than ddof + 1 observations"""
+        return sample_std(self.count[:len(self)], self.m2[:len(self)], ddof)
+
+    def lookup(self, keys: Iterable[int]) -> np.ndarray:
+        """Codes of keys, -1 for keys never seen"""
+        return self.codebook.lookup(keys if isinstance(keys, np.ndarray) else list(keys))
+
+    def frame(self, key_name: str, unit: str = 'ms') -> pd.DataFrame:
+        """
+        Statistics of every key with observations, sorted by key, in the
+        column layout of FeatureEngineer
+        """
+        n = len(self)
+        _, positions = self.codebook.sorted_order()
+        codes = np.empty(n, dtype=np.int64)
+        codes[positions] = np.arange(n)
+        codes = codes[self.count[codes] > 0]
+        return pd.DataFrame({
+            key_name: self.ids[codes],
+            'rating_count': self.count[codes],
+            'avg_rating': self.mean[codes],
+            'rating_std': self.std()[codes],
+            'first_rating': pd.to_datetime(self.first_ts[codes], unit=unit),
+            'last_rating': pd.to_datetime(self.last_ts[codes], unit=unit)
+        })
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        n = len(self)
+        return {
+            f"{prefix}_ids": self.ids,
+            f"{prefix}_count": self.count[:n],
+            f"{prefix}_mean": self.mean[:n],
+            f"{prefix}_m2": self.m2[:n],
+            f"{prefix}_first_ts": self.first_ts[:n],
+            f"{prefix}_last_ts": self.last_ts[:n]
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], prefix: str) -> "RunningAggregates":
+        table = cls.from_ids(arrays[f"{prefix}_ids"])
+        for name in ('count', 'mean', 'm2', 'first_ts', 'last_ts'):
+            getattr(table, name)[:len(table)] = arrays[f"{prefix}_{name}"]
+        return table
+
+class IncrementalFeatureStore:
+    """
+    Always-current user and item rating features
+
+    Holds one RunningAggregates table for users and one for items,
+    updated from each new batch of interactions (timestamps in epoch ms)
+    instead of re-aggregating the full history. Seed it from a model
+    (from_model) so codes match the model's user/item rows, or rebuild it
+    from a ratings DataFrame (from_ratings) for nightly jobs; tables of
+    partitions can be merged.
+    """
+
+    ARTIFACT_FORMAT = "feature_store"
+
+    def __init__(self, user_ids: Optional[Iterable[int]] = None, item_ids: Optional[Iterable[int]] = None):
+        self.users = RunningAggregates.from_ids(user_ids if user_ids is not None else [])
+        self.items = RunningAggregates.from_ids(item_ids if item_ids is not None else [])
+        # Epoch ms of the snapshot this store was restored from
+        self.saved_at: Optional[int] = None
+
+    @classmethod
+    def from_model(cls, model) -> "IncrementalFeatureStore":
+        """Store indexed like a fitted CollaborativeFiltering model"""
+        index = model.user_index
+        user_ids = np.empty(len(index.sorted_ids), dtype=np.int64)
+        user_ids[index.order] = index.sorted_ids
+        return cls(user_ids, model.item_ids)
+
+    @classmethod
+    def from_ratings(cls, ratings_df: pd.DataFrame) -> "IncrementalFeatureStore":
+        """Full rebuild from a ratings DataFrame, without copying it"""
+        store = cls()
+        store.update(ratings_df['user_id'].to_numpy(), ratings_df['item_id'].to_numpy(),
+                     ratings_df['rating'].to_numpy(), to_epoch(ratings_df['timestamp']))
+        return store
+
+    def update(self, user_ids: np.ndarray, item_ids: np.ndarray, ratings: np.ndarray,
+               timestamps: np.ndarray):
+        """Fold in a batch of interactions"""
+        self.users.update(user_ids, ratings, timestamps)
+        self.items.update(item_ids, ratings, timestamps)
+
+    def update_records(self, records: np.ndarray):
+        """Fold in records read from an InteractionStore"""
+        self.update(records['user_id'], records['item_id'], records['rating'], records['timestamp'])
+
+    def extends(self, other: "IncrementalFeatureStore") -> bool:
+        """Whether this store's codes start with other's (e.g. a store seeded from a model)"""
+        return all(
+            len(mine) >= len(theirs) and np.array_equal(mine.ids[:len(theirs)], theirs.ids)
+            for mine, theirs in ((self.users, other.users), (self.items, other.items))
+        )
+    
+    def merge(self, other: "IncrementalFeatureStore") -> "IncrementalFeatureStore":
+        self.users.merge(other.users)
+        self.items.merge(other.items)
+        return self
+
+    def user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Statistics of one user, None if the user has no interactions"""
+        code = int(self.users.lookup([user_id])[0])
+        if code < 0 or self.users.count[code] == 0:
+            return None
+        return {
+            'rating_count': int(self.users.count[code]),
+            'avg_rating': float(self.users.mean[code]),
+            'first_rating': int(self.users.first_ts[code]),
+            'last_rating': int(self.users.last_ts[code])
+        }
+
+    def user_features(self) -> pd.DataFrame:
+        return self.users.frame('user_id')
+
+    def item_features(self) -> pd.DataFrame:
+        return self.items.frame('item_id')
+
+    def save(self, filepath: str):
+        """Write both tables as an artifact directory"""
+        arrays = self.users.arrays('users')
+        arrays.update(self.items.arrays('items'))
+        with artifact_writer(filepath) as staging:
+            names = save_arrays(staging, arrays)
+            write_manifest(staging, self.ARTIFACT_FORMAT, {'saved_at': int(time.time() * 1000)}, names)
+
+        logger.info(f"Features of {len(self.users)} users and {len(self.items)} items saved to {filepath}")
+
+    @classmethod
+    def load(cls, filepath: str) -> "IncrementalFeatureStore":
+        manifest = read_manifest(filepath, cls.ARTIFACT_FORMAT)
+        arrays = load_arrays(filepath, manifest['arrays'], mmap_mode=None)
+        store = cls()
+        store.users = RunningAggregates.from_arrays(arrays, 'users')
+        store.items = RunningAggregates.from_arrays(arrays, 'items')
+        store.saved_at = manifest['params'].get('saved_at')
+        return store
@@ -0,0 +1,275 @@
+import os
+import json
+import shutil
+import uuid
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple, List
+
+ARTIFACT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+@contextmanager
+def artifact_writer(path: str) -> Iterator[str]:
+    """
+    Write a model artifact directory atomically
+
+    Yields a staging directory next to path; on success it replaces path
+    with two renames, so readers never see a half-written artifact.
+    """
+    path = os.path.abspath(path)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+
+    staging = os.path.join(parent, f".{os.path.basename(path)}.tmp-{uuid.uuid4().hex[:8]}")
+    os.makedirs(staging)
+    try:
+        yield staging
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    backup = None
+    if os.path.exists(path):
+        backup = os.path.join(parent, f".{os.path.basename(path)}.old-{uuid.uuid4().hex[:8]}")
+        os.rename(path, backup)
+    os.rename(staging, path)
+    if backup is not None:
+        if os.path.isdir(backup):
+            shutil.rmtree(backup, ignore_errors=True)
+        else:
+            os.remove(backup)
+
+def write_manifest(path: str, kind: str, params: Dict[str, Any], arrays: Iterable[str]):
+    """Write the manifest describing an artifact directory"""
+    manifest = {
+        'format': kind,
+        'version': ARTIFACT_VERSION,
+        'arrays': sorted(arrays),
+        'params': params
+    }
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+def read_manifest(path: str, kind: str) -> Dict[str, Any]:
+    """Read and validate an artifact manifest"""
+    with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != kind:
+        raise ValueError(f"{path} is a '{manifest.get('format')}' artifact, expected '{kind}'")
+    if manifest.get('version', 0) > ARTIFACT_VERSION:
+        raise ValueError(f"{path} has artifact version {manifest['version']}, "
+                         f"this code reads up to {ARTIFACT_VERSION}")
+    return manifest
+
+def save_arrays(path: str, arrays: Dict[str, np.ndarray]) -> List[str]:
+    """Save arrays as raw .npy files, returns the names written"""
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+    return list(arrays)
+
+def load_arrays(path: str, names: Iterable[str], mmap_mode: Optional[str] = 'r') -> Dict[str, np.ndarray]:
+    """Open .npy arrays, memory-mapped read-only by default"""
+    return {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in names
+    }
+
+def is_artifact(path: str) -> bool:
+    """Whether path is an artifact directory (as opposed to a legacy pickle)"""
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+class IdIndex:
+    """
+    Read-only id -> position mapping backed by sorted arrays
+
+    Behaves like the dict it replaces (in, [], get, len) but can be
+    memory-mapped and shared between processes; lookup() maps a whole
+    array of ids at once.
+    """
+
+    def __init__(self, sorted_ids: np.ndarray, order: np.ndarray):
+        self.sorted_ids = sorted_ids
+        self.order = order
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int]) -> "IdIndex":
+        """Index ids by their position in the sequence"""
+        ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        return cls(ids[order], order)
+
+    def lookup(self, ids: Iterable[int]) -> np.ndarray:
+        """Positions of ids, -1 where an id is unknown"""
+        ids = np.asarray(ids if isinstance(ids, np.ndarray) else list(ids), dtype=np.int64)
+        if len(self.sorted_ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+
+        slots = np.searchsorted(self.sorted_ids, ids)
+        slots = np.minimum(slots, len(self.sorted_ids) - 1)
+        found = self.sorted_ids[slots] == ids
+        return np.where(found, self.order[slots], -1).astype(np.int64)
+
+    def get(self, item_id, default=None):
+        if len(self.sorted_ids) == 0:
+            return default
+        try:
+            slot = int(np.searchsorted(self.sorted_ids, item_id))
+        except (TypeError, ValueError):
+            return default
+        if slot < len(self.sorted_ids) and self.sorted_ids[slot] == item_id:
+            return int(self.order[slot])
+        return default
+
+    def __getitem__(self, item_id) -> int:
+        position = self.get(item_id)
+        if position is None:
+            raise KeyError(item_id)
+        return position
+
+    def __contains__(self, item_id) -> bool:
+        return self.get(item_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.sorted_ids)
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """Arrays to persist under the given name prefix"""
+        return {f"{prefix}_sorted": self.sorted_ids, f"{prefix}_order": self.order}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], prefix: str) -> "IdIndex":
+        return cls(arrays[f"{prefix}_sorted"], arrays[f"{prefix}_order"])
+
+class TextColumn:
+    """
+    Strings stored as one UTF-8 buffer plus row offsets (n + 1), so each
+    row costs its own length instead of the longest string's
+    """
+    
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+    
+    @classmethod
+    def from_strings(cls, values: Iterable[str]) -> "TextColumn":
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    
+    def __getitem__(self, position: int) -> str:
+        return self.data[self.offsets[position]:self.offsets[position + 1]].tobytes().decode('utf-8')
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.data.nbytes
+    
+    def arrays(self, key: str) -> Dict[str, np.ndarray]:
+        return {f"{key}_offsets": self.offsets, f"{key}_text": self.data}
+
+class MetadataTable:
+    """
+    Columnar item metadata keyed by item id
+
+    Replaces a dict of per-item dicts: each field is one column so it can
+    be saved as .npy and memory-mapped. Text fields are TextColumns
+    (missing text reads as ''); other fields are typed NumPy arrays with
+    a presence mask when some records lack them, and get() returns None
+    for those entries. get() returns a plain dict like the old mapping.
+    """
+
+    def __init__(self, index: IdIndex, columns: Dict[str, Any],
+                 masks: Optional[Dict[str, np.ndarray]] = None):
+        self.index = index
+        self.columns = columns
+        self.masks = masks or {}
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]], id_field: str = 'item_id') -> "MetadataTable":
+        index = IdIndex.from_ids([record[id_field] for record in records])
+
+        names = []
+        for record in records:
+            names.extend(key for key in record if key not in names)
+
+        columns, masks = {}, {}
+        for name in names:
+            values = [record.get(name) for record in records]
+            present = [value for value in values if value is not None]
+            if present and not all(isinstance(value, str) for value in present):
+                try:
+                    typed = np.array(present)
+                except ValueError:  # ragged sequences
+                    typed = np.empty(0, dtype=object)
+                if typed.ndim == 1 and typed.dtype.kind in 'biuf':
+                    mask = np.array([value is not None for value in values])
+                    column = np.zeros(len(values), dtype=typed.dtype)
+                    column[mask] = typed
+                    columns[name] = column
+                    if not mask.all():
+                        masks[name] = mask
+                    continue
+            columns[name] = TextColumn.from_strings('' if value is None else str(value)
+                                                    for value in values)
+        return cls(index, columns, masks)
+
+    def get(self, item_id, default=None) -> Optional[Dict[str, Any]]:
+        position = self.index.get(item_id)
+        if position is None:
+            return default
+        record = {}
+        for name, column in self.columns.items():
+            mask = self.masks.get(name)
+            if mask is not None and not mask[position]:
+                record[name] = None
+            elif isinstance(column, TextColumn):
+                record[name] = column[position]
+            else:
+                record[name] = column[position].item()
+        return record
+
+    def __getitem__(self, item_id) -> Dict[str, Any]:
+        record = self.get(item_id)
+        if record is None:
+            raise KeyError(item_id)
+        return record
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def arrays(self, prefix: str = "meta") -> Tuple[Dict[str, np.ndarray], List[str]]:
+        """Arrays to persist plus the column names (kept in the manifest)"""
+        arrays = self.index.arrays(f"{prefix}_index")
+        for name, column in self.columns.items():
+            key = f"{prefix}_{name}"
+            if isinstance(column, TextColumn):
+                arrays.update(column.arrays(key))
+            else:
+                arrays[key] = column
+            if name in self.masks:
+                arrays[f"{key}_mask"] = self.masks[name]
+        return arrays, list(self.columns)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], column_names: List[str],
+                    prefix: str = "meta") -> "MetadataTable":
+        """Also reads artifacts whose text columns are fixed-width string arrays"""
+        index = IdIndex.from_arrays(arrays, f"{prefix}_index")
+        columns, masks = {}, {}
+        for name in column_names:
+            key = f"{prefix}_{name}"
+            if f"{key}_offsets" in arrays:
+                columns[name] = TextColumn(arrays[f"{key}_offsets"], arrays[f"{key}_text"])
+            else:
+                columns[name] = arrays[key]
+            if f"{key}_mask" in arrays:
+                masks[name] = arrays[f"{key}_mask"]
+        return cls(index, columns, masks)
@@ -0,0 +1,54 @@
+import numpy as np
+from typing import Iterable, List, Optional, Tuple
+
+# Set bits per byte value, for NumPy versions without np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """
+    Number of set bits per row of a (..., n_words) uint64 bitset array
+    """
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    as_bytes = words.view(np.uint8).reshape(words.shape[:-1] + (-1,))
+    return _BYTE_POPCOUNT[as_bytes].sum(axis=-1, dtype=np.int64)
+
+def encode_sets(token_sets: Iterable[Iterable[str]],
+                vocabulary: Optional[List[str]] = None) -> Tuple[np.ndarray, List[str]]:
+    """
+    Encode token sets as rows of uint64 bitsets
+
+    Returns (bits, vocabulary) where bit j of row i is set when
+    vocabulary[j] is in the i-th set. Tokens missing from a given
+    vocabulary are ignored.
+    """
+    token_sets = [set(tokens) for tokens in token_sets]
+    if vocabulary is None:
+        vocabulary = sorted(set().union(*token_sets)) if token_sets else []
+    positions = {token: bit for bit, token in enumerate(vocabulary)}
+
+    n_words = max(1, (len(vocabulary) + 63) // 64)
+    bits = np.zeros((len(token_sets), n_words), dtype=np.uint64)
+    for row, tokens in enumerate(token_sets):
+        for token in tokens:
+            bit = positions.get(token)
+            if bit is not None:
+                bits[row, bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+    return bits, vocabulary
+
+def jaccard_distance(bits: np.ndarray, other: np.ndarray, empty: float = 0.5,
+                     counts: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Jaccard distance of each bitset row to one bitset
+
+    Pairs where either set is empty get the value of empty. counts can
+    pass popcount(bits) when it is reused across calls.
+    """
+    if counts is None:
+        counts = popcount(bits)
+    other_count = popcount(other[np.newaxis])[0]
+    intersection = popcount(bits & other)
+    union = counts + other_count - intersection
+    distance = 1.0 - intersection / np.maximum(union, 1)
+    return np.where((counts > 0) & (other_count > 0), distance, empty)
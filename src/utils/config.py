@@ -0,0 +1,30 @@
+import os
+import yaml
+from typing import Dict, Any, Optional
+from functools import lru_cache
+
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "config", "config.yaml"
+)
+
+@lru_cache(maxsize=None)
+def _load_yaml(path: str) -> Dict[str, Any]:
+    with open(path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+def load_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load application config (cached per path)
+
+    Path resolution: explicit argument, then CONFIG_PATH env var, then config/config.yaml
+    """
+    path = path or os.getenv("CONFIG_PATH", DEFAULT_CONFIG_PATH)
+    return _load_yaml(os.path.abspath(path))
+
+def get_section(*keys: str, path: Optional[str] = None) -> Dict[str, Any]:
+    """Get a nested config section, e.g. get_section('models', 'hybrid')"""
+    section = load_config(path)
+    for key in keys:
+        section = (section or {}).get(key, {})
+    return dict(section or {})
@@ -1,11 +1,167 @@
+import os
 import pandas as pd
 import numpy as np
-from scipy.sparse import csr_matrix
-from typing import Tuple, List, Dict
+from scipy.sparse import coo_matrix, csr_matrix
+from typing import Tuple, List, Dict, Iterator, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Column names accepted for each ratings field (ours, then MovieLens)
+RATING_COLUMNS = {
+    'user_id': ('user_id', 'userId'),
+    'item_id': ('item_id', 'movieId', 'itemId'),
+    'rating': ('rating',)
+}
+
+class IdCodebook:
+    """
+    Growing raw id -> dense code mapping
+    
+    Codes are handed out in first-seen order; encode() is vectorized
+    (np.unique + searchsorted against the sorted known ids), so a chunk
+    costs O(chunk log chunk) plus the index upkeep instead of a Python
+    dict lookup per row.
+    
+    ids live in a capacity-doubling buffer. New ids go to a small sorted
+    delta index that is merged into the main one once it holds about
+    sqrt(len) ids, so adding one id costs O(sqrt(len)) amortized rather
+    than copying every known id.
+    """
+    
+    def __init__(self):
+        self._ids = np.empty(16, dtype=np.int64)
+        self._size = 0
+        self._sorted_ids = np.empty(0, dtype=np.int64)
+        self._sorted_codes = np.empty(0, dtype=np.int64)
+        self._delta_ids = np.empty(0, dtype=np.int64)
+        self._delta_codes = np.empty(0, dtype=np.int64)
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def ids(self) -> np.ndarray:
+        """Known ids in code order"""
+        return self._ids[:self._size]
+    
+    def encode(self, ids: np.ndarray) -> np.ndarray:
+        """Codes of ids, adding the ones not seen before"""
+        unique, first, inverse = np.unique(np.asarray(ids, dtype=np.int64),
+                                           return_index=True, return_inverse=True)
+        codes = self.lookup(unique)
+        new = codes < 0
+        if new.any():
+            # New ids are numbered in order of first occurrence in the batch
+            added = np.flatnonzero(new)
+            added = added[np.argsort(first[added], kind='stable')]
+            codes[added] = np.arange(self._size, self._size + len(added))
+            self._append(unique[added])
+            
+            slots = np.searchsorted(self._delta_ids, unique[new])
+            self._delta_ids = np.insert(self._delta_ids, slots, unique[new])
+            self._delta_codes = np.insert(self._delta_codes, slots, codes[new])
+            if len(self._delta_ids) > max(1024, int(np.sqrt(self._size))):
+                self._compact()
+        return codes[inverse]
+    
+    def _append(self, ids: np.ndarray):
+        size = self._size + len(ids)
+        if size > len(self._ids):
+            capacity = len(self._ids)
+            while capacity < size:
+                capacity *= 2
+            grown = np.empty(capacity, dtype=np.int64)
+            grown[:self._size] = self._ids[:self._size]
+            self._ids = grown
+        self._ids[self._size:size] = ids
+        self._size = size
+    
+    def _compact(self):
+        """Merge the delta index into the main sorted index"""
+        if len(self._delta_ids) == 0:
+            return
+        slots = np.searchsorted(self._sorted_ids, self._delta_ids)
+        self._sorted_ids = np.insert(self._sorted_ids, slots, self._delta_ids)
+        self._sorted_codes = np.insert(self._sorted_codes, slots, self._delta_codes)
+        self._delta_ids = np.empty(0, dtype=np.int64)
+        self._delta_codes = np.empty(0, dtype=np.int64)
+    
+    @staticmethod
+    def _search(sorted_ids: np.ndarray, sorted_codes: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        if len(sorted_ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[slots] == ids, sorted_codes[slots], -1)
+    
+    def lookup(self, ids: np.ndarray) -> np.ndarray:
+        """Codes of ids without adding any, -1 for unknown ids"""
+        ids = np.asarray(ids, dtype=np.int64)
+        codes = self._search(self._sorted_ids, self._sorted_codes, ids)
+        missing = codes < 0
+        if len(self._delta_ids) and missing.any():
+            codes[missing] = self._search(self._delta_ids, self._delta_codes, ids[missing])
+        return codes
+    
+    def sorted_order(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids in ascending order, code -> position in that order)"""
+        self._compact()
+        positions = np.empty(self._size, dtype=np.int64)
+        positions[self._sorted_codes] = np.arange(self._size)
+        return self._sorted_ids, positions
+
+class RatingsMatrixBuilder:
+    """
+    Incremental user-item matrix construction
+    
+    add() encodes a chunk of (user, item, rating) columns and appends
+    them to growable COO buffers (int32 row/col, float32 data, 12 bytes
+    per rating); build() finalizes to CSR with rows and columns ordered
+    by ascending id, like create_user_item_matrix.
+    """
+    
+    def __init__(self, capacity: int = 1 << 20):
+        self.users = IdCodebook()
+        self.items = IdCodebook()
+        self.nnz = 0
+        self._rows = np.empty(capacity, dtype=np.int32)
+        self._cols = np.empty(capacity, dtype=np.int32)
+        self._data = np.empty(capacity, dtype=np.float32)
+    
+    def add(self, user_ids: np.ndarray, item_ids: np.ndarray, ratings: np.ndarray):
+        count = len(user_ids)
+        self._reserve(self.nnz + count)
+        end = self.nnz + count
+        self._rows[self.nnz:end] = self.users.encode(user_ids)
+        self._cols[self.nnz:end] = self.items.encode(item_ids)
+        self._data[self.nnz:end] = ratings
+        self.nnz = end
+    
+    def _reserve(self, size: int):
+        if size <= len(self._rows):
+            return
+        capacity = max(len(self._rows), 1)
+        while capacity < size:
+            capacity *= 2
+        for name in ('_rows', '_cols', '_data'):
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype)
+            grown[:self.nnz] = old[:self.nnz]
+            setattr(self, name, grown)
+    
+    def build(self) -> Tuple[csr_matrix, List[int], List[int]]:
+        """CSR matrix (duplicate ratings summed) plus its user and item ids"""
+        user_ids, user_positions = self.users.sorted_order()
+        item_ids, item_positions = self.items.sorted_order()
+        rows, cols, data = self._rows[:self.nnz], self._cols[:self.nnz], self._data[:self.nnz]
+        rows[:] = user_positions[rows]
+        cols[:] = item_positions[cols]
+        
+        matrix = coo_matrix((data, (rows, cols)), shape=(len(user_ids), len(item_ids))).tocsr()
+        self._rows = self._cols = self._data = np.empty(0)
+        self.nnz = 0
+        return matrix, user_ids.tolist(), item_ids.tolist()
+
 class DataLoader:
     """
     Load and preprocess data for recommendation system
@@ -59,24 +215,71 @@ class DataLoader:
         """
         Create sparse user-item matrix
         """
-        # Get unique users and items
-        user_ids = sorted(ratings_df['user_id'].unique())
-        item_ids = sorted(ratings_df['item_id'].unique())
-        
-        # Create mappings
-        user_map = {uid: idx for idx, uid in enumerate(user_ids)}
-        item_map = {iid: idx for idx, iid in enumerate(item_ids)}
-        
-        # Create matrix
-        rows = ratings_df['user_id'].map(user_map)
-        cols = ratings_df['item_id'].map(item_map)
-        data = ratings_df['rating'].values
+        # Sorted unique ids and each row's position among them
+        user_ids, rows = np.unique(ratings_df['user_id'].to_numpy(), return_inverse=True)
+        item_ids, cols = np.unique(ratings_df['item_id'].to_numpy(), return_inverse=True)
+        data = ratings_df['rating'].to_numpy()
         
         matrix = csr_matrix((data, (rows, cols)), 
                            shape=(len(user_ids), len(item_ids)))
         
         logger.info(f"Created matrix: {matrix.shape}, Sparsity: {1 - matrix.nnz / (matrix.shape[0] * matrix.shape[1]):.4f}")
         
+        return matrix, user_ids.tolist(), item_ids.tolist()
+    
+    @staticmethod
+    def iter_ratings(path: str, chunksize: int = 1_000_000) -> Iterator[pd.DataFrame]:
+        """
+        Stream a ratings file as DataFrames of at most chunksize rows
+        
+        Reads CSV or Parquet (by extension) with our column names or
+        MovieLens ones (userId, movieId); chunks carry user_id, item_id
+        and rating only. Parquet needs pyarrow.
+        """
+        parquet = os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+        if parquet:
+            try:
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Reading Parquet ratings requires pyarrow") from e
+            source = pq.ParquetFile(path)
+            header = source.schema_arrow.names
+        else:
+            header = pd.read_csv(path, nrows=0).columns.tolist()
+        
+        columns = {}
+        for field, aliases in RATING_COLUMNS.items():
+            name = next((alias for alias in aliases if alias in header), None)
+            if name is None:
+                raise ValueError(f"{path} has no {field} column (expected one of {aliases})")
+            columns[name] = field
+        
+        if parquet:
+            for batch in source.iter_batches(batch_size=chunksize, columns=list(columns)):
+                yield batch.to_pandas().rename(columns=columns)
+        else:
+            dtypes = {name: np.float32 if field == 'rating' else np.int64
+                      for name, field in columns.items()}
+            for chunk in pd.read_csv(path, usecols=list(columns), dtype=dtypes, chunksize=chunksize):
+                yield chunk.rename(columns=columns)
+    
+    @staticmethod
+    def load_ratings_matrix(path: str, chunksize: int = 1_000_000) -> Tuple[csr_matrix, List[int], List[int]]:
+        """
+        Build the user-item matrix from a ratings file without loading it
+        as one DataFrame
+        
+        Same result as create_user_item_matrix on the full file (float32
+        ratings); memory is one chunk plus the COO buffers.
+        """
+        builder = RatingsMatrixBuilder()
+        for chunk in DataLoader.iter_ratings(path, chunksize):
+            builder.add(chunk['user_id'].to_numpy(), chunk['item_id'].to_numpy(),
+                        chunk['rating'].to_numpy())
+        matrix, user_ids, item_ids = builder.build()
+        
+        logger.info(f"Loaded {matrix.nnz} ratings from {path}: {matrix.shape}")
+        
         return matrix, user_ids, item_ids
     
     @staticmethod
@@ -0,0 +1,388 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# One interaction on disk: 29 bytes, packed
+RECORD_DTYPE = np.dtype([
+    ('user_id', '<i8'),
+    ('item_id', '<i8'),
+    ('rating', '<f4'),
+    ('type', 'u1'),
+    ('timestamp', '<i8')  # epoch milliseconds
+])
+
+# Per-user entries of the recent-interactions index
+RECENT_DTYPE = np.dtype([
+    ('item_id', '<i8'),
+    ('rating', '<f4'),
+    ('timestamp', '<i8')
+])
+
+# Interaction types accepted by default; anything else is logged as OTHER_TYPE
+INTERACTION_TYPES = ('click', 'view', 'watch', 'like', 'dislike', 'rating', 'purchase', 'share')
+OTHER_TYPE = 'other'
+
+SEGMENT_PATTERN = "segment-{:06d}.bin"
+TYPES_FILE = "types.json"
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+class _Segment:
+    """A segment file plus its record count and timestamp range"""
+
+    def __init__(self, path: str, count: int = 0):
+        self.path = path
+        self.count = count
+        self.min_ts = np.iinfo(np.int64).max
+        self.max_ts = np.iinfo(np.int64).min
+        self._mapped: Optional[np.ndarray] = None
+
+    def records(self) -> np.ndarray:
+        """The segment's records, memory-mapped read-only"""
+        if self.count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        if self._mapped is None or len(self._mapped) != self.count:
+            self._mapped = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', shape=(self.count,))
+        return self._mapped
+
+    def extend_range(self, timestamps: np.ndarray):
+        if len(timestamps):
+            self.min_ts = min(self.min_ts, int(timestamps.min()))
+            self.max_ts = max(self.max_ts, int(timestamps.max()))
+
+class InteractionStore:
+    """
+    Append-only interaction log
+
+    Appends go to a columnar in-memory tail (one NumPy array per field).
+    flush() packs the tail into fixed-width RECORD_DTYPE records and
+    appends them to the current segment file, rotating to a new file
+    every segment_records records; flushed segments are read back through
+    np.memmap. The tail is flushed when full, and the API flushes it
+    periodically and on shutdown.
+
+    Range scans skip segments whose timestamp range misses the window
+    and filter the rest with vectorized masks. Without a path the store
+    keeps flushed records in memory (tests, ephemeral runs). The
+    directory is only created on the first flush.
+
+    Interaction types are stored as uint8 codes; the code table lives in
+    types.json next to the segments. Only interaction_types (plus
+    OTHER_TYPE, which every other type is logged as) get codes, so client
+    input cannot exhaust the 256 codes.
+    
+    Per-user reads (user_interactions, has_activity) are served from an
+    in-memory index of each user's recent_per_user latest interactions,
+    updated by append, so they never scan the log. It holds the
+    recent_users most recently active users (LRU); on open it is filled
+    from the newest segment backwards, stopping once older segments can
+    no longer add to it.
+    """
+
+    def __init__(self, path: Optional[str] = None, segment_records: int = 1 << 20,
+                 tail_records: int = 1 << 16, recent_per_user: int = 256,
+                 recent_users: int = 1_000_000, interaction_types: Optional[List[str]] = None):
+        self.path = path
+        self.segment_records = max(1, int(segment_records))
+        self.tail_records = max(1, int(tail_records))
+        self.recent_per_user = max(1, int(recent_per_user))
+        self.recent_users = max(1, int(recent_users))
+        self.interaction_types = frozenset(interaction_types or INTERACTION_TYPES) | {OTHER_TYPE}
+        if len(self.interaction_types) > np.iinfo(np.uint8).max + 1:
+            raise ValueError("Too many interaction types (max 256)")
+
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._memory: List[np.ndarray] = []  # flushed records when path is None
+        self._memory_ranges: List[Tuple[int, int]] = []
+        self._types: List[str] = []
+        self._type_codes: Dict[str, int] = {}
+        self._types_dirty = False
+        self._tail = {name: np.empty(self.tail_records, dtype=RECORD_DTYPE[name])
+                      for name in RECORD_DTYPE.names}
+        self._tail_count = 0
+        self._flushed = 0
+        # user_id -> RECENT_DTYPE, oldest first; least recently active user first
+        self._recent: "OrderedDict[int, np.ndarray]" = OrderedDict()
+
+        if path is not None and os.path.isdir(path):
+            self._open_existing()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], path: Optional[str] = None) -> "InteractionStore":
+        """
+        Build from the storage section of config.yaml
+        """
+        return cls(
+            path=path if path is not None else config.get('interactions_path'),
+            segment_records=config.get('segment_records', 1 << 20),
+            tail_records=config.get('tail_records', 1 << 16),
+            recent_per_user=config.get('recent_per_user', 256),
+            recent_users=config.get('recent_users', 1_000_000),
+            interaction_types=config.get('interaction_types')
+        )
+
+    def _open_existing(self):
+        types_path = os.path.join(self.path, TYPES_FILE)
+        if os.path.isfile(types_path):
+            with open(types_path) as f:
+                self._types = json.load(f)
+            self._type_codes = {name: code for code, name in enumerate(self._types)}
+
+        for segment_path in sorted(glob.glob(os.path.join(self.path, "segment-*.bin"))):
+            size = os.path.getsize(segment_path)
+            segment = _Segment(segment_path, size // RECORD_DTYPE.itemsize)
+            if size % RECORD_DTYPE.itemsize:
+                # Cut a torn trailing record from a crash, or later appends
+                # would land out of record alignment
+                logger.warning(f"Dropping {size % RECORD_DTYPE.itemsize} bytes of a torn "
+                               f"record at the end of {segment_path}")
+                os.truncate(segment_path, segment.count * RECORD_DTYPE.itemsize)
+            segment.extend_range(segment.records()['timestamp'])
+            self._segments.append(segment)
+            self._flushed += segment.count
+        self._build_index()
+        logger.info(f"Opened interaction log at {self.path}: {self._flushed} records "
+                    f"in {len(self._segments)} segments")
+
+    def _build_index(self):
+        """Fill the recent index from the segments, newest record first"""
+        users = np.empty(0, dtype=np.int64)  # indexed so far, sorted
+        counts = np.empty(0, dtype=np.int64)
+        pieces, ages = [], []
+        seen = 0
+        for segment in reversed(self._segments):
+            if len(users) >= self.recent_users and counts.min() >= self.recent_per_user:
+                break  # older records could only belong to users that do not fit
+            records = segment.records()[::-1]
+            order = np.argsort(records['user_id'], kind='stable')
+            sorted_users = records['user_id'][order]
+            starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+            group_users = sorted_users[starts]
+            sizes = np.diff(np.r_[starts, len(order)])
+            
+            slots = np.searchsorted(users, group_users)
+            known = slots < len(users)
+            known[known] = users[slots[known]] == group_users[known]
+            prior = np.zeros(len(group_users), dtype=np.int64)
+            prior[known] = counts[slots[known]]
+            take = np.minimum(self.recent_per_user - prior, sizes)
+            # New users are added while there is room, most recently active first
+            new = np.flatnonzero(~known)
+            room = self.recent_users - len(users)
+            if len(new) > room:
+                take[new[np.argsort(order[starts[new]], kind='stable')][room:]] = 0
+            
+            # Groups keep newest-first order, take the head of each
+            within = np.arange(take.sum()) - np.repeat(np.cumsum(take) - take, take)
+            rows = order[np.repeat(starts, take) + within]
+            pieces.append(records[rows])  # fancy indexing copies, nothing pins the segment
+            ages.append(seen + rows)
+            seen += len(records)
+            
+            counts[slots[known]] += take[known]
+            added = ~known & (take > 0)
+            users = np.insert(users, slots[added], group_users[added])
+            counts = np.insert(counts, slots[added], take[added])
+        
+        if not pieces:
+            return
+        records, ages = np.concatenate(pieces), np.concatenate(ages)
+        # By user, oldest first; users in order of their newest record, least recent first
+        order = np.lexsort((-ages, records['user_id']))
+        recent = np.empty(len(order), dtype=RECENT_DTYPE)
+        for name in RECENT_DTYPE.names:
+            recent[name] = records[name][order]
+        user_ids = records['user_id'][order]
+        starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        newest = ages[order[ends - 1]]
+        for group in np.argsort(-newest, kind='stable').tolist():
+            self._recent[int(user_ids[starts[group]])] = recent[starts[group]:ends[group]].copy()
+    
+    def __len__(self) -> int:
+        return self._flushed + self._tail_count
+
+    def canonical_type(self, interaction_type: str) -> str:
+        """interaction_type if it is accepted, else OTHER_TYPE"""
+        return interaction_type if interaction_type in self.interaction_types else OTHER_TYPE
+    
+    def type_code(self, interaction_type: str) -> int:
+        """uint8 code of an interaction type, registering new types"""
+        code = self._type_codes.get(interaction_type)
+        if code is None:
+            if len(self._types) > np.iinfo(np.uint8).max:
+                raise ValueError("Too many distinct interaction types (max 256)")
+            code = len(self._types)
+            self._types.append(interaction_type)
+            self._type_codes[interaction_type] = code
+            self._types_dirty = True
+        return code
+
+    def type_name(self, code: int) -> str:
+        return self._types[code]
+
+    def append(self, user_id: int, item_id: int, rating: float, interaction_type: str,
+               timestamp_ms: Optional[int] = None) -> int:
+        """Record one interaction, returns its timestamp (epoch ms)"""
+        timestamp_ms = now_ms() if timestamp_ms is None else int(timestamp_ms)
+        with self._lock:
+            code = self.type_code(self.canonical_type(interaction_type))
+            pos = self._tail_count
+            tail = self._tail
+            tail['user_id'][pos] = user_id
+            tail['item_id'][pos] = item_id
+            tail['rating'][pos] = rating
+            tail['type'][pos] = code
+            tail['timestamp'][pos] = timestamp_ms
+            self._tail_count += 1
+            
+            entry = np.array([(item_id, rating, timestamp_ms)], dtype=RECENT_DTYPE)
+            recent = self._recent.pop(user_id, entry[:0])
+            self._recent[user_id] = np.concatenate([recent, entry])[-self.recent_per_user:]
+            if len(self._recent) > self.recent_users:
+                self._recent.popitem(last=False)
+            if self._tail_count == self.tail_records:
+                self._flush_locked()
+        return timestamp_ms
+
+    def flush(self):
+        """Move the in-memory tail to the segment files"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        count = self._tail_count
+        if count == 0:
+            return
+        records = np.empty(count, dtype=RECORD_DTYPE)
+        for name in RECORD_DTYPE.names:
+            records[name] = self._tail[name][:count]
+
+        if self.path is None:
+            self._memory.append(records)
+            self._memory_ranges.append((int(records['timestamp'].min()),
+                                        int(records['timestamp'].max())))
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            if self._types_dirty:
+                self._write_types()
+            start = 0
+            while start < count:
+                segment = self._writable_segment()
+                end = min(count, start + self.segment_records - segment.count)
+                with open(segment.path, 'ab') as f:
+                    f.write(records[start:end].tobytes())
+                segment.count += end - start
+                segment.extend_range(records['timestamp'][start:end])
+                start = end
+
+        self._flushed += count
+        self._tail_count = 0
+
+    def _writable_segment(self) -> _Segment:
+        if not self._segments or self._segments[-1].count >= self.segment_records:
+            path = os.path.join(self.path, SEGMENT_PATTERN.format(len(self._segments)))
+            self._segments.append(_Segment(path))
+        return self._segments[-1]
+
+    def _write_types(self):
+        staging = os.path.join(self.path, TYPES_FILE + ".tmp")
+        with open(staging, 'w') as f:
+            json.dump(self._types, f)
+        os.replace(staging, os.path.join(self.path, TYPES_FILE))
+        self._types_dirty = False
+
+    def blocks(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+               user_id: Optional[int] = None) -> Iterator[np.ndarray]:
+        """
+        scan() one segment (or in-memory block) at a time, so the whole
+        log is never held in memory
+        """
+        low = np.iinfo(np.int64).min if start_ms is None else int(start_ms)
+        high = np.iinfo(np.int64).max if end_ms is None else int(end_ms)
+
+        with self._lock:
+            count = self._tail_count
+            tail = np.empty(count, dtype=RECORD_DTYPE)
+            for name in RECORD_DTYPE.names:
+                tail[name] = self._tail[name][:count]
+            blocks = [(segment.records(), segment.min_ts, segment.max_ts)
+                      for segment in self._segments]
+            blocks += [(records, lo, hi)
+                       for records, (lo, hi) in zip(self._memory, self._memory_ranges)]
+        blocks.append((tail, -np.inf, np.inf))
+
+        for records, min_ts, max_ts in blocks:
+            if len(records) == 0 or max_ts < low or min_ts >= high:
+                continue
+            timestamps = records['timestamp']
+            mask = (timestamps >= low) & (timestamps < high)
+            if user_id is not None:
+                mask &= records['user_id'] == user_id
+            if mask.any():
+                yield records[mask]
+    
+    def scan(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+             user_id: Optional[int] = None) -> np.ndarray:
+        """
+        Records with start_ms <= timestamp < end_ms (either bound
+        optional), optionally of one user, oldest segment first
+        """
+        parts = list(self.blocks(start_ms, end_ms, user_id))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+
+    def user_interactions(self, user_id: int, start_ms: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        (item_id, rating) pairs of a user's recent_per_user latest
+        interactions, oldest first; scan(user_id=...) reads the full history
+        """
+        recent = self._recent.get(user_id)
+        if recent is None:
+            return []
+        if start_ms is not None:
+            recent = recent[recent['timestamp'] >= start_ms]
+        return list(zip(recent['item_id'].tolist(), recent['rating'].tolist()))
+
+    def has_activity(self, user_id: int, since_ms: int) -> bool:
+        """
+        Whether the user has an interaction at or after since_ms (users
+        evicted from the recent index count as inactive)
+        """
+        recent = self._recent.get(user_id)
+        return recent is not None and bool(recent['timestamp'].max() >= since_ms)
+
+    def to_dataframe(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> pd.DataFrame:
+        """
+        Interactions as a ratings DataFrame (user_id, item_id, rating,
+        interaction_type, timestamp), ready for create_user_item_matrix
+        """
+        records = self.scan(start_ms, end_ms)
+        types = np.array(self._types or [''], dtype=object)
+        return pd.DataFrame({
+            'user_id': records['user_id'],
+            'item_id': records['item_id'],
+            'rating': records['rating'],
+            'interaction_type': types[records['type']],
+            'timestamp': pd.to_datetime(records['timestamp'], unit='ms')
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'records': len(self),
+            'tail_records': self._tail_count,
+            'segments': len(self._segments),
+            'bytes': self._flushed * RECORD_DTYPE.itemsize,
+            'path': self.path
+        }
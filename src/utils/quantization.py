@@ -0,0 +1,98 @@
+import numpy as np
+from typing import Optional, Dict
+
+class QuantizedMatrix:
+    """
+    Compact copy of a row matrix for approximate (candidate) scoring
+
+    float32 / float16 rows are stored as-is; int8 rows are scaled per row
+    so that the largest absolute value maps to 127. float32 rows are
+    scored with a plain matrix multiply. A single query against compact
+    rows goes through einsum, which casts inside its inner loop, so no
+    float32 copy of the rows is made. A batch converts CHUNK_ROWS rows
+    at a time into one reused float32 buffer, so the conversion is
+    shared by every query in the batch.
+    
+    float16 only saves memory: NumPy converts half floats in software,
+    so scoring them is slower than exact float32 scoring.
+    """
+
+    DTYPES = ("float32", "float16", "int8")
+    CHUNK_ROWS = 2048
+
+    def __init__(self, codes: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, matrix: np.ndarray, dtype: str) -> "QuantizedMatrix":
+        if dtype not in cls.DTYPES:
+            raise ValueError(f"Unknown quantization dtype '{dtype}', expected one of {cls.DTYPES}")
+
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if dtype != "int8":
+            return cls(matrix.astype(dtype))
+
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+        return cls(codes, scales.astype(np.float32))
+
+    @property
+    def dtype(self) -> str:
+        return self.codes.dtype.name
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def dequantize(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """float32 rows [start, stop)"""
+        block = self.codes[start:stop].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:stop, np.newaxis]
+        return block
+
+    def scores(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Approximate rows @ vectors.T
+
+        vectors: (f,) for one query or (b, f) for a batch; returns (n,)
+        or (b, n) float32 scores.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        single = vectors.ndim == 1
+        queries = vectors[np.newaxis] if single else vectors
+
+        if self.codes.dtype == np.float32:
+            out = queries @ self.codes.T
+        elif single:
+            out = np.einsum('ij,bj->bi', self.codes, queries, dtype=np.float32, casting='unsafe')
+        else:
+            n_rows = len(self.codes)
+            out = np.empty((len(queries), n_rows), dtype=np.float32)
+            block = np.empty((min(self.CHUNK_ROWS, n_rows), self.codes.shape[1]), dtype=np.float32)
+            for start in range(0, n_rows, self.CHUNK_ROWS):
+                stop = min(start + self.CHUNK_ROWS, n_rows)
+                rows = block[:stop - start]
+                np.copyto(rows, self.codes[start:stop], casting='unsafe')
+                out[:, start:stop] = queries @ rows.T
+
+        if self.scales is not None:
+            out *= self.scales
+        return out[0] if single else out
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        arrays = {f"{prefix}_codes": self.codes}
+        if self.scales is not None:
+            arrays[f"{prefix}_scales"] = self.scales
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], prefix: str) -> Optional["QuantizedMatrix"]:
+        if f"{prefix}_codes" not in arrays:
+            return None
+        return cls(arrays[f"{prefix}_codes"], arrays.get(f"{prefix}_scales"))
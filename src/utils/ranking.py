@@ -0,0 +1,65 @@
+import numpy as np
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k largest scores, highest first
+    
+    Uses argpartition (O(n)) and only sorts the k selected entries.
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(scores)[::-1]
+    
+    candidates = np.argpartition(scores, n - k)[n - k:]
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Row-wise top-k of a 2-D score matrix, highest first
+    
+    Returns an (n_rows, min(k, n_cols)) array of column indices.
+    """
+    n_rows, n_cols = scores.shape
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+    
+    if k < n_cols:
+        candidates = np.argpartition(scores, n_cols - k, axis=1)[:, n_cols - k:]
+    else:
+        candidates = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    
+    order = np.argsort(np.take_along_axis(scores, candidates, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+NORMALIZATIONS = ("zscore", "rank")
+
+def normalize_scores(scores: np.ndarray, method: str = "zscore") -> np.ndarray:
+    """
+    Put one model's scores on a common scale
+    
+    zscore: (s - mean) / std, missing (NaN) entries get 0 (the mean)
+    rank:   rank / (count - 1) in [0, 1], best = 1, missing entries 0.5
+    """
+    if method not in NORMALIZATIONS:
+        raise ValueError(f"Unknown normalization '{method}', expected one of {NORMALIZATIONS}")
+    
+    scores = np.asarray(scores, dtype=np.float64)
+    present = np.isfinite(scores)
+    if method == "zscore":
+        out = np.zeros_like(scores)
+        if present.any():
+            values = scores[present]
+            std = values.std()
+            out[present] = (values - values.mean()) / std if std > 0 else 0.0
+        return out
+    
+    out = np.full_like(scores, 0.5)
+    count = int(present.sum())
+    if count > 1:
+        ranks = np.empty(count)
+        ranks[np.argsort(scores[present], kind='stable')] = np.arange(count)
+        out[present] = ranks / (count - 1)
+    return out
@@ -0,0 +1,180 @@
+import heapq
+import math
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+def mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, a fast well-distributed hash of uint64 values"""
+    with np.errstate(over='ignore'):
+        x = np.asarray(values, dtype=np.uint64) + _GOLDEN
+        x = (x ^ (x >> np.uint64(30))) * _MIX_1
+        x = (x ^ (x >> np.uint64(27))) * _MIX_2
+        return x ^ (x >> np.uint64(31))
+
+class CountMinSketch:
+    """
+    Count-Min sketch over int64 keys
+
+    depth rows of width float32 counters; every key adds its weight to
+    one counter per row and its estimate is the smallest of those
+    counters. Estimates never undercount, and exceed the true count by at
+    most epsilon * total weight with probability 1 - delta, where
+    width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)).
+
+    Sketches with the same shape and seed add up counter-wise (merge()).
+    """
+
+    def __init__(self, width: int, depth: int, seed: int = 0, table: Optional[np.ndarray] = None):
+        self.width = int(width)
+        self.depth = int(depth)
+        self.seed = int(seed)
+        self.seeds = mix64(np.arange(self.depth, dtype=np.uint64) + np.uint64(self.seed))
+        self.table = table if table is not None else np.zeros((self.depth, self.width), dtype=np.float32)
+        self.total = float(self.table[0].sum()) if table is not None else 0.0
+
+    @classmethod
+    def from_error(cls, epsilon: float = 1e-4, delta: float = 0.01, seed: int = 0) -> "CountMinSketch":
+        """Smallest sketch with the (epsilon, delta) guarantee"""
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)), seed)
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def columns(self, keys: Iterable[int]) -> np.ndarray:
+        """(depth, n) counter column of each key in each row"""
+        keys = np.asarray(keys if isinstance(keys, np.ndarray) else list(keys), dtype=np.int64)
+        hashed = mix64(keys.view(np.uint64)[np.newaxis, :] ^ self.seeds[:, np.newaxis])
+        return (hashed % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, keys: Iterable[int], weights=1.0):
+        """Add weights (scalar or per key) to keys; repeated keys accumulate"""
+        columns = self.columns(keys)
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float32), columns.shape[1:])
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], weights)
+        self.total += float(weights.sum())
+
+    def estimate(self, keys: Iterable[int]) -> np.ndarray:
+        columns = self.columns(keys)
+        return self.table[np.arange(self.depth)[:, np.newaxis], columns].min(axis=0)
+
+    def error_bound(self) -> float:
+        """Overestimate bound (holds with probability 1 - delta)"""
+        return self.epsilon * self.total
+
+    def compatible(self, other: "CountMinSketch") -> bool:
+        return (self.width, self.depth, self.seed) == (other.width, other.depth, other.seed)
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        """Add another sketch's counts into this one"""
+        if not self.compatible(other):
+            raise ValueError("Count-Min sketches differ in width, depth or seed")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters (Metwally et al.)
+
+    Tracks at most capacity items. A new item replaces the one with the
+    smallest count and inherits that count as its error, so counts never
+    undercount and over-count by at most error; every item whose true
+    weight exceeds total / capacity is tracked. merge() combines two
+    summaries with the rule of Agarwal et al. (mergeable summaries).
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = max(1, int(capacity))
+        self.counts: Dict[int, float] = {}
+        self.errors: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+
+    @classmethod
+    def from_counts(cls, capacity: int, counts: Dict[int, float],
+                    errors: Optional[Dict[int, float]] = None) -> "SpaceSaving":
+        """Summary holding the capacity largest of the given counts"""
+        summary = cls(capacity)
+        top = heapq.nlargest(summary.capacity, counts.items(), key=lambda entry: entry[1])
+        summary.counts = dict(top)
+        summary.errors = {item: (errors or {}).get(item, 0.0) for item in summary.counts}
+        summary._heap = [(count, item) for item, count in top]
+        heapq.heapify(summary._heap)
+        return summary
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __contains__(self, item) -> bool:
+        return item in self.counts
+
+    def add(self, item: int, weight: float = 1.0):
+        if item in self.counts:
+            # The heap entry now lags behind; refreshed when it reaches the top
+            self.counts[item] += weight
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0.0
+            heapq.heappush(self._heap, (weight, item))
+            return
+
+        self._refresh_min()
+        floor, evicted = self._heap[0]
+        del self.counts[evicted], self.errors[evicted]
+        self.counts[item] = floor + weight
+        self.errors[item] = floor
+        heapq.heapreplace(self._heap, (floor + weight, item))
+
+    def _refresh_min(self):
+        heap, counts = self._heap, self.counts
+        while heap[0][0] != counts[heap[0][1]]:
+            heapq.heapreplace(heap, (counts[heap[0][1]], heap[0][1]))
+
+    def min_count(self) -> float:
+        """Count an untracked item may have at most (0 until full)"""
+        if len(self.counts) < self.capacity:
+            return 0.0
+        self._refresh_min()
+        return self._heap[0][0]
+
+    def items(self) -> List[Tuple[int, float, float]]:
+        """(item, count, error) of every tracked item, largest count first"""
+        return sorted(((item, count, self.errors[item]) for item, count in self.counts.items()),
+                      key=lambda entry: -entry[1])
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Combined summary of both streams"""
+        floor, other_floor = self.min_count(), other.min_count()
+        counts, errors = {}, {}
+        for item in set(self.counts) | set(other.counts):
+            counts[item] = self.counts.get(item, floor) + other.counts.get(item, other_floor)
+            errors[item] = self.errors.get(item, floor) + other.errors.get(item, other_floor)
+        return SpaceSaving.from_counts(max(self.capacity, other.capacity), counts, errors)
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        entries = self.items()
+        return {
+            f"{prefix}_items": np.array([item for item, _, _ in entries], dtype=np.int64),
+            f"{prefix}_counts": np.array([count for _, count, _ in entries], dtype=np.float64),
+            f"{prefix}_errors": np.array([error for _, _, error in entries], dtype=np.float64)
+        }
+
+    @classmethod
+    def from_arrays(cls, capacity: int, arrays: Dict[str, np.ndarray], prefix: str) -> "SpaceSaving":
+        items = arrays[f"{prefix}_items"].tolist()
+        return cls.from_counts(capacity, dict(zip(items, arrays[f"{prefix}_counts"].tolist())),
+                               dict(zip(items, arrays[f"{prefix}_errors"].tolist())))
@@ -1,6 +1,8 @@
 import pytest
+import numpy as np
 from fastapi.testclient import TestClient
 from src.main import app
+from src.api.cache import InMemoryRedis, RecommendationCache
 
 client = TestClient(app)
 
@@ -32,11 +34,22 @@ def test_submit_feedback():
 
 def test_trending_items():
     """Test trending endpoint"""
+    for item_id, events in ((9001, 3), (9002, 2)):
+        for _ in range(events):
+            feedback = {"user_id": 55, "item_id": item_id, "rating": 4, "interaction_type": "click"}
+            client.post("/api/v1/feedback", json=feedback)
+    
     response = client.get("/api/v1/trending?n=20")
     assert response.status_code == 200
     data = response.json()
     assert "trending_items" in data
-    assert len(data["trending_items"]) == 20
+    assert len(data["trending_items"]) <= 20
+    ranked = [item["item_id"] for item in data["trending_items"]]
+    assert ranked.index(9001) < ranked.index(9002)
+    assert data["trending_items"][ranked.index(9001)]["views"] >= 3
+    
+    assert client.get("/api/v1/trending?timeframe=7d").status_code == 200
+    assert client.get("/api/v1/trending?timeframe=1y").status_code == 400
 
 def test_similar_items():
     """Test similar items endpoint"""
@@ -67,4 +80,466 @@ def test_system_stats():
     assert response.status_code == 200
     data = response.json()
     assert "total_users" in data
-    assert "total_items" in data
\ No newline at end of file
+    assert "total_items" in data
+
+
+@pytest.fixture(scope="module")
+def trained_recommender():
+    """Small hybrid model trained on the sample data"""
+    from src.models.hybrid_model import HybridRecommender
+    from src.utils.data_loader import DataLoader
+    
+    ratings_df, items_df = DataLoader.load_movielens_sample()
+    matrix, user_ids, item_ids = DataLoader.create_user_item_matrix(ratings_df)
+    
+    model = HybridRecommender()
+    model.cf_model.n_factors = 8
+    model.cf_model.iterations = 2
+    model.train(matrix, user_ids, item_ids, items_df.to_dict('records'))
+    return model
+
+@pytest.fixture
+def with_model(trained_recommender, monkeypatch):
+    """Serve requests from the trained model"""
+    from src.api import endpoints
+    from src.models.registry import ModelGeneration
+    monkeypatch.setattr(endpoints.registry, "_current",
+                        ModelGeneration(trained_recommender, "test"))
+    # Latency budgets are not under test here
+    monkeypatch.setattr(endpoints.executor, "timeout_ms", None)
+    monkeypatch.setattr(endpoints, "cache", RecommendationCache(redis=InMemoryRedis()))
+    return trained_recommender
+
+def test_batch_recommendations_with_model(with_model):
+    """Batch endpoint returns the hybrid recommendations /recommend computes"""
+    from src.api import endpoints
+    response = client.post("/api/v1/batch-recommend", json=[1, 2, 999999])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["user_id"] for r in results] == [1, 2, 999999]
+    assert len(results[0]["recommendations"]) == 5
+    assert results[2]["recommendations"] == []
+    for result in results[:2]:
+        user_id = result["user_id"]
+        expected = with_model.recommend(user_id, endpoints.get_user_interactions(user_id), n=5,
+                                        filter_watched=True)
+        assert result["recommendations"] == expected
+        assert {rec["method"] for rec in result["recommendations"]} == {"hybrid"}
+
+def test_similar_items_with_model(with_model):
+    """Similar items come from the model and exclude the source item"""
+    response = client.get("/api/v1/similar/10?n=5")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 5
+    assert 10 not in [item["item_id"] for item in data["similar_items"]]
+
+def test_filter_watched_with_model(with_model):
+    """filter_watched removes items the user has already seen"""
+    watched = set(with_model.watched_items(1).tolist())
+    assert watched
+    
+    request = {"user_id": 1, "num_recommendations": 20, "filter_watched": True}
+    response = client.post("/api/v1/recommend", json=request)
+    assert response.status_code == 200
+    recommended = {rec["item_id"] for rec in response.json()["recommendations"]}
+    assert recommended and not recommended & watched
+
+def test_feedback_folds_in_new_user(with_model):
+    """A brand-new user gets model recommendations right after feedback"""
+    new_user = 5_000_001
+    assert with_model.cf_model.user_vector(new_user) is None
+    
+    feedback = {"user_id": new_user, "item_id": 10, "rating": 5, "interaction_type": "like"}
+    assert client.post("/api/v1/feedback", json=feedback).status_code == 200
+    
+    assert with_model.cf_model.user_vector(new_user) is not None
+    data = client.get(f"/api/v1/recommend/{new_user}?n=5").json()
+    assert data["count"] == 5
+    assert 10 not in [rec["item_id"] for rec in data["recommendations"]]
+
+def test_scoring_timeout_and_load_shedding(monkeypatch):
+    """Slow scoring answers 504; a full queue sheds load with 503"""
+    import threading
+    from src.api import endpoints
+    from src.api.executor import ScoringExecutor
+    
+    release = threading.Event()
+    
+    class SlowRecommender:
+        is_trained = True
+        precomputed = None
+        
+        def recommend_many(self, requests):
+            release.wait(5)
+            return [[] for _ in requests]
+    
+    executor = ScoringExecutor(max_workers=1, max_queue=0, timeout_ms=20)
+    monkeypatch.setattr(endpoints, "executor", executor)
+    monkeypatch.setattr(endpoints, "cache", RecommendationCache())
+    monkeypatch.setattr(endpoints, "get_recommender", lambda: SlowRecommender())
+    
+    request = {"user_id": 1, "num_recommendations": 5}
+    timeouts = endpoints.batcher.timeouts
+    try:
+        assert client.post("/api/v1/recommend", json=request).status_code == 504
+        # The timed-out call still occupies the only worker
+        response = client.post("/api/v1/recommend", json=request)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+    finally:
+        release.set()
+        executor.shutdown()
+    
+    assert executor.stats()["rejected"] == 1
+    # The deadline is per request, the batch itself is never timed out
+    assert endpoints.batcher.timeouts == timeouts + 1
+    assert executor.stats()["timeouts"] == 0
+    assert executor.in_flight == 0
+
+def test_feedback_succeeds_when_fold_in_is_slow_or_shed(monkeypatch):
+    """A stored interaction is never answered with 503/504"""
+    import threading
+    from src.api import endpoints
+    from src.api.executor import ScoringExecutor
+    
+    release = threading.Event()
+    folded = []
+    
+    class SlowRecommender:
+        is_trained = True
+        precomputed = None
+        
+        def update_user(self, user_id, interactions):
+            release.wait(5)
+            folded.append(user_id)
+            return True
+    
+    executor = ScoringExecutor(max_workers=1, max_queue=0, timeout_ms=20)
+    monkeypatch.setattr(endpoints, "executor", executor)
+    monkeypatch.setattr(endpoints, "cache", RecommendationCache())
+    monkeypatch.setattr(endpoints, "get_recommender", lambda: SlowRecommender())
+    
+    user_id = 918273
+    try:
+        # The first fold-in outlives request_timeout, the second is shed
+        for item_id in (5, 6):
+            feedback = {"user_id": user_id, "item_id": item_id, "rating": 4.0,
+                        "interaction_type": "watch"}
+            response = client.post("/api/v1/feedback", json=feedback)
+            assert response.status_code == 200
+            assert response.json()["status"] == "success"
+    finally:
+        release.set()
+        executor.shutdown()
+    
+    assert [item for item, _ in endpoints.get_user_interactions(user_id)] == [5, 6]
+    assert folded == [user_id]
+    assert executor.stats()["rejected"] == 1
+
+def test_micro_batcher_coalesces_requests():
+    """Concurrent submits share batches and get their own results back"""
+    import asyncio
+    from src.api.batching import MicroBatcher
+    
+    batches = []
+    
+    async def handler(items):
+        batches.append(list(items))
+        if "boom" in items:
+            raise ValueError("boom")
+        return [item * 10 for item in items]
+    
+    batcher = MicroBatcher(handler, max_batch_size=3, max_wait_ms=5)
+    
+    async def scenario():
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        failed = await asyncio.gather(batcher.submit("boom"), batcher.submit(7),
+                                      return_exceptions=True)
+        return results, failed
+    
+    results, failed = asyncio.run(scenario())
+    
+    assert results == [0, 10, 20, 30, 40]
+    assert batches[:2] == [[0, 1, 2], [3, 4]]
+    assert all(isinstance(result, ValueError) for result in failed)
+    
+    stats = batcher.stats()
+    assert stats["batches"] == 3
+    assert stats["max_batch_size"] == 3
+    assert stats["max_queue_depth"] == 5  # 3 being scored + 2 waiting
+    assert stats["queue_depth"] == 0
+
+def test_micro_batcher_latency_cap_and_deadlines():
+    """Batches shrink to the latency budget; late requests time out alone"""
+    import asyncio
+    from src.api.batching import MicroBatcher
+    
+    batches = []
+    
+    async def handler(items):
+        batches.append(list(items))
+        await asyncio.sleep(0.002 * len(items))  # 2ms per item
+        return [item * 10 for item in items]
+    
+    batcher = MicroBatcher(handler, max_batch_size=64, max_wait_ms=1, max_batch_latency_ms=10)
+    
+    async def scenario():
+        for _ in range(4):
+            await asyncio.gather(*(batcher.submit(i) for i in range(64)))
+        # Too short a deadline for a whole batch: this request alone fails and is not scored
+        late = batcher.submit(-1, timeout_ms=0.5)
+        on_time = batcher.submit(1, timeout_ms=1000)
+        return await asyncio.gather(late, on_time, return_exceptions=True)
+    
+    late, on_time = asyncio.run(scenario())
+    
+    assert batches[0] == list(range(64))  # no measurement yet
+    assert 1 <= batcher.batch_limit <= 8
+    assert max(len(batch) for batch in batches[-10:]) <= 8
+    assert isinstance(late, asyncio.TimeoutError) and on_time == 10
+    assert -1 not in batches[-1] and batcher.timeouts == 1
+    assert batcher.stats()["queue_depth"] == 0
+
+def test_metrics_report_batching():
+    """Batching and scoring pool metrics are exposed for tuning"""
+    data = client.get("/metrics").json()
+    assert "queue_depth" in data["batching"]
+    assert "avg_batch_size" in data["batching"]
+    assert "in_flight" in data["scoring"]
+
+def test_recommendation_cache_with_model(with_model):
+    """Repeated requests hit the cache until feedback invalidates the user"""
+    from src.api import endpoints
+    cache = endpoints.cache
+    
+    first = client.get("/api/v1/recommend/7?n=5").json()["recommendations"]
+    second = client.get("/api/v1/recommend/7?n=5").json()["recommendations"]
+    assert first == second
+    assert cache.computations == 1
+    assert any(key.startswith("rec:test:7:") for key in cache.redis._data)
+    
+    client.get("/api/v1/recommend/7?n=6")
+    assert cache.computations == 2
+    
+    feedback = {"user_id": 7, "item_id": first[0]["item_id"], "rating": 5, "interaction_type": "like"}
+    client.post("/api/v1/feedback", json=feedback)
+    client.get("/api/v1/recommend/7?n=5")
+    assert cache.computations == 3
+
+def test_feedback_invalidates_after_fold_in(with_model, monkeypatch):
+    """Results cached while the fold-in runs are dropped once it finishes"""
+    from src.api import endpoints
+    events = []
+    
+    update_user = with_model.update_user
+    def recording_update_user(user_id, interactions):
+        events.append("fold_in")
+        return update_user(user_id, interactions)
+    monkeypatch.setattr(with_model, "update_user", recording_update_user)
+    
+    invalidate = endpoints.cache.invalidate
+    async def recording_invalidate(user_id):
+        events.append("invalidate")
+        await invalidate(user_id)
+    monkeypatch.setattr(endpoints.cache, "invalidate", recording_invalidate)
+    
+    feedback = {"user_id": 8, "item_id": 3, "rating": 4, "interaction_type": "like"}
+    assert client.post("/api/v1/feedback", json=feedback).status_code == 200
+    assert events == ["invalidate", "fold_in", "invalidate"]
+
+def test_cache_single_flight_and_redis_tier():
+    """A burst for one key computes once; other processes read it from Redis"""
+    import asyncio
+    
+    redis = InMemoryRedis()
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [{"item_id": 1, "score": 0.5}]
+    
+    async def scenario():
+        cache = RecommendationCache(redis=redis, ttl=60)
+        burst = await asyncio.gather(*(cache.get_or_compute("g1", 42, 10, compute)
+                                       for _ in range(20)))
+        # Fresh local tier (another worker) reads the Redis tier
+        other = RecommendationCache(redis=redis, ttl=60)
+        from_redis = await other.get_or_compute("g1", 42, 10, compute)
+        
+        await cache.invalidate(42)
+        other.clear()
+        after_invalidate = await other.get_or_compute("g1", 42, 10, compute)
+        new_generation = await cache.get_or_compute("g2", 42, 10, compute)
+        return burst, from_redis, after_invalidate, new_generation
+    
+    burst, from_redis, after_invalidate, new_generation = asyncio.run(scenario())
+    
+    assert all(result == burst[0] for result in burst)
+    assert from_redis == burst[0]
+    assert after_invalidate == burst[0]
+    assert len(calls) == 3
+
+def test_cache_user_versions_are_bounded():
+    """The version LRU stays bounded and forgotten users never see invalidated entries"""
+    import asyncio
+    
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        return [{"item_id": len(calls), "score": 0.5}]
+    
+    async def scenario():
+        local = RecommendationCache(local_size=4)
+        first = await local.get_or_compute("g1", 1, 10, compute)
+        await local.invalidate(1)
+        for user_id in range(2, 10):
+            await local.get_or_compute("g1", user_id, 10, compute)
+        assert local.stats()["user_versions"] == 4
+        # User 1's version was evicted; it resumes past every invalidated version
+        assert 1 not in local._versions
+        assert await local._user_version(1) >= 1
+        assert await local.get_or_compute("g1", 1, 10, compute) != first
+        
+        shared = RecommendationCache(redis=InMemoryRedis(), local_ttl=0.01)
+        await shared.get_or_compute("g1", 1, 10, compute)
+        await asyncio.sleep(0.02)
+        await shared.get_or_compute("g1", 2, 10, compute)
+        assert list(shared._versions) == [2]
+    
+    asyncio.run(scenario())
+
+def test_fallback_recommendations_are_not_cached(monkeypatch):
+    """Random fallback lists are recomputed on every request"""
+    from src.api import endpoints
+    monkeypatch.setattr(endpoints, "get_recommender", lambda: None)
+    monkeypatch.setattr(endpoints, "cache", RecommendationCache(redis=InMemoryRedis()))
+    
+    for _ in range(2):
+        response = client.post("/api/v1/recommend", json={"user_id": 5, "num_recommendations": 5})
+        assert response.status_code == 200
+    assert endpoints.cache.computations == 0
+    assert endpoints.cache.redis._data == {}
+
+def test_precomputed_recommendations_with_model(with_model, monkeypatch):
+    """Returning users are served from the offline table until they are active"""
+    from src.api import endpoints
+    from src.jobs.precompute_recommendations import precompute_recommendations
+    
+    table = precompute_recommendations(with_model, n=20, chunk_size=64, diversity_weight=0.0)
+    assert len(table) == len(with_model.cf_model.user_index)
+    assert table.items.dtype == np.int32 and table.scores.dtype == np.float32
+    monkeypatch.setattr(with_model, "precomputed", table)
+    
+    online = endpoints.batcher.handler
+    calls = []
+    
+    async def counting_handler(requests):
+        calls.extend(request["user_id"] for request in requests)
+        return await online(requests)
+    
+    monkeypatch.setattr(endpoints.batcher, "handler", counting_handler)
+    
+    offline = client.get("/api/v1/recommend/3?n=5").json()["recommendations"]
+    assert calls == []
+    assert [rec["item_id"] for rec in offline] == [iid for iid, _ in table.get(3, 5)]
+    expected = with_model.recommend(3, n=5, filter_watched=True, diversity_weight=0.0)
+    assert [rec["item_id"] for rec in offline] == [rec["item_id"] for rec in expected]
+    
+    # New users and users with fresh feedback are scored online
+    client.get("/api/v1/recommend/9999999?n=5")
+    feedback = {"user_id": 3, "item_id": offline[0]["item_id"], "rating": 4, "interaction_type": "click"}
+    client.post("/api/v1/feedback", json=feedback)
+    client.get("/api/v1/recommend/3?n=5")
+    assert calls == [9999999, 3]
+
+def test_precomputed_table_matches_online(trained_recommender, monkeypatch):
+    """Any prefix of a user's table row equals online recommend() at that n"""
+    from src.jobs.precompute_recommendations import precompute_recommendations
+    from src.utils.interaction_store import InteractionStore
+    
+    model = trained_recommender
+    user_ids = model.cf_model.user_index.sorted_ids[:60].tolist()
+    item_ids = model.cf_model.item_ids
+    interactions = InteractionStore()
+    for user_id in user_ids[::4]:
+        for item_id in item_ids[user_id % 7::17][:3]:
+            interactions.append(user_id, item_id, 4.0, "click")
+    
+    table = precompute_recommendations(model, n=20, chunk_size=16, diversity_weight=0.2,
+                                       interactions=interactions)
+    for user_id in user_ids:
+        logged = interactions.user_interactions(user_id)
+        for n in (5, 10, 20):
+            online = model.recommend(user_id, user_interactions=logged, n=n,
+                                     diversity_weight=0.2, filter_watched=True)
+            assert [iid for iid, _ in table.get(user_id, n)] == [rec["item_id"] for rec in online]
+            np.testing.assert_allclose([score for _, score in table.get(user_id, n)],
+                                       [rec["score"] for rec in online], rtol=1e-5)
+    
+    # Logged interactions are read chunk by chunk, not for every user up front
+    events = []
+    fetch, score = interactions.user_interactions, model.recommend_many
+    monkeypatch.setattr(interactions, "user_interactions",
+                        lambda user_id: events.append("fetch") or fetch(user_id))
+    monkeypatch.setattr(model, "recommend_many",
+                        lambda requests: events.append("score") or score(requests))
+    precompute_recommendations(model, n=5, chunk_size=16, interactions=interactions)
+    assert events.index("score") == 16
+
+def test_profile_stats_follow_feedback():
+    """Profile stats come from the running aggregates once a user has feedback"""
+    for rating in (2.0, 4.0, 5.0):
+        feedback = {"user_id": 4242, "item_id": 77, "rating": rating, "interaction_type": "rating"}
+        assert client.post("/api/v1/feedback", json=feedback).status_code == 200
+    
+    stats = client.get("/api/v1/user/4242/profile").json()["stats"]
+    assert stats["total_watched"] == 3
+    assert stats["avg_rating"] == pytest.approx(3.7)
+
+def test_model_reload_is_restricted(trained_recommender, tmp_path, monkeypatch):
+    """Reloads need the token and artifact directories inside the models directory"""
+    import time
+    import joblib
+    from src.api import endpoints
+    from src.models.registry import ModelRegistry
+    
+    trained_recommender.save(str(tmp_path / "cf"), str(tmp_path / "content"))
+    joblib.dump({'user_factors': None}, tmp_path / "legacy.joblib")
+    registry = ModelRegistry(warmup_queries=0)
+    monkeypatch.setattr(endpoints, "registry", registry)
+    monkeypatch.setenv("MODELS_DIR", str(tmp_path))
+    monkeypatch.delenv("MODEL_RELOAD_TOKEN", raising=False)
+    
+    def reload(token="s3cret", **paths):
+        body = {"cf_path": "cf", "content_path": "content", "version": "v2", **paths}
+        return client.post("/api/v1/models/reload", json=body, headers={"X-Reload-Token": token})
+    
+    def wait_for_load():
+        for _ in range(500):
+            if registry.last_load["status"] != "loading":
+                break
+            time.sleep(0.01)
+        return registry.last_load
+    
+    assert reload().status_code == 403
+    monkeypatch.setenv("MODEL_RELOAD_TOKEN", "s3cret")
+    assert reload(token="wrong").status_code == 401
+    assert reload(cf_path="../../etc").status_code == 400
+    assert reload(cf_path=str(tmp_path.parent)).status_code == 400
+    assert reload(cf_path="legacy.joblib").status_code == 400
+    assert registry.last_load is None
+    
+    # A failed background load is recorded and visible on /models
+    assert reload(content_path="cf").status_code == 202
+    assert wait_for_load()["status"] == "failed"
+    assert "expected 'content_based'" in client.get("/api/v1/models").json()["last_load"]["error"]
+    assert registry.current is None
+    
+    assert reload(cf_path=str(tmp_path / "cf")).status_code == 202
+    assert wait_for_load()["status"] == "published"
+    assert registry.current.version == "v2"
+    with pytest.raises(ValueError):
+        registry.load(str(tmp_path / "legacy.joblib"), str(tmp_path / "content"), allow_legacy=False)
@@ -0,0 +1,955 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from src.models.collaborative_filtering import CollaborativeFiltering
+
+@pytest.fixture
+def ratings():
+    """Small random user-item matrix"""
+    rng = np.random.default_rng(7)
+    n_users, n_items, nnz = 60, 40, 400
+    rows = rng.integers(0, n_users, nnz)
+    cols = rng.integers(0, n_items, nnz)
+    data = rng.integers(1, 6, nnz).astype(float)
+    matrix = csr_matrix((data, (rows, cols)), shape=(n_users, n_items))
+    return matrix, list(range(1, n_users + 1)), list(range(101, 101 + n_items))
+
+def test_batched_solver_matches_loop(ratings):
+    """Batched ALS gives the same factors as the reference loop"""
+    matrix, user_ids, item_ids = ratings
+    
+    factors = []
+    for solver, n_jobs in [("loop", 1), ("batched", 1), ("batched", 3)]:
+        np.random.seed(0)
+        cf = CollaborativeFiltering(n_factors=8, regularization=1.0, iterations=4,
+                                    solver=solver, n_jobs=n_jobs)
+        cf.fit(matrix, user_ids, item_ids)
+        factors.append((cf.user_factors, cf.item_factors))
+    
+    for user_factors, item_factors in factors[1:]:
+        np.testing.assert_allclose(user_factors, factors[0][0], atol=1e-6)
+        np.testing.assert_allclose(item_factors, factors[0][1], atol=1e-6)
+
+def test_cf_from_config():
+    """Solver is selectable from config"""
+    cf = CollaborativeFiltering.from_config({'factors': 16, 'solver': 'batched', 'n_jobs': 2})
+    assert cf.n_factors == 16
+    assert cf.solver == "batched"
+    
+    with pytest.raises(ValueError):
+        CollaborativeFiltering(solver="magic")
+
+def test_cg_step_converges_to_exact_solve(ratings):
+    """With f CG steps the CG half-step equals the exact solve"""
+    matrix, _, _ = ratings
+    rng = np.random.default_rng(1)
+    item_factors = rng.normal(0, 0.1, (matrix.shape[1], 6))
+    warm_start = rng.normal(0, 0.1, (matrix.shape[0], 6))
+    
+    exact = CollaborativeFiltering(n_factors=6, solver="batched")._als_step(
+        matrix, item_factors, 1.0)
+    cg = CollaborativeFiltering(n_factors=6, solver="cg", cg_steps=12)._als_step(
+        matrix, item_factors, 1.0, initial=warm_start)
+    
+    np.testing.assert_allclose(cg, exact, atol=1e-8)
+
+def test_fit_stops_on_tolerance(ratings, caplog):
+    """A large loss-improvement threshold stops training early"""
+    matrix, user_ids, item_ids = ratings
+    cf = CollaborativeFiltering(n_factors=4, iterations=50, solver="cg")
+    
+    with caplog.at_level("INFO"):
+        cf.fit(matrix, user_ids, item_ids, tol=0.5)
+    
+    assert "below tol" in caplog.text
+
+def test_fit_respects_time_budget(ratings, monkeypatch):
+    """No iteration starts that would overrun the configured time budget"""
+    matrix, user_ids, item_ids = ratings
+    cf = CollaborativeFiltering.from_config({'factors': 4, 'iterations': 50,
+                                             'solver': 'batched', 'time_budget': 3.5})
+    assert (cf.time_budget, cf.tol) == (3.5, None)
+    
+    # Every half-step takes one fake second, so an iteration takes two
+    clock = iter(range(1000))
+    monkeypatch.setattr("src.models.collaborative_filtering.time.perf_counter",
+                        lambda: next(clock))
+    steps = []
+    als_step = cf._als_step
+    monkeypatch.setattr(cf, "_als_step", lambda *args, **kwargs: (
+        steps.append(next(clock)), als_step(*args, **kwargs))[1])
+    cf.fit(matrix, user_ids, item_ids)
+    
+    # Starts at t=0; after one iteration (t=3) a second one would end at 6 > 3.5
+    assert len(steps) == 2
+
+def test_implicit_loss_matches_dense(ratings):
+    """With implicit=True the loss is the weighted objective over every cell"""
+    matrix, user_ids, item_ids = ratings
+    cf = CollaborativeFiltering(n_factors=4, iterations=2, solver="batched", implicit=True, alpha=2)
+    cf.LOSS_CHUNK_SIZE = 37
+    cf.fit(matrix, user_ids, item_ids)
+    
+    dense = matrix.toarray()
+    preference = (dense > 0).astype(float)
+    confidence = 1 + cf.alpha * np.abs(dense)
+    X, Y = cf.user_factors.astype(float), cf.item_factors.astype(float)
+    expected = np.sum(confidence * (preference - X @ Y.T) ** 2)
+    expected += cf.regularization * (np.sum(X ** 2) + np.sum(Y ** 2))
+    
+    assert cf._calculate_loss(matrix) == pytest.approx(expected, rel=1e-6)
+
+def test_sparse_loss_matches_dense(ratings):
+    """Loss over CSR nonzeros equals the dense masked computation"""
+    matrix, user_ids, item_ids = ratings
+    cf = CollaborativeFiltering(n_factors=4, iterations=2)
+    cf.LOSS_CHUNK_SIZE = 37
+    cf.fit(matrix, user_ids, item_ids)
+    
+    dense = matrix.toarray()
+    mask = dense > 0
+    predictions = cf.user_factors @ cf.item_factors.T
+    expected = np.sum((dense[mask] - predictions[mask]) ** 2)
+    expected += cf.regularization * (np.sum(cf.user_factors ** 2) + np.sum(cf.item_factors ** 2))
+    
+    assert cf._calculate_loss(matrix) == pytest.approx(expected)
+
+def test_sampled_negative_loss_estimates_dense(ratings):
+    """Sampled unobserved-cell loss approaches the dense sum over zero cells"""
+    matrix, user_ids, item_ids = ratings
+    cf = CollaborativeFiltering(n_factors=4, iterations=2, loss_negative_samples=200_000)
+    cf.fit(matrix, user_ids, item_ids)
+    
+    dense = matrix.toarray()
+    predictions = cf.user_factors.astype(float) @ cf.item_factors.astype(float).T
+    unobserved = np.sum(predictions[dense == 0] ** 2)
+    
+    np.random.seed(0)
+    estimates = [cf._sampled_negative_loss(matrix, cf.loss_negative_samples) for _ in range(3)]
+    assert np.mean(estimates) == pytest.approx(unobserved, rel=0.02)
+    
+    observed = CollaborativeFiltering(n_factors=4, iterations=2)
+    observed.user_factors, observed.item_factors = cf.user_factors, cf.item_factors
+    np.random.seed(0)
+    assert cf._calculate_loss(matrix) == pytest.approx(
+        observed._calculate_loss(matrix) + estimates[0])
+    
+    full = csr_matrix(np.ones((3, 2)))
+    assert cf._sampled_negative_loss(full, 100) == 0.0
+
+def test_predict_top_k_matches_full_sort(ratings, tmp_path):
+    """argpartition top-K gives the same ranking as a full argsort"""
+    matrix, user_ids, item_ids = ratings
+    np.random.seed(0)
+    cf = CollaborativeFiltering(n_factors=4, iterations=2, solver="batched")
+    cf.fit(matrix, user_ids, item_ids)
+    
+    scores = cf.item_factors @ cf.user_factors[cf.user_index[5]]
+    expected = [item_ids[idx] for idx in np.argsort(scores)[::-1][:7]]
+    assert [iid for iid, _ in cf.predict(5, n=7)] == expected
+    
+    candidates = [item_ids[3], item_ids[10], 99999, item_ids[0]]
+    filtered = cf.predict(5, item_ids=candidates, n=2)
+    assert len(filtered) == 2
+    assert {iid for iid, _ in filtered} <= set(candidates)
+    
+    cf.save(str(tmp_path / "cf.joblib"))
+    loaded = CollaborativeFiltering()
+    loaded.load(str(tmp_path / "cf.joblib"))
+    assert loaded.predict(5, n=7) == cf.predict(5, n=7)
+
+def test_predict_batch_matches_predict(ratings):
+    """Batched scoring returns the single-user ranking minus seen items"""
+    matrix, user_ids, item_ids = ratings
+    np.random.seed(0)
+    cf = CollaborativeFiltering(n_factors=4, iterations=2, solver="batched")
+    cf.fit(matrix, user_ids, item_ids)
+    
+    users = [3, 424242, 17, 3]
+    batch = cf.predict_batch(users, n=5, batch_size=2)
+    
+    assert len(batch) == len(users)
+    assert batch[1] == []
+    assert [iid for iid, _ in batch[0]] == [iid for iid, _ in batch[3]]
+    
+    seen = {item_ids[idx] for idx in matrix[cf.user_index[17]].indices}
+    expected = [rec for rec in cf.predict(17, n=len(item_ids)) if rec[0] not in seen][:5]
+    assert [iid for iid, _ in batch[2]] == [iid for iid, _ in expected]
+    np.testing.assert_allclose([s for _, s in batch[2]], [s for _, s in expected])
+    
+    unmasked = cf.predict_batch([17], n=5, exclude_seen=False)[0]
+    assert [iid for iid, _ in unmasked] == [iid for iid, _ in cf.predict(17, n=5)]
+
+@pytest.mark.parametrize("candidate_dtype", ["float16", "int8"])
+def test_quantized_candidates_rerank_exactly(ratings, candidate_dtype):
+    """Compact candidate scoring plus exact re-ranking keeps the exact top-N"""
+    from src.utils.quantization import QuantizedMatrix
+    
+    matrix, user_ids, item_ids = ratings
+    np.random.seed(0)
+    cf = CollaborativeFiltering(n_factors=8, regularization=1.0, iterations=3, solver="batched",
+                                candidate_dtype=candidate_dtype, rerank=15)
+    cf.fit(matrix, user_ids, item_ids)
+    
+    assert cf.item_factors.dtype == np.float32
+    compact = cf.item_candidates
+    assert compact.nbytes <= cf.item_factors.astype(np.float64).nbytes / 4
+    exact_scores = cf.user_factors[:3] @ cf.item_factors.T
+    np.testing.assert_allclose(compact.scores(cf.user_factors[:3]), exact_scores,
+                               atol=0.02 * np.abs(exact_scores).max())
+    # Single queries (cast inside einsum) agree with chunked batch scoring
+    compact.CHUNK_ROWS = 7
+    np.testing.assert_allclose(compact.scores(cf.user_factors[1]),
+                               compact.scores(cf.user_factors[:3])[1], rtol=1e-5)
+    
+    for user_id in (1, 17, 42):
+        exact = cf.predict(user_id, n=5, exact=True)
+        assert cf.predict(user_id, n=5) == exact
+        assert [iid for iid, _ in cf.predict(user_id, n=5, exclude_items=[exact[0][0]])] == \
+            [iid for iid, _ in cf.predict(user_id, n=6, exact=True)][1:]
+    
+    batch = cf.predict_batch([1, 17], n=5, exclude_seen=False)
+    assert [[iid for iid, _ in recs] for recs in batch] == \
+        [[iid for iid, _ in cf.predict(uid, n=5, exact=True)] for uid in (1, 17)]
+    
+    restored = QuantizedMatrix.from_arrays(compact.arrays('c'), 'c')
+    np.testing.assert_array_equal(restored.dequantize(), compact.dequantize())
+
+def test_ivf_index_recall_and_roundtrip(tmp_path):
+    """IVF search is close to exact and survives save/load"""
+    from src.models.ann_index import IVFIndex, build_index, load_index, recall_at_k
+    
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(500, 16))
+    index = build_index("ivf", vectors, n_lists=10, n_probe=10)
+    
+    # Probing every list is an exact search
+    assert recall_at_k(index, vectors[:20], k=10) == pytest.approx(1.0)
+    
+    index.n_probe = 3
+    assert recall_at_k(index, vectors[:20], k=10) > 0.5
+    
+    indices, _ = index.query(vectors[0], k=5, exclude=[0])
+    assert 0 not in indices
+    
+    index.save(str(tmp_path / "ivf"))
+    loaded = load_index(str(tmp_path / "ivf"), mmap_mode='r')
+    assert isinstance(loaded, IVFIndex)
+    np.testing.assert_array_equal(loaded.query(vectors[1], k=5)[0], index.query(vectors[1], k=5)[0])
+
+def test_mips_index_predict(ratings, tmp_path, caplog):
+    """MIPS retrieval reports recall and matches brute force when probing all lists"""
+    matrix, user_ids, item_ids = ratings
+    np.random.seed(0)
+    cf = CollaborativeFiltering(n_factors=6, iterations=2, solver="batched",
+                                mips=True, mips_params={'n_lists': 4, 'n_probe': 4})
+    cf.fit(matrix, user_ids, item_ids)
+    
+    assert cf.mips_index.recall[str(cf.MIPS_RECALL_K)] == pytest.approx(1.0)
+    # Index vectors stay in the factor dtype
+    assert cf.mips_index.vectors.dtype == np.float32
+    
+    approx = cf.predict(9, n=5, exclude_items=[item_ids[0]])
+    exact = cf.predict(9, n=5, exclude_items=[item_ids[0]], exact=True)
+    assert [iid for iid, _ in approx] == [iid for iid, _ in exact]
+    np.testing.assert_allclose([s for _, s in approx], [s for _, s in exact])
+    assert item_ids[0] not in [iid for iid, _ in approx]
+    
+    # The recall measured at fit is reported again when the artifact is loaded
+    cf.save(str(tmp_path / "cf"))
+    caplog.clear()
+    with caplog.at_level("INFO"):
+        CollaborativeFiltering().load(str(tmp_path / "cf"))
+    assert f"recall@{cf.MIPS_RECALL_K} = 1.0000" in caplog.text
+
+@pytest.fixture
+def content_model():
+    """Content model trained on a small synthetic catalog"""
+    from src.models.content_based import ContentBasedFiltering
+    
+    rng = np.random.default_rng(5)
+    genres = ['Action', 'Comedy', 'Drama', 'Thriller', 'Romance', 'Horror']
+    items = [
+        {
+            'item_id': 1000 + i,
+            'title': f'Movie {i}',
+            'genres': ' '.join(rng.choice(genres, size=rng.integers(1, 4), replace=False)),
+            'description': f'Story number {i % 7} about {genres[i % 6].lower()}'
+        }
+        for i in range(80)
+    ]
+    model = ContentBasedFiltering(n_components=10)
+    model.fit(items)
+    return model
+
+def test_content_scoring_matches_cosine(content_model):
+    """Profile build and matvec scoring equal the cosine_similarity reference"""
+    from sklearn.metrics.pairwise import cosine_similarity
+    
+    interactions = [(1003, 4.0), (1010, 2.0), (424242, 5.0), (1003, 1.0)]
+    profile = content_model.get_user_profile(interactions)
+    
+    features = content_model.item_features
+    expected_profile = (4.0 * features[3] + 2.0 * features[10] + 1.0 * features[3]) / 7.0
+    np.testing.assert_allclose(profile, expected_profile)
+    
+    expected = cosine_similarity([profile], features)[0]
+    recs = content_model.recommend(profile, n=5)
+    assert [iid for iid, _ in recs] == [content_model.item_ids[i] for i in np.argsort(expected)[::-1][:5]]
+    np.testing.assert_allclose([s for _, s in recs], np.sort(expected)[::-1][:5])
+
+def test_content_recommend_excludes_items(content_model):
+    """Excluded items are masked out before top-K"""
+    profile = content_model.get_user_profile([(1001, 5.0), (1002, 3.0)])
+    full = content_model.recommend(profile, n=10)
+    
+    excluded = {full[0][0], full[3][0], 555555}
+    filtered = content_model.recommend(profile, n=8, exclude_items=excluded)
+    
+    assert len(filtered) == 8
+    assert not excluded & {iid for iid, _ in filtered}
+    assert filtered == [rec for rec in full if rec[0] not in excluded][:8]
+    
+    everything = content_model.recommend(profile, n=5, exclude_items=np.array(content_model.item_ids))
+    assert everything == []
+
+def test_fold_in_matches_als_step(ratings):
+    """Folding in a training user's row reproduces the ALS user update"""
+    matrix, user_ids, item_ids = ratings
+    np.random.seed(0)
+    cf = CollaborativeFiltering(n_factors=5, regularization=0.5, iterations=2, solver="batched")
+    cf.fit(matrix, user_ids, item_ids)
+    
+    expected = cf._als_step(matrix, cf.item_factors, cf.regularization)
+    row = cf.user_index[12]
+    np.testing.assert_allclose(cf.fold_in([], user_id=12), expected[row])
+    
+    # Recent ratings override training ones (the last one wins), unknown items are ignored
+    col = matrix[row].indices[0]
+    changed = matrix.tolil()
+    changed[row, col] = 2.0
+    expected = cf._als_step(changed.tocsr(), cf.item_factors, cf.regularization)
+    folded = cf.fold_in([(item_ids[col], 5.0), (123456789, 1.0), (item_ids[col], 2.0)], user_id=12)
+    np.testing.assert_allclose(folded, expected[row])
+    
+    # Cold-start user served straight after fold-in
+    assert cf.predict(777777) == []
+    assert cf.update_user(777777, [(item_ids[0], 5.0), (item_ids[4], 4.0)])
+    assert len(cf.predict(777777, n=3)) == 3
+    assert len(cf.predict_batch([777777, 12], n=3)[0]) == 3
+    assert not cf.update_user(888888, [(123456789, 5.0)])
+
+def test_fold_in_overlay_is_thread_safe(ratings):
+    """Concurrent fold-ins keep the overlay bounded and consistent"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    matrix, user_ids, item_ids = ratings
+    np.random.seed(0)
+    cf = CollaborativeFiltering(n_factors=4, iterations=2, solver="batched")
+    cf.fit(matrix, user_ids, item_ids)
+    cf.FOLD_IN_CACHE_SIZE = 8
+    
+    def fold(user_id):
+        cf.update_user(user_id, [(item_ids[user_id % len(item_ids)], 5.0)])
+        return cf.predict_batch([user_id, user_id - 1], n=2)
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(fold, range(1000, 1400)))
+    assert len(cf.folded_snapshot()) == 8
+    assert all(cf.is_folded(user_id) for user_id in cf.folded_snapshot())
+
+def test_predict_batch_survives_concurrent_eviction(ratings, monkeypatch):
+    """A folded user evicted mid-batch is skipped instead of breaking the stack"""
+    matrix, user_ids, item_ids = ratings
+    np.random.seed(0)
+    cf = CollaborativeFiltering(n_factors=4, iterations=2, solver="batched")
+    cf.fit(matrix, user_ids, item_ids)
+    assert cf.update_user(777777, [(item_ids[0], 5.0), (item_ids[4], 4.0)])
+    
+    lookup = cf.user_vector
+    def evicting_lookup(user_id):
+        # Another thread's update_user pushes the folded user out of the LRU
+        cf.folded_factors.pop(777777, None)
+        return lookup(user_id)
+    monkeypatch.setattr(cf, "user_vector", evicting_lookup)
+    
+    batch = cf.predict_batch([12, 777777], n=3)
+    assert len(batch[0]) == 3
+    assert batch[1] == []
+
+def test_hybrid_artifact_roundtrip(ratings, content_model, tmp_path):
+    """Models reload from memory-mapped artifacts with identical results"""
+    from src.models.hybrid_model import HybridRecommender
+    
+    matrix, user_ids, _ = ratings
+    item_ids = content_model.item_ids.tolist()[:matrix.shape[1]]
+    np.random.seed(0)
+    model = HybridRecommender()
+    model.cf_model = CollaborativeFiltering(n_factors=4, iterations=2, solver="batched", ann="ivf")
+    model.cf_model.fit(matrix, user_ids, item_ids)
+    model.content_model = content_model
+    model.is_trained = True
+    
+    cf_path, content_path = str(tmp_path / "cf"), str(tmp_path / "content")
+    model.save(cf_path, content_path)
+    model.save(cf_path, content_path)  # overwriting an artifact is atomic
+    
+    loaded = HybridRecommender()
+    loaded.load(cf_path, content_path)
+    
+    assert isinstance(loaded.cf_model.item_factors, np.memmap)
+    assert isinstance(loaded.content_model.item_features, np.memmap)
+    assert loaded.content_model.item_metadata.get(1003)['title'] == 'Movie 3'
+    
+    interactions = [(1003, 4.0), (1007, 5.0)]
+    assert loaded.recommend(4, interactions, n=5) == model.recommend(4, interactions, n=5)
+    assert loaded.cf_model.get_similar_items(1002, 3) == model.cf_model.get_similar_items(1002, 3)
+
+def test_metadata_table_missing_fields_and_text(tmp_path):
+    """Missing numbers read as None, text costs its own length, both survive a reload"""
+    import json
+    from src.utils.artifacts import MetadataTable, TextColumn, load_arrays, save_arrays
+    
+    records = [
+        {'item_id': 1, 'title': 'Short', 'year': 1999, 'description': 'x' * 5000},
+        {'item_id': 2, 'title': 'Café', 'genres': 'Drama'},
+        {'item_id': 3, 'title': 'Third', 'year': 2005, 'rating': 4.5}
+    ]
+    table = MetadataTable.from_records(records)
+    assert table.get(2) == {'item_id': 2, 'title': 'Café', 'year': None, 'description': '',
+                            'genres': 'Drama', 'rating': None}
+    assert table.get(1)['year'] == 1999 and isinstance(table.get(1)['year'], int)
+    assert table.get(3)['rating'] == 4.5
+    json.dumps([table.get(item_id) for item_id in (1, 2, 3)], allow_nan=False)
+    
+    description = table.columns['description']
+    assert isinstance(description, TextColumn)
+    assert description.nbytes < 5100
+    
+    arrays, names = table.arrays()
+    save_arrays(str(tmp_path), arrays)
+    loaded = MetadataTable.from_arrays(load_arrays(str(tmp_path), arrays), names)
+    for item_id in (1, 2, 3):
+        assert loaded.get(item_id) == table.get(item_id)
+
+def test_recommend_many_matches_recommend(ratings, content_model):
+    """Batched hybrid scoring gives each request the single-request result"""
+    from src.models.hybrid_model import HybridRecommender
+    
+    matrix, user_ids, _ = ratings
+    item_ids = content_model.item_ids.tolist()[:matrix.shape[1]]
+    np.random.seed(0)
+    model = HybridRecommender()
+    model.cf_model = CollaborativeFiltering(n_factors=4, iterations=2, solver="batched")
+    model.cf_model.fit(matrix, user_ids, item_ids)
+    model.content_model = content_model
+    model.is_trained = True
+    
+    requests = [
+        {'user_id': 4, 'user_interactions': [(1003, 4.0), (1007, 5.0)], 'n': 5},
+        {'user_id': 9, 'n': 3, 'filter_watched': True},
+        {'user_id': 424242, 'n': 4},
+        {'user_id': 11, 'user_interactions': [(1001, 2.0)], 'n': 6, 'filter_watched': True,
+         'diversity_weight': 0.0}
+    ]
+    batch = model.recommend_many(requests)
+    
+    assert len(batch) == len(requests)
+    assert batch[2] == []
+    for request, recs in zip(requests, batch):
+        expected = model.recommend(**request)
+        assert [rec['item_id'] for rec in recs] == [rec['item_id'] for rec in expected]
+        np.testing.assert_allclose([rec['score'] for rec in recs],
+                                   [rec['score'] for rec in expected], atol=1e-3)
+
+def test_similar_items_table(ratings, content_model, tmp_path):
+    """Precomputed neighbours match a brute-force blend and serve /similar lookups"""
+    from click.testing import CliRunner
+    from src.jobs.cli import cli
+    from src.jobs.similar_items import build_similar_items
+    from src.models.hybrid_model import HybridRecommender
+    
+    matrix, user_ids, _ = ratings
+    item_ids = content_model.item_ids.tolist()[10:10 + matrix.shape[1]]
+    np.random.seed(0)
+    model = HybridRecommender()
+    model.cf_model = CollaborativeFiltering(n_factors=4, iterations=2, solver="batched")
+    model.cf_model.fit(matrix, user_ids, item_ids)
+    model.content_model = content_model
+    model.is_trained = True
+    
+    table = build_similar_items(model, k=5, blend=0.7, block_size=16)
+    parallel = build_similar_items(model, k=5, blend=0.7, block_size=16, workers=2)
+    np.testing.assert_array_equal(parallel.indices, table.indices)
+    assert len(table) == 80
+    
+    # Item 1015 has CF factors and content features, 1002 only content features
+    def cosine(matrix, row):
+        normalized = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        return normalized @ normalized[row]
+    
+    cf_scores = np.zeros(80)
+    cf_scores[10:50] = cosine(model.cf_model.item_factors, 5)
+    expected = 0.7 * cf_scores + 0.3 * cosine(content_model.item_features, 15)
+    expected[15] = -np.inf
+    neighbours = table.get(1015, 5)
+    assert [iid for iid, _ in neighbours] == (1000 + np.argsort(expected)[::-1][:5]).tolist()
+    np.testing.assert_allclose([s for _, s in neighbours], np.sort(expected)[::-1][:5], atol=1e-5)
+    assert 1002 not in [iid for iid, _ in table.get(1002, 5)]
+    assert table.get(424242) is None
+    
+    cf_path, content_path = str(tmp_path / "cf"), str(tmp_path / "content")
+    model.save(cf_path, content_path)
+    result = CliRunner().invoke(cli, ["similar-items", "--cf-path", cf_path, "--content-path",
+                                      content_path, "--output", str(tmp_path / "similar"),
+                                      "--k", "5", "--blend", "0.7", "--workers", "1"])
+    assert result.exit_code == 0, result.output
+    
+    loaded = HybridRecommender()
+    loaded.load(cf_path, content_path, str(tmp_path / "similar"))
+    assert loaded.similar_items_table.k == 5
+    assert loaded.similar_items(1015, 3) == table.get(1015, 3)
+
+def test_score_normalization_and_fusion():
+    """Per-model normalization puts scores on one scale; missing scores are neutral"""
+    from src.models.hybrid_model import HybridRecommender
+    from src.utils.ranking import normalize_scores
+    
+    scores = np.array([3.0, np.nan, 1.0, 2.0])
+    np.testing.assert_allclose(normalize_scores(scores), [np.sqrt(1.5), 0.0, -np.sqrt(1.5), 0.0])
+    np.testing.assert_allclose(normalize_scores(scores, "rank"), [1.0, 0.5, 0.0, 0.5])
+    with pytest.raises(ValueError):
+        normalize_scores(scores, "minmax")
+    
+    model = HybridRecommender.from_config({
+        'hybrid': {'cf_weight': 0.75, 'content_weight': 0.25, 'normalization': 'rank'},
+        'collaborative_filtering': {'factors': 12}
+    })
+    assert model.cf_model.n_factors == 12
+    
+    # Raw CF dot products dwarf cosines; after normalization both count
+    cf = np.array([40.0, 30.0, 20.0, np.nan])
+    cb = np.array([0.1, 0.2, 0.9, 0.3])
+    np.testing.assert_allclose(model.fuse(cf, cb),
+                               0.75 * np.array([1.0, 0.5, 0.0, 0.5]) +
+                               0.25 * np.array([0.0, 1 / 3, 1.0, 2 / 3]))
+    np.testing.assert_allclose(model.fuse(cf), 0.75 * np.array([1.0, 0.5, 0.0, 0.5]))
+
+def test_diversity_matches_set_reference(content_model, tmp_path, monkeypatch):
+    """Bitset MMR picks the items of the per-pair Jaccard loop it replaces"""
+    from src.models.content_based import ContentBasedFiltering
+    from src.models.hybrid_model import HybridRecommender
+    from src.utils import bitsets
+
+    def genres(item_id):
+        return set((content_model.item_metadata.get(item_id) or {}).get('genres', '').split())
+
+    def reference(items, n, weight):
+        selected, remaining = [items[0]], list(items[1:])
+        while len(selected) < n and remaining:
+            bonus = []
+            for item_id, score in remaining:
+                distances = [1 - len(genres(item_id) & genres(s)) / len(genres(item_id) | genres(s))
+                             if genres(item_id) and genres(s) else 0.5 for s, _ in selected]
+                bonus.append(score + weight * np.mean(distances))
+            selected.append(remaining.pop(int(np.argmax(bonus))))
+        return selected
+
+    model = HybridRecommender(content_model=content_model)
+    rng = np.random.default_rng(2)
+    ids = content_model.item_ids.tolist() + [99999]  # one item without genres
+    items = list(zip(ids, np.sort(rng.random(len(ids)))[::-1].tolist()))
+    for weight in (0.1, 0.5, 2.0):
+        assert model._apply_diversity(items, 10, weight) == reference(items, 10, weight)
+    assert model._apply_diversity(items, 10, 0.0) == items[:10]
+
+    content_model.save(str(tmp_path / "content"))
+    loaded = ContentBasedFiltering()
+    loaded.load(str(tmp_path / "content"))
+    np.testing.assert_array_equal(loaded.genre_bits, content_model.genre_bits)
+    assert loaded.genre_vocabulary == content_model.genre_vocabulary
+
+    # Lookup-table popcount for NumPy without bitwise_count
+    words = np.array([[0, 1, 2**64 - 1], [3, 2**63, 0]], dtype=np.uint64)
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    np.testing.assert_array_equal(bitsets.popcount(words), [65, 3])
+
+def test_registry_swaps_generations(ratings, content_model, tmp_path):
+    """Publishing swaps the serving model; old generations drain when released"""
+    import gc
+    from src.models.hybrid_model import HybridRecommender
+    from src.models.registry import ModelRegistry
+    
+    matrix, user_ids, _ = ratings
+    model = HybridRecommender()
+    model.cf_model = CollaborativeFiltering(n_factors=4, iterations=1, solver="batched")
+    model.cf_model.fit(matrix, user_ids, content_model.item_ids.tolist()[:matrix.shape[1]])
+    model.content_model = content_model
+    model.is_trained = True
+    model.save(str(tmp_path / "cf"), str(tmp_path / "content"))
+    
+    logged = {777777: [(model.cf_model.item_ids[0], 5.0)], 3: [(model.cf_model.item_ids[1], 1.0)]}
+    registry = ModelRegistry(warmup_queries=2, user_interactions=lambda user_id: logged.get(user_id, []))
+    first = registry.publish(model, "v1")
+    in_flight = registry.current
+    assert model.update_user(777777, logged[777777]) and model.update_user(3, logged[3])
+    
+    second = registry.load_async(str(tmp_path / "cf"), str(tmp_path / "content"), "v2").result()
+    assert registry.current is second
+    assert registry.model.recommend(3, n=3)
+    # Folded-in users are re-solved against the new generation's factors
+    assert list(second.model.cf_model.folded_snapshot()) == [777777, 3]
+    np.testing.assert_allclose(second.model.cf_model.user_vector(3),
+                               second.model.cf_model.fold_in(logged[3], 3), rtol=1e-5)
+    
+    # A request that started on v1 keeps a consistent model until it finishes
+    assert in_flight.model is model
+    assert registry.draining() == ["v1"]
+    del first, in_flight
+    gc.collect()
+    assert registry.draining() == []
+
+def test_streaming_ratings_matrix_matches_dataframe(tmp_path):
+    """Chunked ingestion builds the matrix create_user_item_matrix builds"""
+    import pandas as pd
+    from src.utils.data_loader import DataLoader, IdCodebook
+    
+    ratings_df, _ = DataLoader.load_movielens_sample()
+    expected, user_ids, item_ids = DataLoader.create_user_item_matrix(ratings_df)
+    assert user_ids == sorted(ratings_df['user_id'].unique())
+    
+    path = tmp_path / "ratings.csv"
+    ratings_df.rename(columns={'user_id': 'userId', 'item_id': 'movieId'}).to_csv(path, index=False)
+    matrix, streamed_users, streamed_items = DataLoader.load_ratings_matrix(str(path), chunksize=777)
+    assert (streamed_users, streamed_items) == (user_ids, item_ids)
+    assert matrix.dtype == np.float32
+    assert (matrix != expected).nnz == 0
+    
+    codebook = IdCodebook()
+    np.testing.assert_array_equal(codebook.encode([30, 10, 30]), [0, 1, 0])
+    np.testing.assert_array_equal(codebook.encode([20, 10, 40]), [2, 1, 3])
+    ids, positions = codebook.sorted_order()
+    np.testing.assert_array_equal(ids, [10, 20, 30, 40])
+    np.testing.assert_array_equal(ids[positions], codebook.ids)
+    
+    # One new id at a time, across several merges of the delta index
+    rng = np.random.default_rng(3)
+    stream = rng.permutation(5000) * 7
+    for raw_id in stream:
+        codebook.encode([raw_id])
+    np.testing.assert_array_equal(codebook.lookup(stream), np.arange(4, 5004))
+    np.testing.assert_array_equal(codebook.encode([40, stream[-1], -1]), [3, 5003, 5004])
+    ids, positions = codebook.sorted_order()
+    assert np.all(np.diff(ids) > 0)
+    np.testing.assert_array_equal(ids[positions], codebook.ids)
+    
+    pd.DataFrame({'user': [1]}).to_csv(tmp_path / "bad.csv", index=False)
+    with pytest.raises(ValueError):
+        next(DataLoader.iter_ratings(str(tmp_path / "bad.csv")))
+
+def test_interaction_store_segments_and_scans(tmp_path):
+    """Appends rotate across segment files, survive reopening and scan by time"""
+    from src.utils.interaction_store import RECORD_DTYPE, InteractionStore
+    
+    path = tmp_path / "interactions"
+    store = InteractionStore(str(path), segment_records=4, tail_records=3)
+    assert not path.exists()  # created lazily on the first flush
+    
+    for i in range(10):
+        store.append(user_id=i % 3, item_id=100 + i, rating=i / 2,
+                     interaction_type="like" if i % 2 else "click", timestamp_ms=1000 * i)
+    assert len(store) == 10
+    assert store.stats()['tail_records'] == 1  # three flushes of three
+    
+    window = store.scan(start_ms=2000, end_ms=7000)
+    assert window['item_id'].tolist() == [102, 103, 104, 105, 106]
+    assert store.user_interactions(1) == [(101, 0.5), (104, 2.0), (107, 3.5)]
+    assert store.has_activity(0, 9000) and not store.has_activity(1, 8000)
+    
+    store.flush()
+    assert sorted(p.name for p in path.iterdir()) == [
+        "segment-000000.bin", "segment-000001.bin", "segment-000002.bin", "types.json"
+    ]
+    assert (path / "segment-000000.bin").stat().st_size == 4 * RECORD_DTYPE.itemsize
+    
+    reopened = InteractionStore(str(path), segment_records=4)
+    assert len(reopened) == 10
+    np.testing.assert_array_equal(reopened.scan(3000, 8000), store.scan(3000, 8000))
+    frame = reopened.to_dataframe()
+    assert frame['interaction_type'].tolist()[:2] == ["click", "like"]
+    assert reopened.type_code("click") == 0
+    
+    memory = InteractionStore(tail_records=2)
+    memory.append(5, 50, 4.0, "watch")
+    memory.append(5, 51, 3.0, "watch")
+    memory.append(6, 52, 1.0, "watch")
+    assert memory.user_interactions(5) == [(50, 4.0), (51, 3.0)]
+
+def test_interaction_store_maps_unknown_types(tmp_path):
+    """Client-supplied types outside the accepted set cannot exhaust the type codes"""
+    from src.utils.interaction_store import OTHER_TYPE, InteractionStore
+    
+    path = tmp_path / "interactions"
+    store = InteractionStore(str(path), tail_records=64)
+    for i in range(300):
+        store.append(user_id=1, item_id=i, rating=1.0, interaction_type=f"custom-{i}")
+    store.append(user_id=1, item_id=300, rating=1.0, interaction_type="like")
+    store.flush()
+    
+    assert store.canonical_type("custom-0") == OTHER_TYPE
+    frame = InteractionStore(str(path)).to_dataframe()
+    assert set(frame['interaction_type']) == {OTHER_TYPE, "like"}
+
+def test_interaction_store_recent_index(tmp_path, monkeypatch):
+    """Per-user reads come from a bounded index, not from scanning the log"""
+    from src.utils.interaction_store import InteractionStore
+    
+    path = tmp_path / "interactions"
+    store = InteractionStore(str(path), segment_records=4, tail_records=3, recent_per_user=3)
+    for i in range(10):
+        store.append(user_id=i % 2, item_id=100 + i, rating=i, interaction_type="click",
+                     timestamp_ms=1000 * i)
+    store.flush()
+    
+    reopened = InteractionStore(str(path), segment_records=4, recent_per_user=3)
+    for s in (store, reopened):
+        def no_scan(*args, **kwargs):
+            raise AssertionError("per-user reads must not scan the log")
+        monkeypatch.setattr(s, "scan", no_scan)
+        assert s.user_interactions(0) == [(104, 4.0), (106, 6.0), (108, 8.0)]
+        assert s.user_interactions(1, start_ms=6000) == [(107, 7.0), (109, 9.0)]
+        assert s.user_interactions(2) == []
+        assert s.has_activity(1, 9000) and not s.has_activity(0, 9000)
+        assert not s.has_activity(2, 0)
+    
+    reopened.append(user_id=0, item_id=200, rating=1.0, interaction_type="click", timestamp_ms=20000)
+    assert reopened.user_interactions(0) == [(106, 6.0), (108, 8.0), (200, 1.0)]
+    assert reopened.has_activity(0, 20000)
+    
+    # At most recent_users users, the least recently active evicted
+    bounded = InteractionStore(str(path), segment_records=4, recent_per_user=3, recent_users=1)
+    assert bounded.user_interactions(1) == [(105, 5.0), (107, 7.0), (109, 9.0)]
+    assert bounded.user_interactions(0) == []
+    bounded.append(user_id=2, item_id=300, rating=2.0, interaction_type="click", timestamp_ms=30000)
+    assert bounded.user_interactions(2) == [(300, 2.0)] and bounded.user_interactions(1) == []
+    
+    parts = list(bounded.blocks(start_ms=2000))
+    assert len(parts) > 1
+    np.testing.assert_array_equal(np.concatenate(parts), bounded.scan(start_ms=2000))
+
+def test_interaction_store_recovers_torn_tail(tmp_path):
+    """A partly written record is cut on reopen so later appends stay aligned"""
+    from src.utils.interaction_store import RECORD_DTYPE, InteractionStore
+    
+    path = tmp_path / "interactions"
+    store = InteractionStore(str(path), segment_records=8, tail_records=1)
+    for i in range(3):
+        store.append(user_id=1, item_id=10 + i, rating=1.0, interaction_type="click",
+                     timestamp_ms=1000 * i)
+    
+    # Crash halfway through writing the fourth record
+    segment = path / "segment-000000.bin"
+    torn = np.zeros(1, dtype=RECORD_DTYPE).tobytes()[:RECORD_DTYPE.itemsize // 2]
+    with open(segment, 'ab') as f:
+        f.write(torn)
+    
+    reopened = InteractionStore(str(path), segment_records=8, tail_records=1)
+    assert len(reopened) == 3
+    assert segment.stat().st_size == 3 * RECORD_DTYPE.itemsize
+    
+    reopened.append(user_id=2, item_id=20, rating=5.0, interaction_type="like", timestamp_ms=3000)
+    restarted = InteractionStore(str(path), segment_records=8)
+    assert restarted.scan()['item_id'].tolist() == [10, 11, 12, 20]
+    assert restarted.user_interactions(2) == [(20, 5.0)]
+
+def test_trending_windows_decay_and_snapshot(tmp_path):
+    """Windowed counters rank by decayed counts, expire, evict and restore"""
+    from src.models.trending import TrendingEngine
+    
+    hour, day = 3_600_000, 86_400_000
+    now = 100 * day
+    engine = TrendingEngine(capacity=50, top_k=5)
+    
+    rng = np.random.default_rng(4)
+    events = [(int(rng.integers(0, 30)), now - int(rng.integers(0, 20 * day))) for _ in range(400)]
+    events += [(7, now - 30 * hour)] * 40 + [(8, now - 4 * hour)] * 40 + [(9, now)] * 20
+    for item_id, timestamp in sorted(events, key=lambda event: event[1]):
+        engine.record(item_id, timestamp)
+    
+    def expected(window, ring_width, covered, half_life):
+        scores = {}
+        for item_id, timestamp in events:
+            age = now // ring_width - timestamp // ring_width
+            if age < covered:
+                weight = 0.5 ** (age * ring_width / hour / half_life)
+                scores[item_id] = scores.get(item_id, 0.0) + weight
+        return sorted(scores.items(), key=lambda entry: -entry[1])[:5]
+    
+    for window, width, covered, half_life in (('24h', hour, 24, 6), ('7d', day, 7, 48),
+                                              ('30d', day, 30, 168)):
+        top = engine.top(window, 5, now_ms=now)
+        reference = expected(window, width, covered, half_life)
+        assert [item_id for item_id, _, _ in top] == [item_id for item_id, _ in reference]
+        np.testing.assert_allclose([score for _, score, _ in top], [s for _, s in reference])
+    
+    # Item 7 fell out of the 24h window; item 8's 40 events beat item 9's 20 despite decay
+    ranked = [item_id for item_id, _, _ in engine.top('24h', 5, now_ms=now)]
+    assert 7 not in ranked and ranked.index(8) < ranked.index(9)
+    assert engine.top('24h', 5, now_ms=now)[ranked.index(9)][2] == 20
+    
+    engine.save(str(tmp_path / "trending"))
+    restored = TrendingEngine.load(str(tmp_path / "trending"))
+    assert restored.top('7d', 5, now_ms=now) == engine.top('7d', 5, now_ms=now)
+    assert restored.saved_at is not None
+    
+    # A day of silence expires the 24h window
+    assert engine.top('24h', 5, now_ms=now + 25 * hour) == []
+    
+    # Capacity bounds the tracked items
+    for item_id in range(1000, 1100):
+        engine.record(item_id, now + 25 * hour)
+    assert len(engine) <= 50
+    
+    replayed = TrendingEngine(capacity=50, top_k=5)
+    replayed.ingest([item_id for item_id, _ in events], [timestamp for _, timestamp in events])
+    assert replayed.top('30d', 5, now_ms=now) == restored.top('30d', 5, now_ms=now)
+    
+    with pytest.raises(ValueError):
+        engine.top('1y')
+
+def test_sketches_bounds_and_merge():
+    """Count-Min never undercounts and stays within its bound; both sketches merge"""
+    from src.utils.sketches import CountMinSketch, SpaceSaving
+    
+    rng = np.random.default_rng(8)
+    stream = rng.zipf(1.5, 20000) % 5000
+    truth = np.bincount(stream, minlength=5000)
+    
+    sketch = CountMinSketch.from_error(epsilon=0.005, delta=0.01)
+    assert (sketch.width, sketch.depth) == (544, 5)
+    halves = CountMinSketch.from_error(0.005, 0.01), CountMinSketch.from_error(0.005, 0.01)
+    sketch.add(stream)
+    halves[0].add(stream[:7000])
+    halves[1].add(stream[7000:])
+    
+    estimates = sketch.estimate(np.arange(5000))
+    assert (estimates >= truth).all()
+    assert np.mean(estimates - truth <= sketch.error_bound()) >= 0.99
+    merged = halves[0].merge(halves[1])
+    np.testing.assert_array_equal(merged.table, sketch.table)
+    with pytest.raises(ValueError):
+        merged.merge(CountMinSketch.from_error(0.005, 0.01, seed=1))
+    
+    summary, parts = SpaceSaving(50), (SpaceSaving(50), SpaceSaving(50))
+    for pos, item in enumerate(stream.tolist()):
+        summary.add(item)
+        parts[pos % 2].add(item)
+    heavy = np.flatnonzero(truth > len(stream) / 50)
+    for candidates in (summary, parts[0].merge(parts[1])):
+        assert set(heavy.tolist()) <= set(candidates.counts)
+        for item, count, error in candidates.items():
+            assert count - error <= truth[item] <= count
+
+def test_sketch_trending_matches_exact(tmp_path):
+    """Sketch mode ranks like the exact counters, merges across workers and restores"""
+    from src.models.trending import (
+        SketchTrendingEngine, TrendingEngine, build_trending, load_trending
+    )
+    
+    hour = 3_600_000
+    now = 1000 * 24 * hour
+    rng = np.random.default_rng(9)
+    items = (rng.zipf(1.3, 6000) % 3000).tolist()
+    times = (now - rng.integers(0, 48 * hour, len(items))).tolist()
+    events = sorted(zip(items, times), key=lambda event: event[1])
+    
+    exact = TrendingEngine(capacity=3000, top_k=20)
+    sketch = build_trending({'mode': 'sketch', 'sketch': {'epsilon': 0.001, 'heavy_hitters': 200}})
+    shards = SketchTrendingEngine(0.001, heavy_hitters=200), SketchTrendingEngine(0.001, heavy_hitters=200)
+    for pos, (item_id, timestamp) in enumerate(events):
+        exact.record(item_id, timestamp)
+        sketch.record(item_id, timestamp)
+        shards[pos % 2].record(item_id, timestamp)
+    
+    for window in ('24h', '7d'):
+        expected = exact.top(window, 10, now_ms=now)
+        approx = sketch.top(window, 10, now_ms=now)
+        bound = sketch.error_bound(window)
+        assert len({i for i, _, _ in approx} & {i for i, _, _ in expected}) >= 9
+        truth = {item_id: (score, views) for item_id, score, views in exact.top(window, 20, now_ms=now)}
+        for item_id, score, views in approx:
+            if item_id in truth:
+                assert truth[item_id][0] - 1e-6 <= score <= truth[item_id][0] + bound['score'] + 1e-6
+                assert truth[item_id][1] <= views <= truth[item_id][1] + bound['views'] + 1
+    assert exact.error_bound('24h') is None
+    # The default sketch is smaller than exact counters for a 50k catalog
+    assert SketchTrendingEngine().nbytes < TrendingEngine(capacity=50_000).nbytes / 2
+    
+    merged = shards[0].merge(shards[1])
+    assert [i for i, _, _ in merged.top('24h', 5, now_ms=now)] == \
+        [i for i, _, _ in sketch.top('24h', 5, now_ms=now)]
+    for name in ('hour', 'day'):
+        np.testing.assert_array_equal(merged.rings[name], sketch.rings[name])
+    
+    sketch.save(str(tmp_path / "sketch"))
+    restored = load_trending(str(tmp_path / "sketch"))
+    assert isinstance(restored, SketchTrendingEngine)
+    assert restored.top('7d', 10, now_ms=now) == sketch.top('7d', 10, now_ms=now)
+
+def test_feature_store_matches_groupby(ratings, tmp_path):
+    """Incremental and batch aggregates equal the pandas groupby features"""
+    import pandas as pd
+    from src.preprocessing.feature_engineering import FeatureEngineer
+    from src.preprocessing.feature_store import IncrementalFeatureStore, to_epoch
+    from src.utils.data_loader import DataLoader
+    
+    ratings_df, items_df = DataLoader.load_movielens_sample()
+    ratings_df = ratings_df.assign(rating=ratings_df['rating'] + 0.25 * (ratings_df.index % 3))
+    
+    expected = ratings_df.groupby('user_id').agg({
+        'rating': ['count', 'mean', 'std'], 'item_id': 'nunique', 'timestamp': ['min', 'max']
+    }).reset_index()
+    user_features = FeatureEngineer.create_user_features(ratings_df)
+    assert len(user_features) == len(expected)
+    for column, values in zip(user_features.columns[:7], expected.columns):
+        pd.testing.assert_series_equal(user_features[column], expected[values], check_names=False,
+                                       check_dtype=False)
+    item_features = FeatureEngineer.create_item_features(ratings_df, items_df)
+    item_stats = ratings_df.groupby('item_id')['user_id'].nunique()
+    assert (item_features.set_index('item_id')['unique_users'].loc[item_stats.index] == item_stats).all()
+    
+    interactions = FeatureEngineer.create_interaction_features(ratings_df)
+    grouped = ratings_df.groupby('user_id')['rating']
+    reference = (ratings_df['rating'] - grouped.transform('mean')) / (grouped.transform('std') + 1e-8)
+    np.testing.assert_allclose(interactions['rating_normalized'], reference)
+    assert 'hour' not in ratings_df
+    
+    # Batches folded in one by one, or built per partition and merged
+    full = IncrementalFeatureStore.from_ratings(ratings_df)
+    incremental, partitions = IncrementalFeatureStore(), IncrementalFeatureStore()
+    for rows in np.array_split(np.arange(len(ratings_df)), 7):
+        batch = ratings_df.iloc[rows]
+        incremental.update(batch['user_id'].to_numpy(), batch['item_id'].to_numpy(),
+                           batch['rating'].to_numpy(), to_epoch(batch['timestamp']))
+    for rows in np.array_split(np.arange(len(ratings_df)), 3):
+        partitions.merge(IncrementalFeatureStore.from_ratings(ratings_df.iloc[rows]))
+    for store in (incremental, partitions):
+        pd.testing.assert_frame_equal(store.user_features(), full.user_features(), check_exact=False)
+        pd.testing.assert_frame_equal(store.item_features(), full.item_features(), check_exact=False)
+    
+    full.save(str(tmp_path / "features"))
+    loaded = IncrementalFeatureStore.load(str(tmp_path / "features"))
+    pd.testing.assert_frame_equal(loaded.user_features(), full.user_features())
+    assert loaded.user_stats(-1) is None
+    assert loaded.user_stats(1)['rating_count'] == int((ratings_df['user_id'] == 1).sum())
+    assert loaded.saved_at is not None
+    assert loaded.extends(IncrementalFeatureStore(full.users.ids[:5], full.items.ids))
+    assert not loaded.extends(IncrementalFeatureStore(full.users.ids[::-1], full.items.ids))
+    
+    # Codes follow the rows of a fitted model
+    matrix, user_ids, item_ids = ratings
+    cf = CollaborativeFiltering(n_factors=4, iterations=1)
+    cf.fit(matrix, user_ids[::-1], item_ids)
+    seeded = IncrementalFeatureStore.from_model(cf)
+    np.testing.assert_array_equal(seeded.users.lookup(user_ids[::-1]), np.arange(len(user_ids)))